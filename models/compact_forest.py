@@ -0,0 +1,186 @@
+"""
+Ağaç topluluklarının (RandomForest, GradientBoosting, HistGradientBoosting)
+bitişik NumPy dizilerine dışa aktarılması ve vektörel tahmini
+
+    python -m models.compact_forest --model data/rf_energy_sumo_ev_model.pkl
+
+Tüm ağaçların düğümleri tek dizilerde tutulur (feature, threshold,
+children, value). Yapraklar kendilerine döner; böylece tahmin, bütün satırlar ve
+bütün ağaçlar için seviye seviye aynı anda ilerler. Diziler .npy olarak
+kaydedilip memory-map ile açılır (pickle açma maliyeti yok).
+"""
+import os
+import json
+import shutil
+import argparse
+import numpy as np
+
+ARRAYS = ("feature", "threshold", "children", "missing_left", "value", "roots")
+
+def _pack(trees):
+    """
+    trees: [(feature, threshold, left, right, missing_left, value, is_leaf), ...]
+    Yerel düğüm indekslerini global indekslere çevirip tek dizilerde birleştirir.
+    """
+    parts = {name: [] for name in ARRAYS if name != "roots"}
+    roots = []
+    offset = 0
+    for feature, threshold, left, right, missing_left, value, is_leaf in trees:
+        n = len(feature)
+        local = np.arange(n)
+        # Yaprak: kendine döner, karşılaştırma sonucu önemsiz
+        parts["feature"].append(np.where(is_leaf, 0, feature).astype(np.int32))
+        parts["threshold"].append(np.where(is_leaf, np.inf, threshold).astype(np.float64))
+        # children[:, 0] sol, children[:, 1] sağ çocuk
+        parts["children"].append(np.stack([np.where(is_leaf, local, left),
+                                           np.where(is_leaf, local, right)], axis=1).astype(np.int32) + offset)
+        parts["missing_left"].append(np.asarray(missing_left, dtype=bool))
+        parts["value"].append(np.asarray(value, dtype=np.float64))
+        roots.append(offset)
+        offset += n
+    arrays = {name: np.concatenate(values) for name, values in parts.items()}
+    arrays["roots"] = np.asarray(roots, dtype=np.int32)
+    return arrays
+
+def _sklearn_tree(tree):
+    """DecisionTreeRegressor.tree_ -> düğüm dizileri"""
+    is_leaf = tree.children_left == -1
+    missing_left = getattr(tree, "missing_go_to_left", np.zeros(tree.node_count, dtype=np.uint8))
+    return (tree.feature, tree.threshold, tree.children_left, tree.children_right,
+            missing_left, tree.value[:, 0, 0], is_leaf)
+
+def _hgb_tree(predictor):
+    nodes = predictor.nodes
+    if "is_categorical" in nodes.dtype.names and nodes["is_categorical"].any():
+        raise ValueError("Kategorik bölmeli HistGradientBoosting ağaçları desteklenmiyor")
+    is_leaf = nodes["is_leaf"].astype(bool)
+    return (nodes["feature_idx"], nodes["num_threshold"], nodes["left"], nodes["right"],
+            nodes["missing_go_to_left"], nodes["value"], is_leaf)
+
+class CompactForest:
+    def __init__(self, arrays, meta):
+        """
+        Args:
+            arrays (dict): ARRAYS adlarıyla düğüm dizileri
+            meta (dict): aggregate ('mean' | 'sum'), scale, offset, depth,
+                input_dtype ('float32' sklearn ağaçları, 'float64' HGB), n_features
+        """
+        self.arrays = arrays
+        self.meta = meta
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.depth = meta["depth"]
+        self.input_dtype = np.dtype(meta["input_dtype"])
+
+    @classmethod
+    def from_estimator(cls, model):
+        """Eğitilmiş sklearn modelinden (RF, GB, HGB) dışa aktarım"""
+        from sklearn.ensemble import (RandomForestRegressor, ExtraTreesRegressor,
+                                      GradientBoostingRegressor, HistGradientBoostingRegressor)
+        from sklearn.tree import DecisionTreeRegressor
+
+        if isinstance(model, (RandomForestRegressor, ExtraTreesRegressor)):
+            trees = [_sklearn_tree(est.tree_) for est in model.estimators_]
+            meta = {"aggregate": "mean", "scale": 1.0, "offset": 0.0, "input_dtype": "float32"}
+            depths = [est.tree_.max_depth for est in model.estimators_]
+        elif isinstance(model, DecisionTreeRegressor):
+            trees = [_sklearn_tree(model.tree_)]
+            meta = {"aggregate": "sum", "scale": 1.0, "offset": 0.0, "input_dtype": "float32"}
+            depths = [model.tree_.max_depth]
+        elif isinstance(model, GradientBoostingRegressor):
+            estimators = model.estimators_[:, 0]
+            trees = [_sklearn_tree(est.tree_) for est in estimators]
+            init = 0.0 if model.init_ == "zero" else float(np.ravel(model.init_.constant_)[0])
+            meta = {"aggregate": "sum", "scale": float(model.learning_rate), "offset": init,
+                    "input_dtype": "float32"}
+            depths = [est.tree_.max_depth for est in estimators]
+        elif isinstance(model, HistGradientBoostingRegressor):
+            predictors = [iteration[0] for iteration in model._predictors]
+            trees = [_hgb_tree(predictor) for predictor in predictors]
+            # HGB yaprak değerlerine öğrenme oranı zaten uygulanmış durumda
+            meta = {"aggregate": "sum", "scale": 1.0,
+                    "offset": float(np.ravel(model._baseline_prediction)[0]), "input_dtype": "float64"}
+            depths = [int(predictor.get_max_depth()) for predictor in predictors]
+        else:
+            raise ValueError(f"Desteklenmeyen model türü: {type(model).__name__}")
+
+        meta["depth"] = int(max(depths, default=0))
+        meta["n_features"] = int(model.n_features_in_)
+        meta["n_trees"] = len(trees)
+        meta["model"] = type(model).__name__
+        return cls(_pack(trees), meta)
+
+    def save(self, path):
+        """Dizileri path/ altına .npy, özet bilgiyi meta.json olarak yazar"""
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), self.arrays[name])
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                  for name in ARRAYS}
+        return cls(arrays, meta)
+
+    def predict(self, X, chunk_rows=1024):
+        """
+        Args:
+            X: (n_samples, n_features) dizi veya DataFrame
+            chunk_rows (int): Aynı anda yürütülen satır sayısı (bellek: chunk_rows x n_trees düğüm)
+        """
+        X = np.asarray(X, dtype=self.input_dtype)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        out = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), chunk_rows):
+            out[start:start + chunk_rows] = self._predict_block(X[start:start + chunk_rows])
+        return out
+
+    def _predict_block(self, X):
+        # sklearn ağaçları float32 girdiyi float64 eşikle karşılaştırır
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        flat = X.ravel()
+        row_start = (np.arange(len(X)) * X.shape[1])[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        for _ in range(self.depth):
+            x = flat[row_start + self.feature[node]]
+            go_right = ~(x <= self.threshold[node])
+            missing = np.isnan(x)
+            if missing.any():
+                go_right &= ~(missing & self.missing_left[node])
+            node = self.children[node, go_right.view(np.int8)]
+        values = self.value[node]
+        total = values.mean(axis=1) if self.meta["aggregate"] == "mean" else values.sum(axis=1)
+        return self.meta["offset"] + self.meta["scale"] * total
+
+def export(model_path, output_path=None):
+    """Pickle modeli compact dizine dönüştürür; özellik şeması da yanına kopyalanır"""
+    import sys
+    import joblib
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+    import features
+
+    output_path = output_path or f"{os.path.splitext(model_path)[0]}_compact"
+    forest = CompactForest.from_estimator(joblib.load(model_path))
+    forest.save(output_path)
+    schema = features.schema_path(model_path)
+    if os.path.exists(schema):
+        shutil.copyfile(schema, features.schema_path(output_path))
+    return output_path, forest
+
+def main():
+    parser = argparse.ArgumentParser(description="Ağaç topluluğu modelini compact NumPy biçimine aktarır")
+    parser.add_argument("--model", default="data/rf_energy_sumo_ev_model.pkl")
+    parser.add_argument("--output", default=None, help="Varsayılan: <model>_compact/")
+    args = parser.parse_args()
+
+    output_path, forest = export(args.model, args.output)
+    print(f"{forest.meta['model']} ({forest.meta['n_trees']} ağaç, derinlik {forest.depth}, "
+          f"{len(forest.feature)} düğüm) -> {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+nn .ipynb'deki MLP için CPU'da hızlı eğitim yolu
+
+Veri tek seferde ölçeklenmiş, bitişik float32 tensörlere dönüştürülür; her
+epoch'ta yalnızca bir indeks permütasyonu üretilip büyük batch'ler doğrudan
+bu tensörlerden dilimlenir (Dataset/DataLoader ve örnek başına collate yok).
+Değerlendirme tüm küme üzerinde vektörel yapılır.
+"""
+import copy
+import math
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+
+#MLP modeli (nn .ipynb ile aynı mimari)
+class MLP(nn.Module):
+    def __init__(self, input_size):
+        super(MLP, self).__init__()
+        self.model = nn.Sequential(
+            nn.Linear(input_size, 256),
+            nn.ReLU(),
+            nn.BatchNorm1d(256),
+            nn.Dropout(0.2),
+            nn.Linear(256, 128),
+            nn.ReLU(),
+            nn.BatchNorm1d(128),
+            nn.Dropout(0.15),
+            nn.Linear(128, 64),
+            nn.ReLU(),
+            nn.Linear(64, 1)
+        )
+
+    def forward(self, x):
+        return self.model(x)
+
+def to_tensor(values):
+    """NumPy dizisini (memmap dahil) bitişik float32 tensöre çevirir"""
+    return torch.from_numpy(np.ascontiguousarray(values, dtype=np.float32))
+
+def iter_batches(n, batch_size, generator=None, shuffle=True):
+    """Satır indeks batch'leri: rastgele permütasyonun ardışık dilimleri"""
+    order = torch.randperm(n, generator=generator) if shuffle else torch.arange(n)
+    for start in range(0, n, batch_size):
+        yield order[start:start + batch_size]
+
+@torch.inference_mode()
+def predict_tensor(model, X, batch_size=65536):
+    """Tüm girdi için tahmin (tek çıktı tensörüne büyük batch'lerle)"""
+    model.eval()
+    out = torch.empty(len(X), dtype=torch.float32)
+    for start in range(0, len(X), batch_size):
+        out[start:start + batch_size] = model(X[start:start + batch_size]).view(-1)
+    return out
+
+def regression_metrics(y_true, y_pred):
+    """MAE, RMSE, R² (tensörler üzerinde vektörel)"""
+    err = y_pred.double() - y_true.double()
+    mae = err.abs().mean().item()
+    mse = (err ** 2).mean().item()
+    var = ((y_true.double() - y_true.double().mean()) ** 2).mean().item()
+    return {"MAE": mae, "RMSE": math.sqrt(mse), "R2": 1 - mse / var if var > 0 else float("nan")}
+
+def train_mlp(X_train, y_train, X_val, y_val, epochs=25, batch_size=1024, lr=0.001,
+              weight_decay=1e-5, patience=10, seed=42, verbose=True):
+    """
+    nn .ipynb eğitim döngüsü: Adam + ReduceLROnPlateau(val MAE), gradyan
+    kırpma ve val MAE'ye göre erken durdurma. En iyi ağırlıklar bellekte tutulur.
+
+    Args:
+        X_train, y_train, X_val, y_val: Ölçeklenmiş float32 tensörler (y: (n,))
+        batch_size (int): Eğitim batch boyutu
+
+    Returns:
+        (model, history): en iyi val MAE ağırlıklarıyla model ve epoch metrikleri
+    """
+    torch.manual_seed(seed)
+    generator = torch.Generator().manual_seed(seed)
+    model = MLP(X_train.shape[1])
+
+    #Loss, optimizer, schedular
+    criterion = nn.MSELoss()
+    optimizer = optim.Adam(model.parameters(), lr=lr, weight_decay=weight_decay)
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.1, patience=5)
+
+    y_train = y_train.view(-1, 1)
+    best_val, best_state, wait = float('inf'), None, 0
+    history = []
+    for epoch in range(epochs):
+        # Train
+        model.train()
+        for idx in iter_batches(len(X_train), batch_size, generator):
+            if len(idx) < 2:
+                continue  # BatchNorm tek örnekli batch ile eğitilemez
+            optimizer.zero_grad(set_to_none=True)
+            loss = criterion(model(X_train[idx]), y_train[idx])
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+            optimizer.step()
+
+        # Validation
+        val = regression_metrics(y_val, predict_tensor(model, X_val))
+        scheduler.step(val["MAE"])
+        history.append({"epoch": epoch + 1, **val})
+        if verbose:
+            print(f"Epoch {epoch+1} | Val MAE: {val['MAE']:.4f} | RMSE: {val['RMSE']:.4f} | R²: {val['R2']:.4f}")
+
+        # Early stopping
+        if val["MAE"] < best_val:
+            best_val = val["MAE"]
+            best_state = copy.deepcopy(model.state_dict())
+            wait = 0
+        else:
+            wait += 1
+            if wait >= patience:
+                if verbose:
+                    print("Early stopping.")
+                break
+
+    if best_state is not None:
+        model.load_state_dict(best_state)
+    model.eval()
+    return model, history
+
+class TorchMLPRegressor:
+    """
+    sklearn benzeri fit/predict sarmalayıcı (models/train.py adayı)
+
+    Ölçekleme (StandardScaler karşılığı) model içinde saklanır; predict
+    NumPy girdi alır ve NumPy döndürür.
+    """
+    uses_eval_set = True
+
+    def __init__(self, epochs=25, batch_size=1024, lr=0.001, weight_decay=1e-5, patience=10,
+                 threads=None, seed=42, verbose=False):
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.lr = lr
+        self.weight_decay = weight_decay
+        self.patience = patience
+        self.threads = threads
+        self.seed = seed
+        self.verbose = verbose
+
+    def _scaled(self, X):
+        X = to_tensor(X)
+        return (X - self.mean_) / self.scale_
+
+    def fit(self, X, y, eval_set=None):
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        X = np.asarray(X)
+        mean = X.mean(axis=0, dtype=np.float64)
+        scale = X.std(axis=0, dtype=np.float64)
+        scale[scale == 0] = 1.0
+        self.mean_ = torch.from_numpy(mean.astype(np.float32))
+        self.scale_ = torch.from_numpy(scale.astype(np.float32))
+
+        X_val, y_val = eval_set if eval_set is not None else (X, y)
+        self.model_, self.history_ = train_mlp(
+            self._scaled(X), to_tensor(y), self._scaled(X_val), to_tensor(y_val),
+            epochs=self.epochs, batch_size=self.batch_size, lr=self.lr, weight_decay=self.weight_decay,
+            patience=self.patience, seed=self.seed, verbose=self.verbose,
+        )
+        return self
+
+    def predict(self, X):
+        return predict_tensor(self.model_, self._scaled(X)).numpy()
@@ -0,0 +1,263 @@
+"""
+Model karşılaştırma (bake-off) giriş noktası
+
+    python -m models.train --input data/final_training_data.csv
+
+Veri seti bir kez okunup özellikleri (src/features.py) .npy olarak kaydedilir;
+aday modeller ayrı süreçlerde bu dosyaları memory-map ile paylaşır ve aynı
+araç bazlı group_split ile eğitilip karşılaştırılır.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.model_selection import GroupShuffleSplit
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import features
+
+# --------------------------
+# Aday modeller: ad -> fn(n_jobs) -> tahminci
+# --------------------------
+def make_rf(n_jobs):
+    from sklearn.ensemble import RandomForestRegressor
+    # randomforest.ipynb ile aynı hiperparametreler
+    return RandomForestRegressor(
+        n_estimators=100,
+        max_depth=10,
+        min_samples_split=5,
+        min_samples_leaf=2,
+        random_state=42,
+        n_jobs=n_jobs,
+    )
+
+def make_hgb(n_jobs):
+    from sklearn.ensemble import HistGradientBoostingRegressor
+    return HistGradientBoostingRegressor(max_iter=300, learning_rate=0.1, random_state=42)
+
+def make_mlp(n_jobs):
+    # nn .ipynb'deki MLP, tensör batch'li eğitim yolu (models/mlp.py)
+    from models.mlp import TorchMLPRegressor
+    return TorchMLPRegressor(batch_size=1024, threads=n_jobs)
+
+CANDIDATES = {
+    "rf": make_rf,
+    "hgb": make_hgb,
+    "mlp": make_mlp,
+}
+
+# --------------------------
+# Veri seti (bir kez yüklenir, süreçler arasında memory-map ile paylaşılır)
+# --------------------------
+def prepare_dataset(input_file, data_dir, version=features.FEATURE_VERSION, chunksize=500000):
+    """
+    Özellik matrisini parça parça üretip data_dir altına X.npy, y.npy ve
+    groups.npy (araç kodları) olarak kaydeder.
+
+    Girdi her adımı içeren (sample_steps = 1) veri olmalıdır; örneklenmiş
+    (--sampling nth/adaptive/trip) veri setleri ValueError ile reddedilir.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    X_parts, y_parts, id_parts = [], [], []
+    for X, y, vehicle_ids in features.iter_feature_chunks(input_file, version, chunksize):
+        X_parts.append(X)
+        y_parts.append(y)
+        id_parts.append(vehicle_ids.astype(str))
+    if not X_parts:
+        raise ValueError(f"{input_file} içinde eğitime uygun satır yok")
+
+    n_rows = sum(len(X) for X in X_parts)
+    X_all = np.lib.format.open_memmap(os.path.join(data_dir, "X.npy"), mode="w+", dtype=np.float32,
+                                      shape=(n_rows, X_parts[0].shape[1]))
+    start = 0
+    for X in X_parts:
+        X_all[start:start + len(X)] = X
+        start += len(X)
+    X_all.flush()
+    del X_all, X_parts
+
+    np.save(os.path.join(data_dir, "y.npy"), np.concatenate(y_parts))
+    # Sıralı benzersiz id'lerin kodları: GroupShuffleSplit, id'lerle aynı bölmeyi üretir
+    vehicle_ids, groups = np.unique(np.concatenate(id_parts), return_inverse=True)
+    np.save(os.path.join(data_dir, "groups.npy"), groups.astype(np.int32))
+    with open(os.path.join(data_dir, "dataset.json"), "w", encoding="utf-8") as f:
+        json.dump({"source": os.path.abspath(input_file), "rows": n_rows, "version": version,
+                   "vehicles": vehicle_ids.tolist()}, f)
+    return n_rows
+
+def dataset_version(data_dir):
+    """Hazırlanmış veri setinin özellik şeması (yoksa None)"""
+    path = os.path.join(data_dir, "dataset.json")
+    if not os.path.exists(os.path.join(data_dir, "X.npy")) or not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("version")
+
+def load_dataset(data_dir):
+    X = np.load(os.path.join(data_dir, "X.npy"), mmap_mode="r")
+    y = np.load(os.path.join(data_dir, "y.npy"), mmap_mode="r")
+    groups = np.load(os.path.join(data_dir, "groups.npy"), mmap_mode="r")
+    return X, y, groups
+
+def group_split(groups, test_size=0.15, val_size=0.15, rs=42):
+    """
+    Notebook'lardaki group_split ile aynı bölme (satır indeksleri döner).
+    Aynı araca ait TÜM satırlar tek bir parçada (train, val veya test) kalır.
+    """
+    n = len(groups)
+    gss = GroupShuffleSplit(n_splits=1, test_size=test_size, random_state=rs)
+    i_tr, i_te = next(gss.split(np.zeros(n), groups=groups))
+    gss2 = GroupShuffleSplit(n_splits=1, test_size=val_size/(1-test_size), random_state=rs)
+    j_tr, j_val = next(gss2.split(np.zeros(len(i_tr)), groups=groups[i_tr]))
+    return i_tr[j_tr], i_tr[j_val], i_te
+
+def metric_dict(y_true, y_pred):
+    rmse = np.sqrt(mean_squared_error(y_true, y_pred))
+    mae = mean_absolute_error(y_true, y_pred)
+    r2  = r2_score(y_true, y_pred)
+    return {"MAE": float(mae), "RMSE": float(rmse), "R2": float(r2)}
+
+def measure_latency(model, X, repeats=50, batch_size=1000):
+    """Tek satır tahmin süresi (medyan, ms) ve batch tahminde satır başına süre (µs)"""
+    row = np.ascontiguousarray(X[:1])
+    single = []
+    for _ in range(repeats):
+        t = time.perf_counter()
+        model.predict(row)
+        single.append(time.perf_counter() - t)
+    batch = np.ascontiguousarray(X[:batch_size])
+    t = time.perf_counter()
+    model.predict(batch)
+    per_row = (time.perf_counter() - t) / max(len(batch), 1)
+    return float(np.median(single) * 1e3), float(per_row * 1e6)
+
+def train_candidate(name, data_dir, n_jobs, output_dir, version=features.FEATURE_VERSION):
+    """Bir adayı eğitir, değerlendirir ve kaydeder (işçi süreçte çalışır)"""
+    from threadpoolctl import threadpool_limits
+
+    X, y, groups = load_dataset(data_dir)
+    split = np.load(os.path.join(data_dir, "split.npz"))
+    train_idx, val_idx, test_idx = split["train"], split["val"], split["test"]
+
+    # OpenMP/BLAS iş parçacıkları da adayın CPU payıyla sınırlanır
+    with threadpool_limits(limits=n_jobs):
+        model = CANDIDATES[name](n_jobs)
+        t = time.perf_counter()
+        # Erken durdurma kullanan adaylar validation setini de alır
+        fit_kwargs = {"eval_set": (X[val_idx], y[val_idx])} if getattr(model, "uses_eval_set", False) else {}
+        model.fit(X[train_idx], y[train_idx], **fit_kwargs)
+        fit_time = time.perf_counter() - t
+
+        val = metric_dict(y[val_idx], model.predict(X[val_idx]))
+        test = metric_dict(y[test_idx], model.predict(X[test_idx]))
+        latency_ms, per_row_us = measure_latency(model, X[test_idx])
+
+    model_path = os.path.join(output_dir, f"{name}_energy_model.pkl")
+    joblib.dump(model, model_path, compress=3)
+    features.save_schema(model_path, version)
+
+    return {
+        "model": name,
+        "n_jobs": n_jobs,
+        "val_MAE": val["MAE"], "val_RMSE": val["RMSE"], "val_R2": val["R2"],
+        "test_MAE": test["MAE"], "test_RMSE": test["RMSE"], "test_R2": test["R2"],
+        "fit_s": fit_time,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "latency_1row_ms": latency_ms,
+        "batch_us_per_row": per_row_us,
+        "path": model_path,
+    }
+
+def cpu_budgets(names, budget=None):
+    """Aday başına iş parçacığı sayısı; verilmeyenler kalan çekirdekleri eşit paylaşır"""
+    budgets = dict(budget or {})
+    free = max((os.cpu_count() or 1) - sum(budgets.values()), 1)
+    rest = [name for name in names if name not in budgets]
+    for name in rest:
+        budgets[name] = max(free // len(rest), 1)
+    return {name: budgets[name] for name in names}
+
+def run_bakeoff(input_file, output_dir="models/output", candidates=None, budget=None,
+                workers=None, chunksize=500000, reuse_data=False, version=features.FEATURE_VERSION):
+    """
+    Veri setini bir kez hazırlar ve adayları paralel eğitip karşılaştırma tablosu döndürür
+    """
+    candidates = list(candidates or CANDIDATES)
+    unknown = [name for name in candidates if name not in CANDIDATES]
+    if unknown:
+        raise ValueError(f"Bilinmeyen model(ler): {unknown}, seçenekler: {sorted(CANDIDATES)}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    data_dir = os.path.join(output_dir, "dataset")
+    if not (reuse_data and dataset_version(data_dir) == version):
+        t = time.perf_counter()
+        n_rows = prepare_dataset(input_file, data_dir, version, chunksize)
+        print(f"Özellikler hazırlandı: {n_rows} satır ({time.perf_counter() - t:.1f} s)")
+
+    _, _, groups = load_dataset(data_dir)
+    train_idx, val_idx, test_idx = group_split(np.asarray(groups))
+    np.savez(os.path.join(data_dir, "split.npz"), train=train_idx, val=val_idx, test=test_idx)
+    print(f"Split -> train:{len(train_idx)}, val:{len(val_idx)}, test:{len(test_idx)}")
+
+    budgets = cpu_budgets(candidates, budget)
+    results = []
+    # max_tasks_per_child=1: her aday temiz bir süreçte (ölçülen bellek yalnızca ona ait)
+    with ProcessPoolExecutor(max_workers=workers or len(candidates), max_tasks_per_child=1) as pool:
+        futures = {pool.submit(train_candidate, name, data_dir, budgets[name], output_dir, version): name
+                   for name in candidates}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+                print(f"{name} tamamlandı ({result['fit_s']:.1f} s)")
+                results.append(result)
+            except Exception as e:
+                print(f"{name} eğitilemedi: {e}")
+
+    table = pd.DataFrame(results)
+    if not table.empty:
+        table = table.sort_values("val_RMSE").reset_index(drop=True)
+        table.to_csv(os.path.join(output_dir, "comparison.csv"), index=False)
+    return table
+
+def parse_budget(text):
+    budget = {}
+    for item in filter(None, (text or "").split(",")):
+        name, n = item.split("=")
+        budget[name.strip()] = int(n)
+    return budget
+
+def main():
+    parser = argparse.ArgumentParser(description="Enerji tüketimi modellerini paralel eğitip karşılaştırır")
+    parser.add_argument("--input", default="data/final_training_data.csv")
+    parser.add_argument("--output-dir", default="models/output")
+    parser.add_argument("--models", default=",".join(CANDIDATES),
+                        help=f"Virgülle ayrılmış adaylar ({', '.join(CANDIDATES)})")
+    parser.add_argument("--budget", default="", help="Aday başına çekirdek, ör. rf=4,hgb=2")
+    parser.add_argument("--workers", type=int, default=None, help="Aynı anda eğitilen aday sayısı")
+    parser.add_argument("--chunksize", type=int, default=500000)
+    parser.add_argument("--reuse-data", action="store_true", help="Hazırlanmış özellik dosyalarını tekrar kullan")
+    parser.add_argument("--feature-version", type=int, default=features.FEATURE_VERSION,
+                        choices=sorted(features.FEATURE_SCHEMAS),
+                        help="Özellik şeması (2: fiziksel modelin adım enerjisi physics_wh eklenir)")
+    args = parser.parse_args()
+
+    table = run_bakeoff(args.input, args.output_dir, args.models.split(","), parse_budget(args.budget),
+                        args.workers, args.chunksize, args.reuse_data, args.feature_version)
+    if table.empty:
+        print("Hiçbir model eğitilemedi!")
+        return
+
+    print("\nModel karşılaştırması:")
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(table.drop(columns=["path"]).round(4).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
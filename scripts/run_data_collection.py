@@ -6,7 +6,23 @@ SUMO Data Collection Script
 This script collects data from SUMO simulation and saves it to a CSV file.
 
 Usage:   
-    python run_data_collection.py
+    python run_data_collection.py [--mode traci|native] [--backend traci|libsumo] [--no-subscriptions]
+    python run_data_collection.py --live-model ../data/rf_energy_sumo_ev_model_compact --live-every 5
+    python run_data_collection.py --checkpoint-every 600 [--resume]
+    python run_data_collection.py --sampling adaptive
+
+    The backend can also be selected with the SUMO_BACKEND environment variable.
+    'libsumo' runs SUMO in-process (no GUI, no socket) and is much faster.
+    '--mode native' skips TraCI entirely: SUMO writes --fcd-output and
+    --battery-output, which are then stream-parsed into the same columns.
+    '--checkpoint-every N' saves the SUMO state and the collector state every
+    N steps; after a crash '--resume' continues from the latest checkpoint,
+    appending to the same output file without duplicating rows.
+    '--sampling nth|adaptive|trip' writes fewer rows (every N steps, on
+    speed/acceleration/edge changes, or one row per trip); the energy of the
+    skipped steps is added to the next written row, whose sample_steps column
+    says how many steps it covers. Only every-step output can be used to
+    train the models.
 
 Requirements:
     - SUMO must be installed
@@ -17,6 +33,7 @@ Requirements:
 import os
 import sys
 import time
+import argparse
 from datetime import datetime
 
 def check_requirements():
@@ -54,7 +71,59 @@ def check_requirements():
     print("✓ All requirements met")
     return True
 
+def report(summary, output_file, elapsed):
+    if summary is not None:
+        print(f"\n✓ Data collection completed! ({elapsed:.1f} seconds)")
+        print(f"✓ Data saved to '{output_file}'")
+        print(f"✓ Total records: {summary['records']:,}")
+        print(f"✓ Unique vehicle count: {summary['vehicles']}")
+        print(f"✓ Unique vehicle types: {summary['vehicle_types']}")
+
+        # Show file size
+        file_size = os.path.getsize(output_file) / (1024 * 1024)  # MB
+        print(f"✓ File size: {file_size:.2f} MB")
+    else:
+        print("✗ Data collection failed!")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Collect EV data from a SUMO simulation")
+    parser.add_argument("--mode", choices=["traci", "native"], default="traci",
+                        help="Collect through TraCI or from SUMO's native fcd/battery outputs")
+    parser.add_argument("--backend", choices=["traci", "libsumo"], default=None,
+                        help="SUMO backend (default: SUMO_BACKEND env variable or 'traci')")
+    parser.add_argument("--no-subscriptions", action="store_true",
+                        help="Poll every vehicle variable instead of using TraCI subscriptions")
+    parser.add_argument("--output", default="../data/buyukdere_simulation_data_final.csv",
+                        help="Output file; .csv, .parquet or .arrow (default: %(default)s)")
+    parser.add_argument("--row-group-size", type=int, default=65536,
+                        help="Rows buffered before each write to disk (default: %(default)s)")
+    parser.add_argument("--live-model", default=None,
+                        help="Predict energy during the run with this model (pickle or compact forest dir)")
+    parser.add_argument("--live-every", type=int, default=1, help="Predict every N steps (default: %(default)s)")
+    parser.add_argument("--live-set-params", action="store_true",
+                        help="Show running predicted/true Wh as vehicle parameters in sumo-gui")
+    parser.add_argument("--live-network", default=None,
+                        help="Network index (src/network_index.py) for lane-based grades in live prediction")
+    parser.add_argument("--sampling", choices=["every-step", "nth", "adaptive", "trip"], default="every-step",
+                        help="Which records are written (see src/sampling.py; default: %(default)s)")
+    parser.add_argument("--sample-every", type=int, default=10,
+                        help="'nth': write every N steps (default: %(default)s)")
+    parser.add_argument("--sample-speed-threshold", type=float, default=0.5,
+                        help="'adaptive': speed change (m/s) that triggers a record (default: %(default)s)")
+    parser.add_argument("--sample-acceleration-threshold", type=float, default=0.3,
+                        help="'adaptive': acceleration change (m/s²) that triggers a record (default: %(default)s)")
+    parser.add_argument("--sample-max-interval", type=int, default=30,
+                        help="'adaptive': steps after which a record is written anyway (default: %(default)s)")
+    parser.add_argument("--checkpoint-every", type=int, default=0,
+                        help="Save a resumable checkpoint every N steps (default: off)")
+    parser.add_argument("--checkpoint-dir", default="../output/checkpoints",
+                        help="Directory of the checkpoint files (default: %(default)s)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue from the latest checkpoint in --checkpoint-dir")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     print("SUMO Data Collection System")
     print("=" * 40)
     print(f"Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -77,30 +146,49 @@ def main():
     print("="*40)
     
     # Create data collector
-    collector = SUMODataCollector("../config/main.sumocfg")
+    # Save SUMO's random number generators with the state so a resumed run
+    # continues exactly like an uninterrupted one
+    sumo_args = ["--save-state.rng", "true"] if args.checkpoint_every else []
+    collector = SUMODataCollector("../config/main.sumocfg",
+                                  use_subscriptions=not args.no_subscriptions,
+                                  backend=args.backend, sumo_args=sumo_args)
+    if args.resume:
+        if args.mode == "native":
+            print("✗ --resume is only supported in traci mode")
+            return
+        collector.load_checkpoint(args.checkpoint_dir)
     
+    from sampling import policy_options
+    sampling = collector.sampling_policy(args.sampling, **policy_options(
+        args.sampling, args.sample_every, args.sample_speed_threshold,
+        args.sample_acceleration_threshold, args.sample_max_interval))
+    
+    if args.mode == "native":
+        start_time = time.time()
+        summary = collector.collect_native(args.output,
+                                           fcd_file="../output/fcd.xml.gz",
+                                           battery_file="../output/battery.xml.gz",
+                                           row_group_size=args.row_group_size,
+                                           sampling=sampling)
+        report(summary, args.output, time.time() - start_time)
     # Start simulation
-    if collector.start_simulation():
+    elif collector.start_simulation():
         try:
             print("Simulation started, data collection started...")
             
+            live = None
+            if args.live_model:
+                live = collector.live_predictor(args.live_model, every=args.live_every,
+                                                set_parameters=args.live_set_params,
+                                                network_path=args.live_network)
             start_time = time.time()
-            df = collector.collect_data("../data/buyukdere_simulation_data_final.csv")
+            summary = collector.collect_data(args.output, row_group_size=args.row_group_size,
+                                             live_predictor=live,
+                                             checkpoint_every=args.checkpoint_every,
+                                             checkpoint_dir=args.checkpoint_dir,
+                                             sampling=sampling)
             end_time = time.time()
-            
-            if df is not None:
-                print(f"\n✓ Data collection completed! ({end_time - start_time:.1f} seconds)")
-                print(f"✓ Data saved to '../data/buyukdere_simulation_data_final.csv'")
-                print(f"✓ Total records: {len(df):,}")
-                print(f"✓ Unique vehicle count: {df['vehicle_id'].nunique()}")
-                print(f"✓ Unique vehicle types: {df['vehicle_type'].nunique()}")
-                
-                # Show file size
-                file_size = os.path.getsize("../data/buyukdere_simulation_data_final.csv") / (1024 * 1024)  # MB
-                print(f"✓ File size: {file_size:.2f} MB")
-                
-            else:
-                print("✗ Data collection failed!")
+            report(summary, args.output, end_time - start_time)
                 
         finally:
             # Close simulation
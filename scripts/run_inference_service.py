@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Energy Prediction Service
+=========================
+
+Keeps the trained model in memory and serves energy predictions to other
+local tools (route planners, dashboards, ...). Concurrent requests are
+coalesced into micro-batches and predicted with one vectorized call.
+
+Usage:
+    python run_inference_service.py --port 8765
+    python run_inference_service.py --unix /tmp/ev_energy.sock --store ../data/trajectories
+
+Endpoints:
+    POST /predict  {"columns": {"speed_kmh": [...], "acceleration": [...], ...}}
+                   {"samples": [{"speed_kmh": 42.0, ...}, ...]}
+                   {"vehicle_id": "veh12"}   (requires --store)
+                   -> {"per_step_wh": [...], "total_wh": ..., "true_total_wh": ...}
+    GET  /stats    request/row/batch counters, throughput and latency percentiles
+    GET  /health
+"""
+
+import os
+import sys
+import argparse
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve EV energy predictions over HTTP")
+    parser.add_argument("--model", default="../data/rf_energy_sumo_ev_model.pkl",
+                        help="Pickled model or compact forest directory (default: %(default)s)")
+    parser.add_argument("--store", default=None, help="Trajectory store for requests by vehicle_id")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("--max-batch-rows", type=int, default=65536, help="Rows per model call")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0,
+                        help="How long a request may wait for others to share its batch")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+    from inference_service import EnergyService, make_server
+
+    service = EnergyService(args.model, args.store, args.max_batch_rows, args.max_wait_ms)
+    server = make_server(service, args.host, args.port, args.unix)
+    address = args.unix or f"http://{args.host}:{args.port}"
+    print(f"Serving {args.model} (feature schema v{service.version}) on {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        server.server_close()
+        service.close()
+        if args.unix and os.path.exists(args.unix):
+            os.remove(args.unix)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Parallel SUMO Data Collection Script
+==================================
+
+Splits the fleet into independent shards, runs each shard in its own SUMO
+instance from a process pool and merges the per-shard outputs into one
+dataset.
+
+Usage:
+    python run_parallel_collection.py --shards 8
+    python run_parallel_collection.py --seeds 1 2 3 4
+    python run_parallel_collection.py --scenarios ../config/a.rou.xml ../config/b.rou.xml
+    python run_parallel_collection.py --seeds 1 2 3 4 --sampling adaptive
+
+Shard strategies:
+    --shards N     N disjoint vehicle subsets of the route file (ids unchanged).
+                   Vehicles of different shards no longer interact, so traffic
+                   is lighter than in the single-instance run.
+    --seeds ...    The full fleet once per seed; ids are prefixed ("seed3_veh12").
+    --scenarios .. One route file per shard; ids are prefixed ("scenario0_veh12").
+"""
+
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Collect EV data from parallel SUMO instances")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--shards", type=int, default=os.cpu_count(),
+                       help="Number of disjoint vehicle subsets (default: CPU count)")
+    group.add_argument("--seeds", type=int, nargs="+", help="Replicate the fleet with these seeds")
+    group.add_argument("--scenarios", nargs="+", help="Route files, one per shard")
+    parser.add_argument("--config", default="../config/main.sumocfg", help="SUMO configuration")
+    parser.add_argument("--mode", choices=["traci", "native"], default="traci",
+                        help="Collection mode inside each shard")
+    parser.add_argument("--backend", choices=["traci", "libsumo"], default=None,
+                        help="SUMO backend for the TraCI mode")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    parser.add_argument("--work-dir", default="../output/shards", help="Directory for shard files")
+    parser.add_argument("--output", default="../data/buyukdere_simulation_data_final.csv",
+                        help="Merged output; .csv, .parquet or .arrow (default: %(default)s)")
+    parser.add_argument("--sampling", choices=["every-step", "nth", "adaptive", "trip"], default="every-step",
+                        help="Which records are written (see src/sampling.py; default: %(default)s)")
+    parser.add_argument("--sample-every", type=int, default=10,
+                        help="'nth': write every N steps (default: %(default)s)")
+    parser.add_argument("--sample-speed-threshold", type=float, default=0.5,
+                        help="'adaptive': speed change (m/s) that triggers a record (default: %(default)s)")
+    parser.add_argument("--sample-acceleration-threshold", type=float, default=0.3,
+                        help="'adaptive': acceleration change (m/s²) that triggers a record (default: %(default)s)")
+    parser.add_argument("--sample-max-interval", type=int, default=30,
+                        help="'adaptive': steps after which a record is written anyway (default: %(default)s)")
+    parser.add_argument("--keep-shard-outputs", action="store_true", help="Keep per-shard datasets")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    print("SUMO Parallel Data Collection System")
+    print("=" * 40)
+    print(f"Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+    from data_collector import SUMODataCollector
+    import parallel_runner
+    from sampling import policy_options
+
+    if args.seeds:
+        route_file = SUMODataCollector(args.config).config_path("input", "route-files")
+        shards = parallel_runner.seed_shards(route_file, args.seeds)
+    elif args.scenarios:
+        shards = parallel_runner.scenario_shards(args.scenarios)
+    else:
+        route_file = SUMODataCollector(args.config).config_path("input", "route-files")
+        shards = parallel_runner.vehicle_shards(route_file, args.shards, args.work_dir)
+
+    print(f"Running {len(shards)} shards on {args.workers or os.cpu_count()} workers...")
+    start_time = time.time()
+    sink = parallel_runner.run_parallel(args.config, shards, args.output,
+                                        mode=args.mode, backend=args.backend,
+                                        workers=args.workers, work_dir=args.work_dir,
+                                        keep_shard_outputs=args.keep_shard_outputs,
+                                        sampling=(args.sampling, policy_options(
+                                            args.sampling, args.sample_every, args.sample_speed_threshold,
+                                            args.sample_acceleration_threshold, args.sample_max_interval)))
+
+    print(f"\n✓ Parallel data collection completed! ({time.time() - start_time:.1f} seconds)")
+    print(f"✓ Total records: {sink.rows_written:,}")
+    print(f"✓ Unique vehicle count: {sink.distinct_count('vehicle_id')}")
+    print(f"\nEnd time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+if __name__ == "__main__":
+    main()
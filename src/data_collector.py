@@ -1,63 +1,341 @@
 import traci
+import traci.constants as tc
 import pandas as pd
 import numpy as np
 import time
 import os
+import gzip
+import subprocess
 from datetime import datetime
 import xml.etree.ElementTree as ET
 import math
+import sys
+import pickle
+import itertools
+from data_sink import STRING, open_sink, read_output_head
+from vtypes import VTypeTable, PHYSICS_COLUMNS
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "utils"))
+from calculate_lan_lot import NetProjection
+
+# Output columns of one vehicle sample, in record order
+RAW_SCHEMA = [
+    ('timestamp', 'int32'),
+    ('vehicle_id', STRING),
+    ('vehicle_type', STRING),
+    ('speed_ms', 'float32'),
+    ('speed_kmh', 'float32'),
+    ('lat', 'float64'),
+    ('lon', 'float64'),
+    ('z', 'float64'),
+    ('edge_id', STRING),
+    ('lane_id', STRING),
+    ('lane_position', 'float32'),
+    ('angle', 'float32'),
+    ('lane_speed_limit', 'float32'),
+    ('charge_level', 'float64'),
+    ('capacity', 'float64'),
+    ('acceleration', 'float32'),
+    ('mass_kg', 'float32'),
+    ('battery_level', 'float64'),
+    ('soc_pc', 'float32'),
+    ('energy_consumption', 'float64'),
+    # Simulation steps covered by energy_consumption (1 unless a sampling policy drops steps, see src/sampling.py)
+    ('sample_steps', 'int32'),
+] + [(column, 'float32') for column in PHYSICS_COLUMNS]
+RAW_COLUMNS = [name for name, _ in RAW_SCHEMA]
+
+# Records are collected with raw network x/y in place of lat/lon; whole
+# columns are converted when a row group is flushed (see geo_transform)
+RECORD_SCHEMA = [({'lat': 'x', 'lon': 'y'}.get(name, name), dtype) for name, dtype in RAW_SCHEMA]
+RECORD_COLUMNS = [name for name, _ in RECORD_SCHEMA]
+
+# Vehicle variables delivered in one bulk subscription result per step
+VEHICLE_SUBSCRIPTION_VARS = (
+    tc.VAR_SPEED,
+    tc.VAR_ACCELERATION,
+    tc.VAR_POSITION3D,
+    tc.VAR_ROAD_ID,
+    tc.VAR_LANE_ID,
+    tc.VAR_LANEPOSITION,
+    tc.VAR_ANGLE,
+    tc.VAR_TYPE,
+    tc.VAR_PARAMETER_WITH_KEY,
+)
+
+# Per-step battery consumption (Wh) is subscribed as a keyed parameter.
+# Only one keyed parameter fits in a vehicle subscription, so the charge
+# level is tracked from it instead of being polled every step.
+BATTERY_SUBSCRIPTION_PARAMS = {
+    tc.VAR_PARAMETER_WITH_KEY: ("s", "device.battery.energyConsumed"),
+}
+
+SIMULATION_SUBSCRIPTION_VARS = (
+    tc.VAR_DEPARTED_VEHICLES_IDS,
+    tc.VAR_ARRIVED_VEHICLES_IDS,
+)
+
+BACKENDS = ("traci", "libsumo")
+
+# Latest checkpoint of a collection run, inside the checkpoint directory
+CHECKPOINT_FILE = "checkpoint.pkl"
+
+def load_backend(backend=None):
+    """
+    Return the TraCI-compatible module for the given backend.
+
+    'traci' talks to a separate sumo process over a socket, 'libsumo' runs
+    SUMO in-process with the same API. If backend is None the SUMO_BACKEND
+    environment variable is used, defaulting to 'traci'.
+    """
+    backend = (backend or os.environ.get("SUMO_BACKEND", "traci")).lower()
+    if backend == "traci":
+        return traci
+    if backend == "libsumo":
+        import libsumo
+        return libsumo
+    raise ValueError(f"Unknown SUMO backend '{backend}', expected one of {BACKENDS}")
+
+def open_xml(path):
+    """Open a (possibly gzipped) SUMO XML file for binary reading"""
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+def iter_timesteps(path):
+    """
+    Stream-parse a SUMO per-step output (fcd-output, battery-output)
+
+    Yields (time, [vehicle attribute dicts]) per <timestep>; parsed elements
+    are cleared as we go so memory does not grow with the file size.
+    """
+    with open_xml(path) as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event == "end" and elem.tag == "timestep":
+                yield float(elem.get("time")), [vehicle.attrib for vehicle in elem.iter("vehicle")]
+                root.clear()
+
+def read_lane_speeds(net_file):
+    """Read lane speed limits (m/s) from a SUMO network in one streaming pass"""
+    speeds = {}
+    with open_xml(net_file) as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event != "end":
+                continue
+            if elem.tag == "lane":
+                speeds[elem.get("id")] = float(elem.get("speed"))
+            elif elem.tag in ("edge", "junction", "connection"):
+                root.clear()
+    return speeds
+
+def battery_value(attrs, *keys):
+    """Return the first present battery-output attribute (names changed between SUMO versions)"""
+    for key in keys:
+        value = attrs.get(key)
+        if value is not None:
+            return float(value)
+    return np.nan
 
 class SUMODataCollector:
-    def __init__(self, sumocfg_file="config/main.sumocfg"):
+    def __init__(self, sumocfg_file="config/main.sumocfg", use_subscriptions=True, backend=None,
+                 sumo_args=None, tripinfo_file="output/tripinfo.xml", vtypes_file=None):
         """
         Data collector class for SUMO simulation
         
         Args:
             sumocfg_file (str): SUMO konfigürasyon dosyası
+            use_subscriptions (bool): Collect each step from one bulk TraCI
+                subscription result instead of polling every variable
+            backend (str): 'traci' (socket) or 'libsumo' (in-process);
+                defaults to the SUMO_BACKEND environment variable
+            sumo_args (list): Extra SUMO command line options (e.g. route file, seed)
+            tripinfo_file (str): Where SUMO writes the tripinfo output
+            vtypes_file (str): vType definitions; defaults to the additional
+                files of the sumocfg
         """
         self.sumocfg_file = sumocfg_file
-        self.data = []
+        self.sumo_args = list(sumo_args or [])
+        self.tripinfo_file = tripinfo_file
+        self.traci = load_backend(backend)
+        self.use_subscriptions = use_subscriptions
         self.vehicle_data = {}
         self.simulation_step = 0
+        # Static per-lane speed limits, fetched once per lane
+        self.lane_speed_limits = {}
+        # Network projection for the flush-time x/y -> lat/lon conversion
+        self.projection = None
+        # All vType attributes and params, loaded once
+        self.vtypes = VTypeTable.from_xml(vtypes_file or self.additional_files())
+        # Checkpoint the run continues from (see load_checkpoint)
+        self.checkpoint = None
         
     def start_simulation(self):
         try:
             # Start SUMO
             sumo_binary = "sumo" 
-            sumo_cmd = [sumo_binary, "-c", self.sumocfg_file, "--tripinfo-output", "output/tripinfo.xml"]
+            tripinfo_file = self.tripinfo_file
+            resume_args = []
+            if self.checkpoint is not None:
+                # Continue from the saved state; the tripinfo of trips that ended
+                # before the checkpoint stays in the first run's file
+                root, ext = os.path.splitext(self.tripinfo_file)
+                tripinfo_file = f"{root}.resumed_{self.simulation_step}{ext}"
+                resume_args = ["--load-state", self.checkpoint['state_file']]
+            sumo_cmd = [sumo_binary, "-c", self.sumocfg_file, "--tripinfo-output", tripinfo_file] + self.sumo_args + resume_args
             
-            traci.start(sumo_cmd)
-            print("SUMO simulation started")
+            self.traci.start(sumo_cmd)
+            print(f"SUMO simulation started ({self.traci.__name__} backend)")
             return True
         except Exception as e:
             print(f"SUMO failed to start: {e}")
             return False
     
+    def config_value(self, section, key, default=None):
+        """Read a value from the sumocfg file, e.g. ("input", "net-file")"""
+        element = ET.parse(self.sumocfg_file).getroot().find(f"{section}/{key}")
+        return element.get("value") if element is not None else default
+
+    def config_path(self, section, key):
+        """Resolve a file option of the sumocfg relative to the config directory"""
+        value = self.config_value(section, key)
+        return os.path.join(os.path.dirname(self.sumocfg_file), value) if value else None
+
+    def additional_files(self):
+        """Additional files of the sumocfg (where the vTypes are defined)"""
+        value = self.config_value("input", "additional-files")
+        if not value:
+            return ["config/vehicles.add.xml"]
+        directory = os.path.dirname(self.sumocfg_file)
+        return [os.path.join(directory, name.strip()) for name in value.replace(" ", ",").split(",") if name.strip()]
+
+    def run_native_outputs(self, fcd_file, battery_file):
+        """Run SUMO headless to the end, writing per-step vehicle and battery state natively"""
+        for path in (fcd_file, battery_file):
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        sumo_cmd = ["sumo", "-c", self.sumocfg_file,
+                    "--tripinfo-output", self.tripinfo_file,
+                    "--fcd-output", fcd_file,
+                    "--fcd-output.acceleration", "true",
+                    "--battery-output", battery_file] + self.sumo_args
+        print(f"Running SUMO with native outputs: {' '.join(sumo_cmd)}")
+        subprocess.run(sumo_cmd, check=True)
+
+    def iter_native_records(self, fcd_file, battery_file):
+        """
+        Join fcd-output and battery-output step by step into RECORD_SCHEMA tuples
+
+        Both files are parsed incrementally. Lane speed limits come from the
+        network and vehicle physics from the vType table.
+        """
+        lane_speeds = read_lane_speeds(self.config_path("input", "net-file"))
+        step_length = float(self.config_value("time", "step-length", 1.0))
+
+        battery_steps = iter_timesteps(battery_file)
+        battery_time, battery_vehicles = next(battery_steps, (np.inf, []))
+
+        for time_s, vehicles in iter_timesteps(fcd_file):
+            # Battery output may skip steps; align it to the fcd timestep
+            while battery_time < time_s:
+                battery_time, battery_vehicles = next(battery_steps, (np.inf, []))
+            batteries = {b["id"]: b for b in battery_vehicles} if battery_time == time_s else {}
+
+            self.simulation_step = int(round(time_s / step_length))
+            for v in vehicles:
+                vehicle_id = v["id"]
+                vehicle_type = v.get("type")
+                lane_id = v.get("lane", "")
+                speed = float(v["speed"])
+                battery = batteries.get(vehicle_id, {})
+                charge_level = battery_value(battery, "chargeLevel", "actualBatteryCapacity")
+                capacity = battery_value(battery, "capacity", "maximumBatteryCapacity")
+
+                yield (
+                    self.simulation_step,
+                    vehicle_id,
+                    vehicle_type,
+                    speed,
+                    speed * 3.6,
+                    float(v["x"]),
+                    float(v["y"]),
+                    float(v.get("z", np.nan)),
+                    lane_id.rsplit("_", 1)[0],
+                    lane_id,
+                    float(v.get("pos", np.nan)),
+                    float(v.get("angle", np.nan)),
+                    lane_speeds.get(lane_id, np.nan),
+                    charge_level,
+                    capacity,
+                    float(v.get("acceleration", np.nan)),
+                    self.get_vehicle_mass(vehicle_type),
+                    charge_level,
+                    100.0 * charge_level / capacity if capacity else np.nan,
+                    battery_value(battery, "energyConsumed"),
+                    1,
+                ) + self.vtypes.physics(vehicle_type)
+
+    def collect_native(self, output_file="simulation_data.csv", fcd_file="output/fcd.xml.gz",
+                       battery_file="output/battery.xml.gz", keep_outputs=True, row_group_size=65536,
+                       sampling=None):
+        """
+        Collect the same dataset as collect_data without TraCI
+
+        SUMO runs headless with --fcd-output/--battery-output, then both
+        files are stream-parsed into the output sink. There is no per-step
+        Python control, which makes this the fastest mode for pure dataset
+        generation. sampling (see sampling_policy()) decimates the records.
+        """
+        print("Native output collection started...")
+        self.run_native_outputs(fcd_file, battery_file)
+
+        with self.open_output(output_file, row_group_size) as sink:
+            records = self.iter_native_records(fcd_file, battery_file)
+            if sampling is None:
+                for record in records:
+                    sink.append(record)
+            else:
+                for step, step_records in itertools.groupby(records, key=lambda record: record[0]):
+                    for record in sampling.on_step(step, list(step_records)):
+                        sink.append(record)
+                for record in sampling.finish():
+                    sink.append(record)
+
+        if not keep_outputs:
+            os.remove(fcd_file)
+            os.remove(battery_file)
+
+        if sink.rows_written == 0:
+            print("No data collected!")
+            return None
+
+        print(f"Data saved to {output_file}. Total records: {sink.rows_written}")
+        return self.summarize(sink)
+
     def get_vehicle_info(self, vehicle_id):
         try:
             # Basic vehicle information
-            speed = traci.vehicle.getSpeed(vehicle_id)  # m/s
-            acceleration = traci.vehicle.getAcceleration(vehicle_id)  # m/s²
-            position = traci.vehicle.getPosition(vehicle_id)  # (x, y)
-            z = traci.vehicle.getPosition3D(vehicle_id) [2]#(x, y, z)
-            edge_id = traci.vehicle.getRoadID(vehicle_id) #string
-            lane_id = traci.vehicle.getLaneID(vehicle_id) #string
-            lane_position = traci.vehicle.getLanePosition(vehicle_id) #m
-            angle = traci.vehicle.getAngle(vehicle_id) #degree
-            lane_speed_limit = traci.lane.getMaxSpeed(lane_id) #km/h
-            
-            # Convert x,y to lat,lon using SUMO's conversion
-            lat, lon = self.convert_xy_to_latlon(position[0], position[1])
+            speed = self.traci.vehicle.getSpeed(vehicle_id)  # m/s
+            acceleration = self.traci.vehicle.getAcceleration(vehicle_id)  # m/s²
+            position = self.traci.vehicle.getPosition(vehicle_id)  # (x, y)
+            z = self.traci.vehicle.getPosition3D(vehicle_id) [2]#(x, y, z)
+            edge_id = self.traci.vehicle.getRoadID(vehicle_id) #string
+            lane_id = self.traci.vehicle.getLaneID(vehicle_id) #string
+            lane_position = self.traci.vehicle.getLanePosition(vehicle_id) #m
+            angle = self.traci.vehicle.getAngle(vehicle_id) #degree
+            lane_speed_limit = self.traci.lane.getMaxSpeed(lane_id) #km/h
             
             # Vehicle type information
-            vehicle_type = traci.vehicle.getTypeID(vehicle_id)
+            vehicle_type = self.traci.vehicle.getTypeID(vehicle_id)
             
             # Vehicle mass (from vehicle type)
             mass = self.get_vehicle_mass(vehicle_type)
 
             # Battery information
-            charge_level = traci.vehicle.getParameter(vehicle_id, "device.battery.chargeLevel")  # Wh
-            capacity = traci.vehicle.getParameter(vehicle_id, "device.battery.capacity")  # Wh
+            charge_level = self.traci.vehicle.getParameter(vehicle_id, "device.battery.chargeLevel")  # Wh
+            capacity = self.traci.vehicle.getParameter(vehicle_id, "device.battery.capacity")  # Wh
 
             # SOC (%) hesaplama
             soc_pc = None
@@ -67,12 +345,12 @@ class SUMODataCollector:
             except Exception:
                 soc_pc = None
 
-            energy_consumption = traci.vehicle.getParameter(vehicle_id, "device.battery.energyConsumed")  # Wh
+            energy_consumption = self.traci.vehicle.getParameter(vehicle_id, "device.battery.energyConsumed")  # Wh
             
             # Battery information (for electric vehicles)
             battery_level = None
             try:
-                battery_level = traci.vehicle.getParameter(vehicle_id, "device.battery.chargeLevel")
+                battery_level = self.traci.vehicle.getParameter(vehicle_id, "device.battery.chargeLevel")
             except:
                 pass
                 
@@ -82,8 +360,8 @@ class SUMODataCollector:
                 'vehicle_type': vehicle_type,
                 'speed_ms': speed,
                 'speed_kmh': speed * 3.6,
-                'lat': lat,
-                'lon': lon,
+                'x': position[0],
+                'y': position[1],
                 'z': z,
                 'edge_id': edge_id,
                 'lane_id': lane_id,
@@ -96,93 +374,339 @@ class SUMODataCollector:
                 'mass_kg': mass,
                 'battery_level': battery_level,
                 'soc_pc': soc_pc,
-                'energy_consumption': energy_consumption
+                'energy_consumption': energy_consumption,
+                'sample_steps': 1,
+                **dict(zip(PHYSICS_COLUMNS, self.vtypes.physics(vehicle_type)))
             }
         except Exception as e:
             print(f"Error collecting data for vehicle {vehicle_id}: {e}")
             return None
     
-    def convert_xy_to_latlon(self, x, y):
-        """Convert SUMO coordinates to lat/lon using SUMO's built-in conversion"""
+    def subscribe_simulation(self):
+        """Subscribe to departed/arrived vehicle IDs so new vehicles get their own subscription"""
+        self.traci.simulation.subscribe(SIMULATION_SUBSCRIPTION_VARS)
+
+    def subscribe_vehicle(self, vehicle_id, read_battery=True):
+        # Positional arguments keep the call identical for traci and libsumo
+        self.traci.vehicle.subscribe(vehicle_id, VEHICLE_SUBSCRIPTION_VARS,
+                                     tc.INVALID_DOUBLE_VALUE, tc.INVALID_DOUBLE_VALUE,
+                                     BATTERY_SUBSCRIPTION_PARAMS)
+        if not read_battery:
+            return
+
+        # Initial charge and capacity are read once; the charge level is then
+        # advanced with the subscribed per-step consumption
+        charge_level = float(self.traci.vehicle.getParameter(vehicle_id, "device.battery.chargeLevel"))
+        capacity = float(self.traci.vehicle.getParameter(vehicle_id, "device.battery.capacity"))
+        self.vehicle_data[vehicle_id] = {
+            'charge_level': charge_level,
+            'capacity': capacity,
+            'first_step': True,
+        }
+
+    def update_subscriptions(self):
+        results = self.traci.simulation.getSubscriptionResults()
+        for vehicle_id in results.get(tc.VAR_DEPARTED_VEHICLES_IDS, ()):
+            try:
+                self.subscribe_vehicle(vehicle_id)
+            except Exception as e:
+                print(f"Error subscribing vehicle {vehicle_id}: {e}")
+        # SUMO drops subscriptions of arrived vehicles itself
+        for vehicle_id in results.get(tc.VAR_ARRIVED_VEHICLES_IDS, ()):
+            self.vehicle_data.pop(vehicle_id, None)
+
+    def resubscribe_vehicles(self):
+        """
+        Subscribe the vehicles of a loaded SUMO state (subscriptions are not
+        part of the state); their battery bookkeeping comes from the checkpoint
+        """
+        for vehicle_id in self.traci.vehicle.getIDList():
+            try:
+                self.subscribe_vehicle(vehicle_id, read_battery=vehicle_id not in self.vehicle_data)
+            except Exception as e:
+                print(f"Error subscribing vehicle {vehicle_id}: {e}")
+
+    def get_lane_speed_limit(self, lane_id):
+        speed_limit = self.lane_speed_limits.get(lane_id)
+        if speed_limit is None:
+            speed_limit = self.traci.lane.getMaxSpeed(lane_id)
+            self.lane_speed_limits[lane_id] = speed_limit
+        return speed_limit
+
+    def get_vehicle_info_from_subscription(self, vehicle_id, values):
+        """Build the get_vehicle_info record from one subscription result, as a tuple in RECORD_SCHEMA order"""
         try:
-            lon, lat = traci.simulation.convertGeo(x, y)  # SUMO returns (lon, lat) not (lat, lon)
-            return lat, lon
+            speed = values[tc.VAR_SPEED]
+            x, y, z = values[tc.VAR_POSITION3D]
+            lane_id = values[tc.VAR_LANE_ID]
+            vehicle_type = values[tc.VAR_TYPE]
+            energy_consumption = float(values[tc.VAR_PARAMETER_WITH_KEY][1])
+
+            battery = self.vehicle_data[vehicle_id]
+            if battery['first_step']:
+                # Charge level read at departure already includes this step
+                battery['first_step'] = False
+            else:
+                # Same bookkeeping as SUMO's battery device: subtract the step
+                # consumption and keep the charge within [0, capacity]
+                battery['charge_level'] = min(max(battery['charge_level'] - energy_consumption, 0.0),
+                                              battery['capacity'])
+            charge_level = battery['charge_level']
+            capacity = battery['capacity']
+            soc_pc = 100.0 * charge_level / capacity if capacity else None
+
+            return (
+                self.simulation_step,
+                vehicle_id,
+                vehicle_type,
+                speed,
+                speed * 3.6,
+                x,
+                y,
+                z,
+                values[tc.VAR_ROAD_ID],
+                lane_id,
+                values[tc.VAR_LANEPOSITION],
+                values[tc.VAR_ANGLE],
+                self.get_lane_speed_limit(lane_id),
+                charge_level,
+                capacity,
+                values[tc.VAR_ACCELERATION],
+                self.get_vehicle_mass(vehicle_type),
+                charge_level,
+                soc_pc,
+                energy_consumption,
+                1,
+            ) + self.vtypes.physics(vehicle_type)
         except Exception as e:
-            print(f"Error converting coordinates: {e}")
-            return 0.0, 0.0   
-    
+            print(f"Error collecting data for vehicle {vehicle_id}: {e}")
+            return None
+
+    def collect_step(self):
+        """Collect the records (RECORD_SCHEMA tuples) of all active vehicles for the current step"""
+        records = []
+        if self.use_subscriptions:
+            self.update_subscriptions()
+            results = self.traci.vehicle.getAllSubscriptionResults()
+            for vehicle_id, values in results.items():
+                vehicle_info = self.get_vehicle_info_from_subscription(vehicle_id, values)
+                if vehicle_info:
+                    records.append(vehicle_info)
+        else:
+            for vehicle_id in self.traci.vehicle.getIDList():
+                vehicle_info = self.get_vehicle_info(vehicle_id)
+                if vehicle_info:
+                    records.append(tuple(vehicle_info[name] for name in RECORD_COLUMNS))
+        return records
+
+    def geo_transform(self, columns):
+        """Sink transform: replace the x/y columns of a row group by lat/lon in one vectorized call"""
+        lat, lon = self.projection.to_latlon(columns['x'], columns['y'])
+        converted = {'lat': lat, 'lon': lon}
+        return {name: converted.get(name, columns.get(name)) for name in RAW_COLUMNS}
+
+    def open_output(self, output_file, row_group_size=65536, resume=None):
+        """Open the streaming sink for RECORD_SCHEMA records, writing RAW_SCHEMA columns"""
+        if self.projection is None:
+            # Projection and offset come from the network's <location> element
+            self.projection = NetProjection.from_net(self.config_path("input", "net-file"))
+        return open_sink(output_file, RECORD_SCHEMA, row_group_size=row_group_size,
+                         transform=self.geo_transform, resume=resume)
+
+    def save_checkpoint(self, checkpoint_dir, sink, live_predictor=None, sampling=None):
+        """
+        Save a consistent snapshot of the run after the current step
+
+        The sink is flushed to disk first, then SUMO saves its state, and only
+        then is the checkpoint file replaced (atomically) with a new one that
+        references both. A crash at any point leaves the previous checkpoint
+        intact.
+        """
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        marker = sink.checkpoint()
+        state_file = os.path.abspath(os.path.join(checkpoint_dir, f"state_{self.simulation_step}.xml.gz"))
+        self.traci.simulation.saveState(state_file)
+
+        checkpoint = {
+            'step': self.simulation_step,
+            'state_file': state_file,
+            'sink': marker,
+            'vehicle_data': self.vehicle_data,
+            'lane_speed_limits': self.lane_speed_limits,
+            'live': live_predictor.checkpoint_state() if live_predictor is not None else None,
+            'sampling': sampling.checkpoint_state() if sampling is not None else None,
+            'saved_at': datetime.now().isoformat(timespec="seconds"),
+        }
+        path = os.path.join(checkpoint_dir, CHECKPOINT_FILE)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+        # The previous SUMO state is no longer referenced
+        previous = self.checkpoint['state_file'] if self.checkpoint is not None else None
+        if previous and previous != state_file and os.path.exists(previous):
+            os.remove(previous)
+        self.checkpoint = {'step': self.simulation_step, 'state_file': state_file, 'sink': marker}
+
+    def load_checkpoint(self, checkpoint_dir):
+        """
+        Restore the collector from the latest checkpoint in checkpoint_dir
+
+        Call before start_simulation, which then loads the saved SUMO state;
+        collect_data continues the output right after the checkpoint's rows.
+        Returns False (and the run starts from the beginning) if there is none.
+        """
+        path = os.path.join(checkpoint_dir, CHECKPOINT_FILE)
+        if not os.path.exists(path):
+            print(f"No checkpoint in {checkpoint_dir}, starting from the beginning")
+            return False
+        with open(path, "rb") as f:
+            checkpoint = pickle.load(f)
+        self.checkpoint = checkpoint
+        self.simulation_step = checkpoint['step']
+        self.vehicle_data = checkpoint['vehicle_data']
+        self.lane_speed_limits = checkpoint['lane_speed_limits']
+        print(f"Resuming from checkpoint of {checkpoint['saved_at']}: step {checkpoint['step']}, "
+              f"{checkpoint['sink']['rows_written']} records")
+        return True
+
     def get_vehicle_mass(self, vehicle_type):
-        try:
-            # Read vehicle type information from vehicles.add.xml
-            tree = ET.parse("config/vehicles.add.xml")
-            root = tree.getroot()
-            
-            for vtype in root.findall("vType"):
-                if vtype.get("id") == vehicle_type:
-                    # Mass is stored as an attribute, not as a param element
-                    mass_value = vtype.get("mass")
-                    if mass_value is not None:
-                        return float(mass_value)
-            
-            return 1500.0  # Default value
-        except Exception as e:
-            print(f"Error getting vehicle mass for {vehicle_type}: {e}")
-            return 1500.0
+        # Mass comes from the preloaded vType table (1500 kg if unknown)
+        return self.vtypes.mass(vehicle_type)
     
-    def collect_data(self, output_file="simulation_data.csv"):
+    def live_predictor(self, model_path, every=1, set_parameters=False, network_path=None):
+        """Create a LivePredictor for collect_data that reads this collector's records"""
+        from live_prediction import LivePredictor
+        network = None
+        if network_path:
+            from network_index import NetworkIndex
+            network = NetworkIndex(network_path)
+        return LivePredictor(model_path, RECORD_COLUMNS, every=every,
+                             set_parameters=set_parameters, traci=self.traci, network=network)
+
+    def sampling_policy(self, name, **options):
+        """Create a sampling policy (src/sampling.py) for this collector's records"""
+        from sampling import make_policy
+        return make_policy(name, RECORD_COLUMNS, **options)
+
+    def collect_data(self, output_file="simulation_data.csv", row_group_size=65536, live_predictor=None,
+                     checkpoint_every=0, checkpoint_dir="output/checkpoints", sampling=None):
+        """
+        Run the simulation to the end, streaming records to output_file
+
+        Records are buffered in typed columns and written every row_group_size
+        rows, so memory stays flat and a crash keeps everything flushed so far.
+        The format follows the extension: .csv (chunked), .parquet or .arrow.
+
+        live_predictor (see live_predictor()) receives every step's records and
+        predicts the energy of all active vehicles during the run.
+
+        sampling (see sampling_policy()) decides which records are written;
+        by default every vehicle is written at every step. The live predictor
+        always sees all records.
+
+        Every checkpoint_every steps a checkpoint is written to checkpoint_dir
+        (see save_checkpoint). After load_checkpoint the run continues from the
+        checkpoint's step, appending to the same output file (.csv or .arrow).
+
+        Returns a summary dict, or None if no data was collected.
+        """
         print("Data collection started...")
-        
-        while traci.simulation.getMinExpectedNumber() > 0:
-            # Advance simulation step
-            traci.simulationStep()
-            self.simulation_step += 1
-            
-            # Get active vehicles
-            active_vehicles = traci.vehicle.getIDList()
-            
-            # Collect data for each vehicle
-            for vehicle_id in active_vehicles:
-                vehicle_info = self.get_vehicle_info(vehicle_id)
-                if vehicle_info:
-                    self.data.append(vehicle_info)
-            
-            # Show progress every 100 steps
-            if self.simulation_step % 100 == 0:
-                print(f"Simulation step: {self.simulation_step}, Active vehicle count: {len(active_vehicles)}")
-        
-        # Convert data to DataFrame and save
-        if self.data:
-            df = pd.DataFrame(self.data)
-            df.to_csv(output_file, index=False)
-            print(f"Data saved to {output_file}. Total records: {len(df)}")
-            
-            # Summary statistics
-            print("\n=== DATA COLLECTION SUMMARY ===")
-            print(f"Total simulation steps: {self.simulation_step}")
-            print(f"Total data records: {len(df)}")
-            print(f"Unique vehicle count: {df['vehicle_id'].nunique()}")
-            print(f"Unique vehicle types: {df['vehicle_type'].nunique()}")
-            print(f"Data collection time: {self.simulation_step} steps")
-            
-            # Speed statistics
-            print(f"\nSpeed statistics (km/h):")
-            print(f"  Average: {df['speed_kmh'].mean():.2f}")
-            print(f"  Maximum: {df['speed_kmh'].max():.2f}")
-            print(f"  Minimum: {df['speed_kmh'].min():.2f}")
-            
-            # Acceleration statistics
-            print(f"\nAcceleration statistics (m/s²):")
-            print(f"  Average: {df['acceleration'].mean():.2f}")
-            print(f"  Maximum: {df['acceleration'].max():.2f}")
-            print(f"  Minimum: {df['acceleration'].min():.2f}")
-            
-            return df
-        else:
+
+        resume = None
+        if self.checkpoint is not None:
+            resume = self.checkpoint['sink']
+            if os.path.abspath(resume['path']) != os.path.abspath(output_file):
+                raise ValueError(f"Checkpoint belongs to {resume['path']}, not {output_file}")
+            if live_predictor is not None and self.checkpoint.get('live') is not None:
+                live_predictor.restore_state(self.checkpoint['live'])
+            if sampling is not None and self.checkpoint.get('sampling') is not None:
+                sampling.restore_state(self.checkpoint['sampling'])
+
+        if self.use_subscriptions:
+            self.subscribe_simulation()
+            if resume is not None:
+                self.resubscribe_vehicles()
+
+        with self.open_output(output_file, row_group_size, resume=resume) as sink:
+            if checkpoint_every and not sink.resumable:
+                raise ValueError(f"Checkpoints need a resumable output (.csv or .arrow), got {output_file}")
+            while self.traci.simulation.getMinExpectedNumber() > 0:
+                # Advance simulation step
+                self.traci.simulationStep()
+                self.simulation_step += 1
+
+                # Collect data for each active vehicle
+                records = self.collect_step()
+                written = records if sampling is None else sampling.on_step(self.simulation_step, records)
+                for record in written:
+                    sink.append(record)
+                if live_predictor is not None:
+                    live_predictor.on_step(self.simulation_step, records)
+
+                if checkpoint_every and self.simulation_step % checkpoint_every == 0:
+                    self.save_checkpoint(checkpoint_dir, sink, live_predictor, sampling)
+
+                # Show progress every 100 steps
+                if self.simulation_step % 100 == 0:
+                    print(f"Simulation step: {self.simulation_step}, Active vehicle count: {len(records)}")
+
+            if sampling is not None:
+                # Vehicles still in the network at the end
+                for record in sampling.finish():
+                    sink.append(record)
+
+        if sink.rows_written == 0:
             print("No data collected!")
             return None
+
+        print(f"Data saved to {output_file}. Total records: {sink.rows_written}")
+        summary = self.summarize(sink)
+        if live_predictor is not None:
+            summary['live'] = live_predictor.summary()
+            print(f"\nLive prediction ({live_predictor.model_calls} model calls):")
+            print(f"  Predicted energy: {summary['live']['pred_wh'].sum():.2f} Wh")
+            print(f"  True energy: {summary['live']['true_wh'].sum():.2f} Wh")
+        return summary
+
+    def summarize(self, sink):
+        summary = {
+            'output_file': sink.path,
+            'steps': self.simulation_step,
+            'records': sink.rows_written,
+            'vehicles': sink.distinct_count('vehicle_id'),
+            'vehicle_types': sink.distinct_count('vehicle_type'),
+            'null_counts': pd.Series(sink.null_counts),
+        }
+
+        # Summary statistics
+        print("\n=== DATA COLLECTION SUMMARY ===")
+        print(f"Total simulation steps: {summary['steps']}")
+        print(f"Total data records: {summary['records']}")
+        print(f"Unique vehicle count: {summary['vehicles']}")
+        print(f"Unique vehicle types: {summary['vehicle_types']}")
+        print(f"Data collection time: {summary['steps']} steps")
+
+        # Speed statistics
+        mean, vmax, vmin = sink.column_summary('speed_kmh')
+        print(f"\nSpeed statistics (km/h):")
+        print(f"  Average: {mean:.2f}")
+        print(f"  Maximum: {vmax:.2f}")
+        print(f"  Minimum: {vmin:.2f}")
+
+        # Acceleration statistics
+        mean, vmax, vmin = sink.column_summary('acceleration')
+        print(f"\nAcceleration statistics (m/s²):")
+        print(f"  Average: {mean:.2f}")
+        print(f"  Maximum: {vmax:.2f}")
+        print(f"  Minimum: {vmin:.2f}")
+
+        return summary
     
     def close_simulation(self):
-        traci.close()
+        self.traci.close()
         print("SUMO simulation closed")
 
 def main(): 
@@ -195,16 +719,16 @@ def main():
     if collector.start_simulation():
         try:
             # Collect data
-            df = collector.collect_data("data/buyukdere_simulation_data_final.csv")        
-            if df is not None:
+            summary = collector.collect_data("data/buyukdere_simulation_data_final.csv")
+            if summary is not None:
                 # Data quality check
                 print("\n=== DATA QUALITY CHECK ===")
                 print(f"Missing values:")
-                print(df.isnull().sum())
+                print(summary['null_counts'])
                 
                 # Show example data
                 print("\n=== EXAMPLE DATA ===")
-                print(df.head(10))
+                print(read_output_head(summary['output_file'], 10))
                 
         finally:
             # Close simulation
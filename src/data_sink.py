@@ -0,0 +1,330 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Column dtype used for string columns (vehicle_id, edge_id, ...)
+STRING = "str"
+
+class ColumnBuffer:
+    def __init__(self, schema, capacity):
+        """
+        Fixed-size typed column buffers for one row group
+
+        Args:
+            schema (list): [(column_name, dtype), ...], dtype STRING for text
+            capacity (int): Number of rows per row group
+        """
+        self.schema = schema
+        self.capacity = capacity
+        self.columns = [
+            np.empty(capacity, dtype=object if dtype == STRING else dtype)
+            for _, dtype in schema
+        ]
+        self.size = 0
+
+    def append(self, record):
+        """Write one record (tuple in schema order); return True when the buffer is full"""
+        i = self.size
+        for column, value in zip(self.columns, record):
+            column[i] = value
+        self.size = i + 1
+        return self.size == self.capacity
+
+    def to_dict(self):
+        """Return the filled part of every column (copies, so the buffer can be reused)"""
+        return {name: column[:self.size].copy()
+                for (name, _), column in zip(self.schema, self.columns)}
+
+    def clear(self):
+        self.size = 0
+
+
+class StreamingSink:
+    # Whether a sink can be reopened from a checkpoint() marker
+    resumable = True
+
+    def __init__(self, path, schema, row_group_size=65536, transform=None,
+                 distinct_columns=("vehicle_id", "vehicle_type"), resume=None):
+        """
+        Base class for sinks that write fixed-size row groups while the simulation runs
+
+        Args:
+            path (str): Output file
+            schema (list): [(column_name, dtype), ...] of the appended records
+            row_group_size (int): Rows buffered before a row group is flushed
+            transform (callable): Optional fn(columns dict) -> columns dict applied
+                to every row group before it is written (e.g. derived columns)
+            distinct_columns (tuple): Columns whose distinct values are counted
+            resume (dict): Marker returned by checkpoint(); the sink continues
+                right after the marker's last row and drops anything written later
+        """
+        self.path = path
+        self.schema = schema
+        self.transform = transform
+        self.buffer = ColumnBuffer(schema, row_group_size)
+        self.rows_written = 0
+        self.row_groups_written = 0
+        # Running statistics over the written columns
+        self.null_counts = {}
+        self.numeric_stats = {}
+        self.distinct_values = {name: set() for name in distinct_columns}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if resume is not None:
+            self.rows_written = resume['rows_written']
+            self.row_groups_written = resume['row_groups_written']
+            self.null_counts = dict(resume['null_counts'])
+            self.numeric_stats = dict(resume['numeric_stats'])
+            self.distinct_values = {name: set(values) for name, values in resume['distinct_values'].items()}
+
+    def append(self, record):
+        if self.buffer.append(record):
+            self.flush()
+
+    def flush(self):
+        if self.buffer.size == 0:
+            return
+        columns = self.buffer.to_dict()
+        self.buffer.clear()
+        self.write_columns(columns)
+
+    def write_columns(self, columns):
+        """Write a whole block of columns (dict of equal-length arrays) as one row group"""
+        self.flush()
+        if self.transform is not None:
+            columns = self.transform(columns)
+        self.update_stats(columns)
+        self._write(columns)
+        self.rows_written += len(next(iter(columns.values())))
+        self.row_groups_written += 1
+
+    def update_stats(self, columns):
+        for name, values in columns.items():
+            if values.dtype == object:
+                nulls = int(pd.isna(values).sum())
+            else:
+                nulls = int(np.isnan(values).sum()) if values.dtype.kind == "f" else 0
+                valid = values[~np.isnan(values)] if values.dtype.kind == "f" else values
+                if len(valid):
+                    count, total, vmin, vmax = self.numeric_stats.get(name, (0, 0.0, np.inf, -np.inf))
+                    self.numeric_stats[name] = (
+                        count + len(valid),
+                        total + float(valid.sum(dtype=np.float64)),
+                        min(vmin, float(valid.min())),
+                        max(vmax, float(valid.max())),
+                    )
+            self.null_counts[name] = self.null_counts.get(name, 0) + nulls
+            if name in self.distinct_values:
+                self.distinct_values[name].update(pd.unique(values))
+
+    def distinct_count(self, name):
+        return len(self.distinct_values.get(name, ()))
+
+    def column_summary(self, name):
+        """Return (mean, max, min) of a numeric column over all written rows"""
+        count, total, vmin, vmax = self.numeric_stats.get(name, (0, 0.0, np.nan, np.nan))
+        return (total / count if count else np.nan), vmax, vmin
+
+    def checkpoint(self):
+        """
+        Flush the buffered rows to disk and return a marker of the output so far
+
+        The marker holds the row counts, the running statistics and the file
+        position, so a sink opened with resume=marker continues exactly there.
+        """
+        if not self.resumable:
+            raise ValueError(f"{type(self).__name__} cannot be resumed; use a .csv or .arrow output")
+        self.flush()
+        self._sync()
+        return {
+            'path': self.path,
+            'rows_written': self.rows_written,
+            'row_groups_written': self.row_groups_written,
+            'null_counts': dict(self.null_counts),
+            'numeric_stats': dict(self.numeric_stats),
+            'distinct_values': {name: set(values) for name, values in self.distinct_values.items()},
+            **self._position(),
+        }
+
+    def close(self):
+        self.flush()
+        self._close()
+
+    def _write(self, columns):
+        raise NotImplementedError
+
+    def _sync(self):
+        pass
+
+    def _position(self):
+        return {}
+
+    def _close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class CSVSink(StreamingSink):
+    """Appends every row group to a CSV file; complete row groups survive a crash"""
+
+    def __init__(self, path, schema, resume=None, **kwargs):
+        super().__init__(path, schema, resume=resume, **kwargs)
+        if resume is None or resume['rows_written'] == 0:
+            self.file = open(path, "w", encoding="utf-8", newline="")
+        else:
+            # Cut off the rows written after the checkpoint and append from there
+            self.file = open(path, "r+", encoding="utf-8", newline="")
+            self.file.truncate(resume['offset'])
+            self.file.seek(resume['offset'])
+
+    def _write(self, columns):
+        pd.DataFrame(columns).to_csv(self.file, header=self.row_groups_written == 0, index=False)
+        self.file.flush()
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def _position(self):
+        return {'offset': self.file.tell()}
+
+    def _close(self):
+        if self.rows_written == 0:
+            # Keep the header so an empty run still produces a valid CSV
+            pd.DataFrame(columns=[name for name, _ in self.schema]).to_csv(self.file, index=False)
+        self.file.close()
+
+
+def _arrow_table(columns):
+    import pyarrow as pa
+    return pa.table({name: pa.array(values, from_pandas=True) for name, values in columns.items()})
+
+
+class ParquetSink(StreamingSink):
+    """
+    Writes each row group as a Parquet row group (requires pyarrow).
+    The footer is only written on close, so a Parquet output cannot be
+    resumed after a crash.
+    """
+
+    resumable = False
+
+    def __init__(self, path, schema, compression="zstd", **kwargs):
+        super().__init__(path, schema, **kwargs)
+        import pyarrow.parquet  # noqa: F401  (fail early if pyarrow is missing)
+        self.compression = compression
+        self.writer = None
+
+    def _write(self, columns):
+        import pyarrow.parquet as pq
+        table = _arrow_table(columns)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema, compression=self.compression)
+        self.writer.write_table(table)
+
+    def _close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class ArrowSink(StreamingSink):
+    """
+    Writes row groups as record batches in the Arrow IPC stream format
+    (requires pyarrow). The stream format has no footer, so every batch
+    written before a crash can still be read back.
+    """
+
+    def __init__(self, path, schema, resume=None, **kwargs):
+        super().__init__(path, schema, resume=resume, **kwargs)
+        import pyarrow as pa
+        self.file = None
+        self.writer = None
+        if resume is not None and resume['row_groups_written'] > 0:
+            # A stream cannot be reopened for appending: rewrite the batches up
+            # to the checkpoint into a new stream. An existing .partial file is
+            # left over from an interrupted resume and is still the original.
+            partial = self.path + ".partial"
+            if not os.path.exists(partial):
+                os.replace(self.path, partial)
+            with pa.OSFile(partial, "rb") as f:
+                reader = pa.ipc.open_stream(f)
+                for _ in range(resume['row_groups_written']):
+                    self._write_table(pa.Table.from_batches([reader.read_next_batch()]))
+            self._sync()
+            os.remove(partial)
+
+    def _write(self, columns):
+        self._write_table(_arrow_table(columns))
+
+    def _write_table(self, table):
+        import pyarrow as pa
+        if self.writer is None:
+            self.file = pa.OSFile(self.path, "wb")
+            self.writer = pa.ipc.new_stream(self.file, table.schema)
+        self.writer.write_table(table)
+
+    def _sync(self):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def _close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.file.close()
+
+
+SINKS = {
+    ".csv": CSVSink,
+    ".parquet": ParquetSink,
+    ".arrow": ArrowSink,
+    ".arrows": ArrowSink,
+}
+
+def open_sink(path, schema, **kwargs):
+    """Create the sink matching the file extension (.csv, .parquet, .arrow); kwargs go to StreamingSink"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SINKS:
+        raise ValueError(f"Unsupported output format '{ext}', expected one of {sorted(SINKS)}")
+    return SINKS[ext](path, schema, **kwargs)
+
+def iter_output(path, chunksize=65536, columns=None):
+    """Read a sink output file back as DataFrame chunks"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    elif ext in (".arrow", ".arrows"):
+        import pyarrow as pa
+        with pa.OSFile(path, "rb") as f:
+            for batch in pa.ipc.open_stream(f):
+                df = batch.to_pandas()
+                yield df if columns is None else df[columns]
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns)
+
+def frame_to_columns(df, schema):
+    """Convert a DataFrame chunk to a columns dict typed like schema"""
+    columns = {}
+    for name, dtype in schema:
+        if dtype == STRING:
+            values = df[name].to_numpy(dtype=object)
+            values[pd.isna(values)] = None
+        else:
+            values = df[name].to_numpy(dtype=dtype)
+        columns[name] = values
+    return columns
+
+def read_output_head(path, n=10):
+    """Return the first n rows of a sink output file"""
+    for chunk in iter_output(path, chunksize=max(n, 1)):
+        return chunk.head(n)
+    return pd.DataFrame()
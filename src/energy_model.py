@@ -0,0 +1,158 @@
+import argparse
+import numpy as np
+
+# Constants of SUMO's electric energy model (HelpersEnergy)
+GRAVITY = 9.80665       # m/s²
+AIR_DENSITY = 1.2041    # kg/m³ at 20 °C
+
+# vType attribute/params the model uses (utils/electric_car.py writes all of them)
+ENERGY_PARAMS = [
+    "mass",
+    "frontSurfaceArea",
+    "airDragCoefficient",
+    "rotatingMass",
+    "rollDragCoefficient",
+    "radialDragCoefficient",
+    "constantPowerIntake",
+    "propulsionEfficiency",
+    "recuperationEfficiency",
+    "maximumPower",
+]
+
+# Dataset columns holding these values (the mass is stored as mass_kg)
+DATASET_COLUMNS = {"mass": "mass_kg"}
+
+def params_from_vtypes(vtypes, type_ids):
+    """Energy parameters per sample from a VTypeTable and an array of vType ids"""
+    return {name: vtypes.lookup(type_ids, name) for name in ENERGY_PARAMS}
+
+def params_from_columns(columns):
+    """Energy parameters from dataset columns (DataFrame or dict of arrays)"""
+    return {name: np.asarray(columns[DATASET_COLUMNS.get(name, name)], dtype=np.float64)
+            for name in ENERGY_PARAMS}
+
+def power_w(speed, acceleration, slope_pct, params, dt=1.0, angle_diff=None):
+    """
+    Battery power (W) of SUMO's energy model for arrays of samples
+
+    Args:
+        speed: m/s at the end of the step
+        acceleration: m/s² during the step (previous speed = speed - acceleration * dt)
+        slope_pct: road grade in percent
+        params (dict): ENERGY_PARAMS -> scalar or array (broadcast with speed)
+        dt (float): Step length in seconds
+        angle_diff: Optional heading change per step (radians) for the radial
+            drag term; the term is skipped when it is not given
+    """
+    v = np.asarray(speed, dtype=np.float64)
+    a = np.asarray(acceleration, dtype=np.float64)
+    mass = np.asarray(params["mass"], dtype=np.float64)
+    last_v = v - a * dt
+
+    # Potential energy (slope in percent -> angle)
+    power = mass * GRAVITY * np.sin(np.arctan(np.asarray(slope_pct, dtype=np.float64) / 100.0)) * v
+    # Kinetic energy of the vehicle and its rotating parts
+    power += 0.5 * (mass + params["rotatingMass"]) * (v * v - last_v * last_v) / dt
+    # Air drag
+    power += 0.5 * AIR_DENSITY * params["frontSurfaceArea"] * params["airDragCoefficient"] * v * v * v
+    # Rolling resistance
+    power += params["rollDragCoefficient"] * GRAVITY * mass * v
+    # Friction from the radial force in curves
+    if angle_diff is not None:
+        with np.errstate(divide="ignore"):
+            radius = np.clip(v * dt / np.abs(angle_diff), 0.0001, 10000)
+        power += params["radialDragCoefficient"] * mass * v * v / radius * v
+
+    # Drive train limit in both directions
+    max_power = np.asarray(params["maximumPower"], dtype=np.float64)
+    power = np.clip(power, -max_power, max_power)
+    # Constant consumers (air conditioning, electronics, ...) are part of the
+    # balance: they go through the drive train efficiency and offset recuperation
+    power = power + params["constantPowerIntake"]
+    # Efficiency: losses when driving, partial recovery when recuperating
+    return np.where(power > 0, power / params["propulsionEfficiency"], power * params["recuperationEfficiency"])
+
+def step_energy_wh(speed, acceleration, slope_pct, params, dt=1.0, angle_diff=None):
+    """Energy drawn from the battery in each step (Wh), like SUMO's energyConsumed"""
+    return power_w(speed, acceleration, slope_pct, params, dt, angle_diff) * dt / 3600.0
+
+def cumulative_energy_wh(step_wh, is_start=None):
+    """
+    Running total of step energies; with is_start (first row of every
+    vehicle, rows grouped by vehicle) the total restarts for each vehicle
+    """
+    total = np.cumsum(step_wh, dtype=np.float64)
+    if is_start is None:
+        return total
+    starts = np.flatnonzero(is_start)
+    # Total before each vehicle's first row, repeated over its rows
+    offset = np.concatenate(([0.0], total))[starts]
+    lengths = np.diff(np.append(starts, len(total)))
+    return total - np.repeat(offset, lengths)
+
+def compare_recorded(input_file, chunksize=500000, dt=1.0):
+    """
+    Check the model against SUMO's recorded energy_consumption
+
+    Streams a preprocessed dataset (speed_kmh, acceleration, slope_pct, the
+    vehicle physics columns and energy_consumption) and compares the
+    per-step energies. Differences come from the grade (SUMO uses the
+    lane's slope, the dataset the one derived from positions) and the
+    radial drag term, which needs the heading change.
+
+    Returns:
+        dict with rows, mae_wh, bias_wh, recorded_wh and model_wh (totals)
+    """
+    from data_sink import iter_output
+    usecols = ["speed_kmh", "acceleration", "slope_pct", "energy_consumption"] + \
+              [DATASET_COLUMNS.get(name, name) for name in ENERGY_PARAMS]
+    rows, abs_error, recorded_wh, model_wh = 0, 0.0, 0.0, 0.0
+    for chunk in iter_output(input_file, chunksize=chunksize, columns=usecols):
+        recorded = chunk["energy_consumption"].to_numpy(dtype=np.float64)
+        slope = np.nan_to_num(chunk["slope_pct"].to_numpy(dtype=np.float64))
+        model = step_energy_wh(chunk["speed_kmh"].to_numpy(dtype=np.float64) / 3.6,
+                               chunk["acceleration"].to_numpy(dtype=np.float64),
+                               slope, params_from_columns(chunk), dt)
+        valid = np.isfinite(recorded) & np.isfinite(model)
+        rows += int(valid.sum())
+        abs_error += float(np.abs(model[valid] - recorded[valid]).sum())
+        recorded_wh += float(recorded[valid].sum())
+        model_wh += float(model[valid].sum())
+    return {
+        "rows": rows,
+        "mae_wh": abs_error / rows if rows else np.nan,
+        "bias_wh": (model_wh - recorded_wh) / rows if rows else np.nan,
+        "recorded_wh": recorded_wh,
+        "model_wh": model_wh,
+    }
+
+def simulate_cycles(speed, params, slope_pct=0.0, dt=1.0):
+    """
+    Energy of whole drive cycles without SUMO
+
+    Args:
+        speed: (n_cycles, n_steps) speed profiles in m/s
+        params (dict): ENERGY_PARAMS -> scalar or (n_cycles, 1) array
+        slope_pct: scalar or array broadcastable to speed
+
+    Returns:
+        (step_wh, total_wh): per-step energies (n_cycles, n_steps) and totals (n_cycles,)
+    """
+    speed = np.atleast_2d(np.asarray(speed, dtype=np.float64))
+    acceleration = np.diff(speed, axis=1, prepend=speed[:, :1]) / dt
+    step_wh = step_energy_wh(speed, acceleration, slope_pct, params, dt)
+    return step_wh, step_wh.sum(axis=1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the physical energy model with recorded SUMO energy")
+    parser.add_argument("--input", default="data/final_training_data.csv")
+    parser.add_argument("--step-length", type=float, default=1.0)
+    args = parser.parse_args()
+
+    result = compare_recorded(args.input, dt=args.step_length)
+    print(f"Rows: {result['rows']}")
+    print(f"Per-step MAE: {result['mae_wh']:.5f} Wh, bias: {result['bias_wh']:.5f} Wh")
+    print(f"Total recorded: {result['recorded_wh']:.1f} Wh, model: {result['model_wh']:.1f} Wh")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from data_sink import iter_output
+import energy_model
+
+# Versioned model input schemas. A new feature set gets a new version;
+# existing versions never change so saved models keep matching their inputs.
+FEATURE_SCHEMAS = {
+    1: [
+        "v2",                      # squared speed (kinetic energy)
+        "acc_pos", "acc_neg",      # acceleration / braking (consumption vs. regeneration)
+        "slope_pct_pos", "slope_pct_neg",  # uphill / downhill grade
+        "mass_kg", "CdA", "rollDragCoefficient",  # vehicle physics
+        "propulsionEfficiency", "recuperationEfficiency",  # efficiencies
+        "maximumPower",            # max motor power
+    ],
+    # v1 + per-step energy of SUMO's physical model (src/energy_model.py) as a baseline feature
+    2: [
+        "v2",
+        "acc_pos", "acc_neg",
+        "slope_pct_pos", "slope_pct_neg",
+        "mass_kg", "CdA", "rollDragCoefficient",
+        "propulsionEfficiency", "recuperationEfficiency",
+        "maximumPower",
+        "physics_wh",
+    ],
+}
+FEATURE_VERSION = 1
+TARGET = "energy_consumption"
+
+# Steps covered by each row's energy_consumption (src/sampling.py). Models
+# learn per-step energy from per-step features, so training needs full-rate
+# data (every row 1); datasets collected with nth/adaptive/trip sampling,
+# where the target sums several steps, are rejected by build_dataset.
+SAMPLE_STEPS = "sample_steps"
+
+# |slope_pct| at or above this is not physically meaningful; rows without a slope are dropped too
+SLOPE_LIMIT = 50.0
+
+# Columns of the preprocessed dataset each derived feature is computed from
+SOURCE_COLUMNS = {
+    "v2": ("speed_kmh",),
+    "acc_pos": ("acceleration",),
+    "acc_neg": ("acceleration",),
+    "slope_pct_pos": ("slope_pct",),
+    "slope_pct_neg": ("slope_pct",),
+    "CdA": ("airDragCoefficient", "frontSurfaceArea"),
+    "physics_wh": ("speed_kmh", "acceleration", "slope_pct")
+                  + tuple(energy_model.DATASET_COLUMNS.get(name, name) for name in energy_model.ENERGY_PARAMS),
+}
+
+def feature_names(version=FEATURE_VERSION):
+    if version not in FEATURE_SCHEMAS:
+        raise ValueError(f"Unknown feature schema version {version}, expected one of {sorted(FEATURE_SCHEMAS)}")
+    return FEATURE_SCHEMAS[version]
+
+def input_columns(version=FEATURE_VERSION, target=True):
+    """Dataset columns needed to build the features (usecols for chunked reads)"""
+    columns = ["slope_pct"]
+    for name in feature_names(version):
+        columns.extend(SOURCE_COLUMNS.get(name, (name,)))
+    if target:
+        columns.append(TARGET)
+    return list(dict.fromkeys(columns))
+
+def _derive(name, columns, rows):
+    """One feature column (float64) for the selected rows"""
+    def col(source):
+        return np.asarray(columns[source], dtype=np.float64)[rows]
+
+    if name == "v2":
+        return (col("speed_kmh") / 3.6) ** 2
+    if name == "acc_pos":
+        return np.clip(col("acceleration"), 0, None)
+    if name == "acc_neg":
+        return np.clip(-col("acceleration"), 0, None)
+    if name == "slope_pct_pos":
+        return np.clip(col("slope_pct"), 0, None)
+    if name == "slope_pct_neg":
+        return np.clip(-col("slope_pct"), 0, None)
+    if name == "CdA":
+        return col("airDragCoefficient") * col("frontSurfaceArea")
+    if name == "physics_wh":
+        params = {key: col(energy_model.DATASET_COLUMNS.get(key, key)) for key in energy_model.ENERGY_PARAMS}
+        return energy_model.step_energy_wh(col("speed_kmh") / 3.6, col("acceleration"), col("slope_pct"), params)
+    return col(name)
+
+def build_features(columns, version=FEATURE_VERSION, out=None):
+    """
+    Compute the model input matrix for a block of rows
+
+    Rows whose slope is missing or outside ±SLOPE_LIMIT and rows with a
+    missing feature are excluded (the filters the notebooks applied).
+    Every feature is written straight into one preallocated float32 matrix.
+
+    Args:
+        columns: DataFrame or dict of column arrays (a chunk or a whole dataset)
+        version (int): Feature schema version
+        out (np.ndarray): Optional float32 buffer with at least as many rows
+            as pass the slope filter; the result is a view into it
+
+    Returns:
+        (X, mask): float32 matrix (n_rows, n_features) and the boolean mask
+        of input rows it was built from (use it to select targets/ids)
+    """
+    names = feature_names(version)
+    slope = np.asarray(columns["slope_pct"], dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        mask = (slope > -SLOPE_LIMIT) & (slope < SLOPE_LIMIT)
+    rows = np.flatnonzero(mask)
+
+    X = out[:len(rows)] if out is not None else np.empty((len(rows), len(names)), dtype=np.float32)
+    for j, name in enumerate(names):
+        X[:, j] = _derive(name, columns, rows)
+
+    valid = ~np.isnan(X).any(axis=1)
+    if not valid.all():
+        X = X[valid]
+        mask[rows[~valid]] = False
+    return X, mask
+
+def build_dataset(columns, version=FEATURE_VERSION):
+    """
+    (X, y, mask) for a block of rows; y is the float64 target of the kept rows
+
+    Raises ValueError for sampled rows (sample_steps != 1), whose target is
+    the energy of several steps while the features describe one step.
+    """
+    if SAMPLE_STEPS in columns:
+        steps = np.asarray(columns[SAMPLE_STEPS], dtype=np.float64)
+        if (steps != 1).any():
+            raise ValueError(f"{int((steps != 1).sum())} rows cover more than one simulation step "
+                             f"({SAMPLE_STEPS} != 1); training needs data collected with --sampling every-step")
+    X, mask = build_features(columns, version)
+    y = np.asarray(columns[TARGET], dtype=np.float64)[mask]
+    return X, y, mask
+
+def build_row(row, version=FEATURE_VERSION):
+    """
+    Features of a single sample (dict or Series with the dataset columns)
+
+    Returns:
+        float32 array of shape (n_features,), or None if the row is filtered out
+    """
+    columns = {name: np.array([row[name]], dtype=np.float64) for name in input_columns(version, target=False)}
+    X, mask = build_features(columns, version)
+    return X[0] if mask[0] else None
+
+def feature_frame(X, version=FEATURE_VERSION):
+    """Wrap a feature matrix with its column names (for models fitted on DataFrames)"""
+    return pd.DataFrame(X, columns=feature_names(version), copy=False)
+
+def iter_feature_chunks(input_file, version=FEATURE_VERSION, chunksize=500000):
+    """Yield (X, y, vehicle_ids) per chunk of a preprocessed dataset"""
+    usecols = ["vehicle_id"] + input_columns(version)
+    if SAMPLE_STEPS in next(iter_output(input_file, chunksize=1)).columns:
+        usecols.append(SAMPLE_STEPS)
+    for chunk in iter_output(input_file, chunksize=chunksize, columns=usecols):
+        X, y, mask = build_dataset(chunk, version)
+        yield X, y, chunk["vehicle_id"].to_numpy()[mask]
+
+def schema_path(model_path):
+    return f"{os.path.splitext(model_path)[0]}.features.json"
+
+def save_schema(model_path, version=FEATURE_VERSION):
+    """Write the feature schema next to a saved model (<model>.features.json)"""
+    schema = {
+        "version": version,
+        "features": feature_names(version),
+        "target": TARGET,
+        "slope_limit": SLOPE_LIMIT,
+    }
+    with open(schema_path(model_path), "w", encoding="utf-8") as f:
+        json.dump(schema, f, indent=2)
+    return schema
+
+def model_version(model_path, default=FEATURE_VERSION):
+    """
+    Feature schema version a saved model expects
+
+    Models saved before schemas were recorded have no schema file and use
+    `default`. Raises ValueError if the recorded feature list does not match
+    the schema of its version.
+    """
+    path = schema_path(model_path)
+    if not os.path.exists(path):
+        return default
+    with open(path, encoding="utf-8") as f:
+        schema = json.load(f)
+    version = schema["version"]
+    if schema["features"] != feature_names(version):
+        raise ValueError(f"{path} does not match feature schema version {version}")
+    return version
@@ -0,0 +1,283 @@
+import os
+import sys
+import json
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+import numpy as np
+import joblib
+import features
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from models.compact_forest import CompactForest
+
+def load_model(path):
+    """Load a pickled model or an exported compact forest directory with its feature schema version"""
+    model = CompactForest.load(path) if os.path.isdir(path) else joblib.load(path)
+    return model, features.model_version(path)
+
+class MicroBatcher:
+    def __init__(self, model, version=features.FEATURE_VERSION, max_batch_rows=65536, max_wait_ms=5.0):
+        """
+        Coalesces concurrent prediction requests into one vectorized model call
+
+        A single worker thread takes the first waiting request, keeps collecting
+        requests until max_batch_rows rows are queued or max_wait_ms has passed,
+        predicts them in one call and hands every request its slice.
+
+        Args:
+            model: Object with predict(X) (sklearn estimator, CompactForest, ...)
+            version (int): Feature schema version of the model
+            max_batch_rows (int): Row limit of one model call
+            max_wait_ms (float): Latency budget for waiting on more requests
+        """
+        self.model = model
+        self.version = version
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = time.time()
+        # Counters
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.predict_seconds = 0.0
+        self.latencies = deque(maxlen=10000)
+        self.worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self.worker.start()
+
+    def submit(self, X):
+        """Queue a float32 feature matrix; returns a Future with its predictions"""
+        future = Future()
+        self.queue.put((X, future, time.perf_counter()))
+        return future
+
+    def predict(self, X):
+        return self.submit(X).result()
+
+    def _run(self):
+        while True:
+            jobs = [self.queue.get()]
+            if jobs[0] is None:
+                return
+            rows = len(jobs[0][0])
+            deadline = time.perf_counter() + self.max_wait
+            while rows < self.max_batch_rows:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    job = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if job is None:
+                    self.queue.put(None)
+                    break
+                jobs.append(job)
+                rows += len(job[0])
+            self._predict_batch(jobs)
+
+    def _predict_batch(self, jobs):
+        try:
+            X = np.concatenate([job[0] for job in jobs]) if len(jobs) > 1 else jobs[0][0]
+            t = time.perf_counter()
+            y = np.asarray(self.model.predict(features.feature_frame(X, self.version)), dtype=np.float64) \
+                if len(X) else np.empty(0)
+            elapsed = time.perf_counter() - t
+        except Exception as e:
+            if len(jobs) > 1:
+                # One request's input must not fail the others: predict each on its own
+                for job in jobs:
+                    self._predict_batch([job])
+                return
+            jobs[0][1].set_exception(e)
+            return
+
+        now = time.perf_counter()
+        with self.lock:
+            self.requests += len(jobs)
+            self.rows += len(X)
+            self.batches += 1
+            self.predict_seconds += elapsed
+            self.latencies.extend(now - submitted for _, _, submitted in jobs)
+        start = 0
+        for job_X, future, _ in jobs:
+            future.set_result(y[start:start + len(job_X)])
+            start += len(job_X)
+
+    def stats(self):
+        with self.lock:
+            latencies = np.array(self.latencies) * 1e3
+            uptime = time.time() - self.started
+            return {
+                "uptime_s": uptime,
+                "requests": self.requests,
+                "rows": self.rows,
+                "batches": self.batches,
+                "rows_per_batch": self.rows / self.batches if self.batches else 0.0,
+                "rows_per_s": self.rows / uptime if uptime > 0 else 0.0,
+                "predict_s": self.predict_seconds,
+                "latency_ms_p50": float(np.percentile(latencies, 50)) if len(latencies) else None,
+                "latency_ms_p95": float(np.percentile(latencies, 95)) if len(latencies) else None,
+                "latency_ms_max": float(latencies.max()) if len(latencies) else None,
+                "queued": self.queue.qsize(),
+            }
+
+    def close(self):
+        self.queue.put(None)
+        self.worker.join()
+
+
+class EnergyService:
+    def __init__(self, model_path, store_path=None, max_batch_rows=65536, max_wait_ms=5.0):
+        """
+        Energy prediction for trajectory segments and whole vehicle traces
+
+        Args:
+            model_path (str): Pickled model or compact forest directory
+            store_path (str): Optional trajectory store (src/trajectory_store.py)
+                so that whole vehicles can be requested by id
+        """
+        model, version = load_model(model_path)
+        self.model_path = model_path
+        self.version = version
+        self.batcher = MicroBatcher(model, version, max_batch_rows, max_wait_ms)
+        self.store = None
+        if store_path:
+            from trajectory_store import TrajectoryStore
+            self.store = TrajectoryStore(store_path)
+
+    def columns_from_request(self, request):
+        """
+        Request body -> dict of column arrays
+
+        Accepted forms:
+            {"columns": {"speed_kmh": [...], ...}}   columnar segment
+            {"samples": [{"speed_kmh": ..., ...}, ...]}  row records
+            {"vehicle_id": "veh12"}                  whole trace from the store
+        """
+        if "columns" in request:
+            return {name: np.asarray(values) for name, values in request["columns"].items()}
+        if "samples" in request:
+            samples = request["samples"]
+            # Only the model inputs (and the target) are numeric; other keys such as vehicle_id are ignored
+            names = features.input_columns(self.version, target=False)
+            if samples:
+                names = [name for name in names + [features.TARGET] if name in samples[0]]
+            return {name: np.array([sample.get(name) for sample in samples], dtype=np.float64)
+                    for name in names}
+        if "vehicle_id" in request:
+            if self.store is None:
+                raise ValueError("No trajectory store configured; send the trace as 'columns' or 'samples'")
+            if request["vehicle_id"] not in self.store:
+                raise KeyError(f"Vehicle '{request['vehicle_id']}' is not in the trajectory store")
+            names = [name for name in features.input_columns(self.version) if name in self.store.columns]
+            return self.store.vehicle(request["vehicle_id"], names)
+        raise ValueError("Request needs 'columns', 'samples' or 'vehicle_id'")
+
+    def predict(self, request):
+        """
+        Returns:
+            dict with per_step_wh (null for steps the feature filter drops),
+            total_wh, and true_total_wh when the request carries energy_consumption
+        """
+        columns = self.columns_from_request(request)
+        missing = [name for name in features.input_columns(self.version, target=False) if name not in columns]
+        if missing:
+            raise ValueError(f"Missing columns: {missing}")
+
+        X, mask = features.build_features(columns, self.version)
+        # Infinite inputs (or values beyond float32 range) are rejected here,
+        # before they are coalesced with other requests into one model call
+        finite = np.isfinite(X).all(axis=1)
+        if not finite.all():
+            rows = np.flatnonzero(mask)[~finite]
+            raise ValueError(f"{len(rows)} rows have non-finite feature values (first row: {int(rows[0])})")
+        y_pred = self.batcher.predict(X)
+
+        per_step = np.full(len(mask), np.nan)
+        per_step[mask] = y_pred
+        response = {
+            "rows": int(len(mask)),
+            "used_rows": int(mask.sum()),
+            "per_step_wh": [None if np.isnan(v) else float(v) for v in per_step],
+            "total_wh": float(y_pred.sum()),
+        }
+        if features.TARGET in columns:
+            y_true = np.asarray(columns[features.TARGET], dtype=np.float64)[mask]
+            response["true_total_wh"] = float(y_true.sum())
+        return response
+
+    def stats(self):
+        return {"model": self.model_path, "feature_version": self.version, **self.batcher.stats()}
+
+    def close(self):
+        self.batcher.close()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """POST /predict, GET /stats, GET /health"""
+
+    service = None
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send(200, self.service.stats())
+        elif self.path == "/health":
+            self._send(200, {"status": "ok"})
+        else:
+            self._send(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            self._send(200, self.service.predict(request))
+        except (ValueError, KeyError) as e:
+            self._send(400, {"error": str(e.args[0]) if e.args else str(e)})
+        except Exception as e:
+            self._send(500, {"error": str(e)})
+
+    def address_string(self):
+        # Unix socket clients have no (host, port) address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+def make_server(service, host="127.0.0.1", port=8765, unix_socket=None):
+    """HTTP server over TCP (host:port) or a Unix domain socket"""
+    handler = type("Handler", (ServiceHandler,), {"service": service})
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        return UnixHTTPServer(unix_socket, handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
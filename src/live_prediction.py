@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+import features
+from inference_service import load_model
+
+# Per-vehicle state kept between steps (one slot per active vehicle)
+STATE_FIELDS = {
+    "prev_x": np.nan,
+    "prev_y": np.nan,
+    "prev_z": np.nan,
+    "pred_wh": 0.0,
+    "true_wh": 0.0,
+    "steps": 0.0,
+    "predicted_steps": 0.0,
+    "last_seen": -1.0,
+}
+
+class VehicleStateBuffer:
+    def __init__(self, capacity=1024):
+        """
+        Slot-based per-vehicle state: one preallocated float64 array per
+        field, indexed by a slot that a vehicle keeps while it is active.
+        Slots of arrived vehicles are reused; arrays grow by doubling.
+        """
+        self.capacity = capacity
+        self.arrays = {name: np.full(capacity, fill) for name, fill in STATE_FIELDS.items()}
+        self.slot_of = {}
+        self.vehicle_of = [None] * capacity
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def _grow(self):
+        old = self.capacity
+        self.capacity *= 2
+        for name, fill in STATE_FIELDS.items():
+            array = np.full(self.capacity, fill)
+            array[:old] = self.arrays[name]
+            self.arrays[name] = array
+        self.vehicle_of.extend([None] * old)
+        self.free.extend(range(self.capacity - 1, old - 1, -1))
+
+    def slots(self, vehicle_ids):
+        """Slots of the given vehicles (new vehicles get a fresh slot)"""
+        out = np.empty(len(vehicle_ids), dtype=np.int64)
+        for i, vehicle_id in enumerate(vehicle_ids):
+            slot = self.slot_of.get(vehicle_id)
+            if slot is None:
+                if not self.free:
+                    self._grow()
+                slot = self.slot_of[vehicle_id] = self.free.pop()
+                self.vehicle_of[slot] = vehicle_id
+            out[i] = slot
+        return out
+
+    def release(self, slots):
+        """Free slots and return their final state as {vehicle_id: {field: value}}"""
+        released = {}
+        for slot in slots:
+            vehicle_id = self.vehicle_of[slot]
+            released[vehicle_id] = {name: float(array[slot]) for name, array in self.arrays.items()}
+            for name, fill in STATE_FIELDS.items():
+                self.arrays[name][slot] = fill
+            del self.slot_of[vehicle_id]
+            self.vehicle_of[slot] = None
+            self.free.append(slot)
+        return released
+
+
+class LivePredictor:
+    def __init__(self, model_path, record_columns, every=1, set_parameters=False, traci=None, network=None):
+        """
+        Energy prediction for all active vehicles while the simulation runs
+
+        Every `every` steps the features of all active vehicles are built in
+        one batch and predicted with one model call. The prediction stands for
+        the whole interval, so it is counted `every` times (an approximation
+        for every > 1). True consumption is accumulated every step.
+
+        Args:
+            model_path (str): Pickled model or compact forest directory
+            record_columns (list): Column order of the collector's record tuples
+            every (int): Predict every N steps
+            set_parameters (bool): Write running totals back as vehicle
+                parameters ("energy.predicted_wh", "energy.true_wh") so sumo-gui
+                shows them in the vehicle parameter dialog
+            traci: TraCI/libsumo module used for set_parameters
+            network (NetworkIndex): Optional lane geometry index; the grade is
+                then looked up at each vehicle's (lane_id, lane_position)
+                instead of being derived from consecutive positions
+        """
+        self.model, self.version = load_model(model_path)
+        self.every = max(int(every), 1)
+        self.set_parameters = set_parameters
+        self.traci = traci
+        self.network = network
+        self.state = VehicleStateBuffer()
+        self.finished = {}
+        self.model_calls = 0
+
+        index = {name: i for i, name in enumerate(record_columns)}
+        self.id_index = index["vehicle_id"]
+        self.position_index = [index["x"], index["y"], index["z"]]
+        self.target_index = index[features.TARGET]
+        self.lane_index = [index["lane_id"], index["lane_position"]]
+        # Record columns the features are computed from (slope comes from the positions)
+        self.inputs = [name for name in features.input_columns(self.version, target=False) if name != "slope_pct"]
+        self.input_index = [index[name] for name in self.inputs]
+
+    def on_step(self, step, records):
+        """Update the state with this step's records (collector record tuples)"""
+        if records:
+            vehicle_ids = [record[self.id_index] for record in records]
+            slots = self.state.slots(vehicle_ids)
+            arrays = self.state.arrays
+
+            values = np.array([[record[i] for i in self.position_index] + [record[self.target_index]]
+                               for record in records], dtype=np.float64)
+            x, y, z, energy = values.T
+            arrays["true_wh"][slots] += np.nan_to_num(energy)
+            arrays["steps"][slots] += 1
+            arrays["last_seen"][slots] = step
+
+            if step % self.every == 0:
+                self.predict(slots, records, x, y, z)
+
+            arrays["prev_x"][slots] = x
+            arrays["prev_y"][slots] = y
+            arrays["prev_z"][slots] = z
+
+        # Vehicles that were not reported this step have left the simulation
+        active = np.fromiter(self.state.slot_of.values(), dtype=np.int64, count=len(self.state.slot_of))
+        gone = active[self.state.arrays["last_seen"][active] != step]
+        if len(gone):
+            self.finished.update(self.state.release(gone))
+
+    def predict(self, slots, records, x, y, z):
+        arrays = self.state.arrays
+        columns = {name: np.array([record[i] for record in records], dtype=np.float64)
+                   for name, i in zip(self.inputs, self.input_index)}
+
+        # Grade from the previous position, as in preprocessing (z = 0 means no elevation)
+        dist = np.hypot(x - arrays["prev_x"][slots], y - arrays["prev_y"][slots])
+        dz = np.where(z == 0, np.nan, z) - np.where(arrays["prev_z"][slots] == 0, np.nan, arrays["prev_z"][slots])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            columns["slope_pct"] = np.where(dist > 0, dz / dist * 100, np.nan)
+        if self.network is not None:
+            lanes = [record[self.lane_index[0]] for record in records]
+            positions = np.array([record[self.lane_index[1]] for record in records], dtype=np.float64)
+            network_slope = self.network.slope_at(lanes, positions)
+            columns["slope_pct"] = np.where(np.isnan(network_slope), columns["slope_pct"], network_slope)
+
+        X, mask = features.build_features(columns, self.version)
+        if not len(X):
+            return
+        predicted = np.asarray(self.model.predict(features.feature_frame(X, self.version)), dtype=np.float64)
+        self.model_calls += 1
+        used = slots[mask]
+        arrays["pred_wh"][used] += predicted * self.every
+        arrays["predicted_steps"][used] += 1
+
+        if self.set_parameters and self.traci is not None:
+            for slot in used:
+                vehicle_id = self.state.vehicle_of[slot]
+                self.traci.vehicle.setParameter(vehicle_id, "energy.predicted_wh", f"{arrays['pred_wh'][slot]:.3f}")
+                self.traci.vehicle.setParameter(vehicle_id, "energy.true_wh", f"{arrays['true_wh'][slot]:.3f}")
+
+    def checkpoint_state(self):
+        """Per-vehicle state and totals, saved with the collector's checkpoints"""
+        return {"state": self.state, "finished": self.finished, "model_calls": self.model_calls}
+
+    def restore_state(self, state):
+        self.state = state["state"]
+        self.finished = state["finished"]
+        self.model_calls = state["model_calls"]
+
+    def summary(self):
+        """Predicted vs true Wh per vehicle (finished and still active)"""
+        rows = dict(self.finished)
+        active = list(self.state.slot_of.items())
+        for vehicle_id, slot in active:
+            rows[vehicle_id] = {name: float(array[slot]) for name, array in self.state.arrays.items()}
+        if not rows:
+            return pd.DataFrame(columns=["vehicle_id", "pred_wh", "true_wh", "steps", "predicted_steps"])
+        df = pd.DataFrame.from_dict(rows, orient="index")
+        df.index.name = "vehicle_id"
+        return df[["pred_wh", "true_wh", "steps", "predicted_steps"]].reset_index()
@@ -0,0 +1,264 @@
+import os
+import gzip
+import json
+import argparse
+import numpy as np
+import pandas as pd
+import xml.etree.ElementTree as ET
+
+META = "meta.json"
+LANE_ARRAYS = ("lane_edge", "lane_speed", "lane_length", "lane_shape_length", "lane_start")
+POINT_ARRAYS = ("x", "y", "z", "dist", "grade")
+EDGE_ARRAYS = ("edge_type", "edge_function", "edge_speed", "edge_length", "edge_lanes")
+# Edge-to-edge connections (one entry per connected edge pair, internal edges excluded)
+CONNECTION_ARRAYS = ("conn_from", "conn_to")
+
+def _open(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+def _parse_shape(shape):
+    """'x,y[,z] x,y[,z] ...' -> (n, 3) float64, z NaN where missing or 0 (no elevation data)"""
+    points = []
+    for token in shape.split():
+        values = token.split(",")
+        z = float(values[2]) if len(values) > 2 else np.nan
+        points.append((float(values[0]), float(values[1]), np.nan if z == 0 else z))
+    return np.array(points, dtype=np.float64).reshape(-1, 3)
+
+class NetworkIndex:
+    def __init__(self, path):
+        """
+        Per-lane and per-edge attribute table of a SUMO network
+
+        Lane shapes are stored as one flat point array (x, y, z, cumulative
+        distance along the lane, grade of the segment starting at the point);
+        lane_start[k]:lane_start[k + 1] is lane k's slice. Lookups by
+        (lane_id, lane_position) are vectorized searchsorted calls.
+
+        Args:
+            path (str): Index directory created by NetworkIndex.build
+        """
+        self.path = path
+        with open(os.path.join(path, META), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.lane_ids = pd.Index(self.meta["lanes"])
+        self.edge_ids = pd.Index(self.meta["edges"])
+        self.arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in LANE_ARRAYS + POINT_ARRAYS + EDGE_ARRAYS + CONNECTION_ARRAYS + ("key",)
+            if os.path.exists(os.path.join(path, f"{name}.npy"))
+        }
+        for name, array in self.arrays.items():
+            setattr(self, name, array)
+
+    @classmethod
+    def build(cls, net_file, path):
+        """
+        Stream a .net.xml(.gz) once and write the index to path
+
+        Top-level elements are cleared as soon as they are read, so memory
+        stays proportional to the output arrays, not to the XML tree.
+        """
+        lanes, edges = [], []
+        connections = set()
+        lane_edge, lane_speed, lane_length = [], [], []
+        edge_type, edge_function, edge_speed, edge_length, edge_lanes = [], [], [], [], []
+        shapes = []
+
+        with _open(net_file) as f:
+            context = ET.iterparse(f, events=("start", "end"))
+            _, root = next(context)
+            depth = 0
+            for event, elem in context:
+                if event == "start":
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth > 0:
+                    continue
+                if elem.tag == "connection":
+                    # Lane-level entries; keep one per edge pair, skip internal (":...") edges
+                    source, target = elem.get("from", ""), elem.get("to", "")
+                    if source and target and not source.startswith(":") and not target.startswith(":"):
+                        connections.add((source, target))
+                if elem.tag != "edge":
+                    root.clear()
+                    continue
+                edge_index = len(edges)
+                edges.append(elem.get("id"))
+                edge_type.append(elem.get("type", ""))
+                edge_function.append(elem.get("function", "normal"))
+                speeds, lengths = [], []
+                for lane in elem.iter("lane"):
+                    lanes.append(lane.get("id"))
+                    lane_edge.append(edge_index)
+                    speeds.append(float(lane.get("speed", "nan")))
+                    lengths.append(float(lane.get("length", "nan")))
+                    shapes.append(_parse_shape(lane.get("shape", "")))
+                lane_speed.extend(speeds)
+                lane_length.extend(lengths)
+                edge_speed.append(max(speeds, default=np.nan))
+                edge_length.append(max(lengths, default=np.nan))
+                edge_lanes.append(len(speeds))
+                root.clear()
+
+        lane_start = np.zeros(len(shapes) + 1, dtype=np.int64)
+        np.cumsum([len(shape) for shape in shapes], out=lane_start[1:])
+        points = np.concatenate(shapes) if shapes else np.empty((0, 3))
+        x, y, z = points.T
+
+        # Cumulative 2D distance inside each lane
+        step = np.zeros(len(points))
+        step[1:] = np.hypot(np.diff(x), np.diff(y))
+        step[lane_start[:-1]] = 0.0
+        dist = np.cumsum(step)
+        dist -= np.repeat(dist[lane_start[:-1]], np.diff(lane_start))
+        lane_shape_length = dist[np.maximum(lane_start[1:] - 1, 0)] if len(points) else np.zeros(0)
+
+        # Grade (%) of the segment starting at each point; a lane's last point repeats the last segment
+        grade = np.full(len(points), np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            seg = np.where(step[1:] > 0, np.diff(z) / step[1:] * 100, np.nan)
+        grade[:-1] = seg
+        last = lane_start[1:] - 1
+        n_points = np.diff(lane_start)
+        grade[last[n_points > 1]] = grade[last[n_points > 1] - 1]
+        grade[last[n_points == 1]] = np.nan
+
+        # Global search key: lanes laid end to end (lane k starts where lane k-1 ended)
+        lane_base = np.zeros(len(shapes))
+        lane_base[1:] = np.cumsum(lane_shape_length)[:-1]
+        key = dist + np.repeat(lane_base, np.diff(lane_start))
+
+        edge_lookup = pd.Index(edges)
+        pairs = sorted(connections)
+        conn_from = edge_lookup.get_indexer([source for source, _ in pairs])
+        conn_to = edge_lookup.get_indexer([target for _, target in pairs])
+        known = (conn_from >= 0) & (conn_to >= 0)
+
+        types = pd.Categorical(edge_type)
+        functions = pd.Categorical(edge_function)
+        arrays = {
+            "lane_edge": np.asarray(lane_edge, dtype=np.int32),
+            "lane_speed": np.asarray(lane_speed, dtype=np.float32),
+            "lane_length": np.asarray(lane_length, dtype=np.float64),
+            "lane_shape_length": lane_shape_length,
+            "lane_start": lane_start,
+            "x": x, "y": y, "z": z, "dist": dist, "grade": grade, "key": key,
+            "edge_type": types.codes.astype(np.int16),
+            "edge_function": functions.codes.astype(np.int8),
+            "edge_speed": np.asarray(edge_speed, dtype=np.float32),
+            "edge_length": np.asarray(edge_length, dtype=np.float64),
+            "edge_lanes": np.asarray(edge_lanes, dtype=np.int16),
+            "conn_from": conn_from[known].astype(np.int32),
+            "conn_to": conn_to[known].astype(np.int32),
+        }
+        os.makedirs(path, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), array)
+        meta = {
+            "source": os.path.abspath(net_file),
+            "lanes": lanes,
+            "edges": edges,
+            "edge_types": [str(c) for c in types.categories],
+            "edge_functions": [str(c) for c in functions.categories],
+            "has_elevation": bool(np.isfinite(z).any()),
+        }
+        with open(os.path.join(path, META), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        return cls(path)
+
+    def __len__(self):
+        return len(self.lane_ids)
+
+    def edge_index(self, edge_ids):
+        """Edge ids -> edge indices (-1 for unknown edges)"""
+        return self.edge_ids.get_indexer(np.asarray(edge_ids, dtype=object))
+
+    def edge_grade(self):
+        """
+        Mean grade (%) of every edge from the first and last shape point of
+        its first lane; 0 where the network has no elevation
+        """
+        first_lane = np.searchsorted(self.lane_edge, np.arange(len(self.edge_ids)))
+        has_lane = first_lane < len(self.lane_edge)
+        first_lane = np.where(has_lane, np.minimum(first_lane, len(self.lane_edge) - 1), 0)
+        has_lane &= self.lane_edge[first_lane] == np.arange(len(self.edge_ids))
+        start = self.lane_start[first_lane]
+        end = self.lane_start[first_lane + 1] - 1
+        length = self.lane_shape_length[first_lane]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            grade = (self.z[end] - self.z[start]) / length * 100
+        return np.where(has_lane & np.isfinite(grade), grade, 0.0)
+
+    def lane_index(self, lane_ids):
+        """Lane ids -> lane indices (-1 for unknown lanes)"""
+        return self.lane_ids.get_indexer(np.asarray(lane_ids, dtype=object))
+
+    def locate(self, lane_ids, positions):
+        """
+        Segment (point index) and distance into it for each (lane, position)
+
+        SUMO positions are measured along the lane's length attribute, which
+        can differ from the drawn shape; they are scaled onto the shape first.
+
+        Returns:
+            (lanes, segment, offset, valid)
+        """
+        lanes = self.lane_index(lane_ids)
+        valid = lanes >= 0
+        k = np.where(valid, lanes, 0)
+        positions = np.asarray(positions, dtype=np.float64)
+        shape_length = self.lane_shape_length[k]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scale = np.where(self.lane_length[k] > 0, shape_length / self.lane_length[k], 1.0)
+        along = np.clip(positions * scale, 0.0, shape_length)
+
+        start = self.lane_start[k]
+        last_segment = np.maximum(self.lane_start[k + 1] - 2, start)
+        base = self.key[start]
+        segment = np.searchsorted(self.key, base + along, side="right") - 1
+        segment = np.clip(segment, start, last_segment)
+        valid &= ~np.isnan(positions)
+        return lanes, segment, along - self.dist[segment], valid
+
+    def slope_at(self, lane_ids, positions):
+        """Road grade (%) at each (lane_id, lane_position); NaN for unknown lanes or no elevation"""
+        _, segment, _, valid = self.locate(lane_ids, positions)
+        return np.where(valid, self.grade[segment], np.nan)
+
+    def elevation_at(self, lane_ids, positions):
+        """Elevation (m) interpolated along the lane shape"""
+        _, segment, offset, valid = self.locate(lane_ids, positions)
+        z0 = self.z[segment]
+        grade = self.grade[segment]
+        # Single-point lanes and zero-length segments have no grade: use the point's z
+        z = np.where(np.isfinite(grade), z0 + grade / 100 * offset, z0)
+        return np.where(valid, z, np.nan)
+
+    def lane_attributes(self, lane_ids):
+        """Speed limit, length, edge id and road type of each lane"""
+        lanes = self.lane_index(lane_ids)
+        valid = lanes >= 0
+        k = np.where(valid, lanes, 0)
+        edges = self.lane_edge[k]
+        types = np.asarray(self.meta["edge_types"], dtype=object)[self.edge_type[edges]]
+        return pd.DataFrame({
+            "speed_limit": np.where(valid, self.lane_speed[k], np.nan),
+            "length": np.where(valid, self.lane_length[k], np.nan),
+            "edge_id": np.where(valid, self.edge_ids.to_numpy()[edges], None),
+            "road_type": np.where(valid, types, None),
+        })
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a per-lane/per-edge attribute index of a SUMO network")
+    parser.add_argument("--net", default="config/eskisehir_last_with_z.net.xml")
+    parser.add_argument("--output", default="data/network_index")
+    args = parser.parse_args()
+
+    index = NetworkIndex.build(args.net, args.output)
+    print(f"Network index written to {args.output}: {len(index)} lanes, {len(index.edge_ids)} edges, "
+          f"{len(index.x)} shape points, elevation: {index.meta['has_elevation']}")
+
+if __name__ == "__main__":
+    main()
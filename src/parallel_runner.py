@@ -0,0 +1,188 @@
+import os
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from data_collector import SUMODataCollector, RAW_SCHEMA, open_xml
+from data_sink import open_sink, iter_output, frame_to_columns
+
+# Route file elements that describe a demand item (everything else is shared)
+DEMAND_TAGS = ("vehicle", "trip", "flow")
+
+def split_routes(route_file, n_shards, out_dir):
+    """
+    Split a route file into n_shards files with disjoint vehicle subsets
+
+    Vehicles are assigned round-robin in file order, so every shard keeps
+    the original depart-time ordering. Shared definitions (vType, route,
+    ...) are copied into every shard. The file is parsed incrementally.
+
+    Returns the list of shard route file paths.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.basename(route_file).split(".")[0]
+    paths = [os.path.join(out_dir, f"{base}.shard{k}.rou.xml") for k in range(n_shards)]
+    files = [open(path, "w", encoding="utf-8") for path in paths]
+    try:
+        for f in files:
+            f.write('<?xml version="1.0" ?>\n<routes>\n')
+
+        with open_xml(route_file) as fin:
+            context = ET.iterparse(fin, events=("start", "end"))
+            _, root = next(context)
+            depth = 0
+            count = 0
+            for event, elem in context:
+                if event == "start":
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth != 0:
+                    continue
+                # Top-level element of <routes> is complete
+                text = "    " + ET.tostring(elem, encoding="unicode").strip() + "\n"
+                if elem.tag in DEMAND_TAGS:
+                    files[count % n_shards].write(text)
+                    count += 1
+                else:
+                    for f in files:
+                        f.write(text)
+                root.clear()
+
+        for f in files:
+            f.write("</routes>\n")
+    finally:
+        for f in files:
+            f.close()
+    return paths
+
+def vehicle_shards(route_file, n_shards, work_dir="output/shards"):
+    """Shards that each simulate a disjoint subset of the fleet"""
+    paths = split_routes(route_file, n_shards, work_dir)
+    return [{"name": f"shard{k}", "route_file": os.path.abspath(path), "seed": None, "disjoint": True}
+            for k, path in enumerate(paths)]
+
+def seed_shards(route_file, seeds):
+    """
+    Shards that each simulate the full fleet with a different random seed
+
+    Runs only differ if the scenario has stochastic elements (driver
+    imperfection sigma > 0, random departure lanes/speeds, ...).
+    """
+    return [{"name": f"seed{seed}", "route_file": os.path.abspath(route_file), "seed": seed, "disjoint": False}
+            for seed in seeds]
+
+def scenario_shards(route_files):
+    """Shards that each simulate a different route file (scenario)"""
+    return [{"name": f"scenario{k}", "route_file": os.path.abspath(path), "seed": None, "disjoint": False}
+            for k, path in enumerate(route_files)]
+
+def run_shard(sumocfg_file, shard, output_file, mode="traci", backend=None, row_group_size=65536,
+              sampling=None):
+    """
+    Run one shard in its own SUMO instance; executed inside a worker process
+
+    sampling is a (policy name, options) pair (see src/sampling.py)
+    """
+    sumo_args = ["-r", shard["route_file"]]
+    if shard["seed"] is not None:
+        sumo_args += ["--seed", str(shard["seed"])]
+
+    out_dir = os.path.dirname(output_file)
+    collector = SUMODataCollector(sumocfg_file, backend=backend, sumo_args=sumo_args,
+                                  tripinfo_file=os.path.join(out_dir, f"tripinfo_{shard['name']}.xml"))
+    policy = collector.sampling_policy(sampling[0], **sampling[1]) if sampling else None
+
+    start_time = time.time()
+    if mode == "native":
+        summary = collector.collect_native(
+            output_file,
+            fcd_file=os.path.join(out_dir, f"fcd_{shard['name']}.xml.gz"),
+            battery_file=os.path.join(out_dir, f"battery_{shard['name']}.xml.gz"),
+            keep_outputs=False,
+            row_group_size=row_group_size,
+            sampling=policy,
+        )
+    else:
+        if not collector.start_simulation():
+            raise RuntimeError(f"SUMO failed to start for {shard['name']}")
+        try:
+            summary = collector.collect_data(output_file, row_group_size=row_group_size, sampling=policy)
+        finally:
+            collector.close_simulation()
+
+    return {
+        "name": shard["name"],
+        "output_file": output_file,
+        "records": summary["records"] if summary else 0,
+        "seconds": time.time() - start_time,
+    }
+
+def merge_outputs(shard_results, output_file, unique_ids=False, chunksize=262144):
+    """
+    Stream the shard outputs into one dataset
+
+    With unique_ids the shard name is prefixed to every vehicle_id
+    ("seed3_veh12"), which keeps ids globally unique when shards simulate
+    overlapping fleets.
+    """
+    with open_sink(output_file, RAW_SCHEMA) as sink:
+        for result in shard_results:
+            if result["records"] == 0:
+                continue
+            for chunk in iter_output(result["output_file"], chunksize=chunksize):
+                columns = frame_to_columns(chunk, RAW_SCHEMA)
+                if unique_ids:
+                    columns["vehicle_id"] = (result["name"] + "_" + chunk["vehicle_id"].astype(str)).to_numpy(dtype=object)
+                sink.write_columns(columns)
+    return sink
+
+def run_parallel(sumocfg_file, shards, output_file, mode="traci", backend=None, workers=None,
+                 work_dir="output/shards", unique_ids=None, keep_shard_outputs=False,
+                 row_group_size=65536, sampling=None):
+    """
+    Run every shard in its own SUMO instance from a process pool and merge the results
+
+    Args:
+        sumocfg_file (str): SUMO configuration shared by all shards
+        shards (list): Shard specs from vehicle_shards/seed_shards/scenario_shards
+        output_file (str): Merged dataset (.csv, .parquet or .arrow)
+        mode (str): 'traci' or 'native' collection inside each shard
+        backend (str): 'traci' or 'libsumo' for the TraCI mode
+        workers (int): Pool size (default: one per CPU core)
+        unique_ids (bool): Prefix vehicle ids with the shard name; defaults to
+            True unless the shards are disjoint vehicle subsets
+        sampling (tuple): (policy name, options) applied in every shard
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    if unique_ids is None:
+        unique_ids = not all(shard["disjoint"] for shard in shards)
+    ext = os.path.splitext(output_file)[1]
+    workers = workers or os.cpu_count()
+
+    results = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as pool:
+        futures = {
+            pool.submit(run_shard, os.path.abspath(sumocfg_file), shard,
+                        os.path.join(work_dir, f"data_{shard['name']}{ext}"),
+                        mode, backend, row_group_size, sampling): shard["name"]
+            for shard in shards
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            print(f"✓ {result['name']}: {result['records']:,} records in {result['seconds']:.1f} s")
+            results.append(result)
+
+    # Merge in shard order so the output is deterministic
+    order = {shard["name"]: i for i, shard in enumerate(shards)}
+    results.sort(key=lambda r: order[r["name"]])
+    sink = merge_outputs(results, output_file, unique_ids=unique_ids)
+
+    if not keep_shard_outputs:
+        for result in results:
+            if os.path.exists(result["output_file"]):
+                os.remove(result["output_file"])
+
+    print(f"Merged {len(results)} shards into {output_file}: {sink.rows_written:,} records, "
+          f"{sink.distinct_count('vehicle_id')} vehicles")
+    return sink
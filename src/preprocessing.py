@@ -1,73 +1,23 @@
-import pandas as pd
-import xml.etree.ElementTree as ET
+import os
+import shutil
+import argparse
+import tempfile
 import numpy as np
+import pandas as pd
+from vtypes import VTypeTable, PHYSICS_COLUMNS
+from data_sink import STRING, open_sink, iter_output
 
-#CSV verisi
-df_csv = pd.read_csv("data/buyukdere_simulation_data_final.csv")
-
-#XML araç tipi bilgisi
-tree = ET.parse("config/vehicles.add.xml")
-root = tree.getroot()
-
-vehicle_types = []
-all_param_keys = set()
-
-for vtype in root.findall("vType"):
-    for param in vtype.findall("param"):
-        all_param_keys.add(param.get("key"))
-
-all_param_keys = list(all_param_keys)
-
-for vtype in root.findall("vType"):
-    data = {}
-    # Temel attribute'lar
-    data["vehicle_type"] = vtype.get("id")
-    data["max_speed"] = float(vtype.get("maxSpeed", 0))
-    data["accel"] = float(vtype.get("accel", 0))
-    data["decel"] = float(vtype.get("decel", 0))
-    data["length"] = float(vtype.get("length", 0))
-    data["sigma"] = float(vtype.get("sigma", 0))
-    data["min_gap"] = float(vtype.get("minGap", 0))
-    data["mass"] = float(vtype.get("mass", 0))
-    data["color"] = vtype.get("color", "")
-
-    # Parametreleri başta None yap
-    for key in all_param_keys:
-        data[key] = None
-
-    # XML'deki parametreleri doldur
-    for param in vtype.findall("param"):
-        key = param.get("key")
-        value = param.get("value")
-        try:
-            value = float(value)
-        except:
-            pass
-        data[key] = value
-
-    vehicle_types.append(data)
-
-df_xml = pd.DataFrame(vehicle_types)
-
-df = df_csv.merge(df_xml, on="vehicle_type", how="left")
-
-df['z'] = df['z'].replace(0, np.nan)
-df['z'] = pd.to_numeric(df['z'], errors='coerce')
-
-df = df.sort_values(['vehicle_id', 'timestamp']).reset_index(drop=True)
+# Eğitim verisinde tutulmayan sütunlar
+COLUMNS_TO_DROP = ['color', 'sigma', 'has.battery.device', 'stoppingThreshold', 'edge_id', 'lane_id',
+                   'vehicle_type', 'speed_ms', 'lane_position', 'angle', 'lane_speed_limit', 'charge_level',
+                   'capacity', 'battery_level', 'max_speed', 'length', 'min_gap', 'mass']
 
-df['z_filled'] = df.groupby('vehicle_id')['z'].transform(
-    lambda grp: grp.interpolate(method='linear', limit_direction='both').ffill().bfill()
-)
-df['z'] = df['z_filled']
-df = df.drop(columns=['z_filled'])
+# slope_source="network" için eğimin ağ indeksinden okunduğu sütunlar
+NETWORK_COLUMNS = ['lane_id', 'lane_position']
 
-columns_to_drop = ['color', 'sigma','has.battery.device','stoppingThreshold','edge_id', 'lane_id', 'vehicle_type', 'speed_ms', 'lane_position', 'angle', 'lane_speed_limit', 'charge_level', 'capacity', 'battery_level', 'max_speed', 'length', 'min_gap', 'mass']
-df = df.drop(columns=[col for col in columns_to_drop if col in df.columns], errors='ignore')
+# Mesafe ve eğim hesabı için tam hassasiyette tutulan sütunlar (diğer ondalıklılar float32'ye indirilir)
+FLOAT64_COLUMNS = ('lat', 'lon', 'z')
 
-# --------------------------
-# Haversine ile mesafe, % eğim ve eğim değişimi
-# --------------------------
 R = 6371000  # Dünya yarıçapı (metre)
 
 def haversine(lat1, lon1, lat2, lon2):
@@ -78,42 +28,232 @@ def haversine(lat1, lon1, lat2, lon2):
     c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
     return R * c
 
-# Bir önceki nokta değerleri
-df['lat_prev'] = df.groupby('vehicle_id')['lat'].shift()
-df['lon_prev'] = df.groupby('vehicle_id')['lon'].shift()
-df['z_prev']   = df.groupby('vehicle_id')['z'].shift()
-
-# Yatay mesafe (m)
-df['dist_m'] = haversine(df['lat_prev'], df['lon_prev'], df['lat'], df['lon'])
-
-# % eğim
-df['slope_pct'] = (df['z'] - df['z_prev']) / df['dist_m'] * 100 
-
-# Geçersiz verileri temizle
-df.loc[df['dist_m'] == 0, ['slope_pct']] = np.nan
-
-# Gereksiz yardımcı sütunları sil
-df = df.drop(columns=['lat_prev', 'lon_prev', 'z_prev'])
-
-# Kaydet
-df.to_csv("data/final_training_data.csv", index=False)
-
 # --------------------------
-# Mini veri analizi
+# Segment (araç) bazlı NumPy işlemleri
+# Satırlar vehicle_id/timestamp'e göre sıralı; is_start her aracın ilk satırını işaretler
 # --------------------------
-print("\nFinal veri başarıyla kaydedildi: ../data/final_training_data.csv")
-
-print("\nVeri boyutu (satır, sütun):", df.shape)
-
-print("\nİlk 5 satır:")
-print(df.head())
-
-print("\nSayısal sütunların özet istatistikleri:")
-print(df.describe())
-
-print("\nEksik değer sayıları:")
-print(df.isnull().sum())
-
-
-
+def segment_lag(values, is_start):
+    """groupby('vehicle_id').shift() karşılığı: bir önceki değer, aracın ilk satırında NaN"""
+    prev = np.empty(len(values), dtype=np.float64)
+    prev[1:] = values[:-1]
+    prev[is_start] = np.nan
+    return prev
+
+def segment_interpolate(values, is_start):
+    """
+    Araç içinde doğrusal interpolasyon + ffill/bfill
+    (groupby(...).transform(lambda g: g.interpolate(limit_direction='both').ffill().bfill()) karşılığı)
+    """
+    n = len(values)
+    idx = np.arange(n)
+    valid = ~np.isnan(values)
+    group_start = np.maximum.accumulate(np.where(is_start, idx, 0))
+    is_end = np.empty(n, dtype=bool)
+    is_end[:-1] = is_start[1:]
+    is_end[-1:] = True
+    group_end = np.minimum.accumulate(np.where(is_end, idx, n - 1)[::-1])[::-1]
+
+    # Aynı araç içindeki önceki/sonraki geçerli nokta
+    prev_valid = np.maximum.accumulate(np.where(valid, idx, -1))
+    next_valid = np.minimum.accumulate(np.where(valid, idx, n)[::-1])[::-1]
+    has_prev = prev_valid >= group_start
+    has_next = next_valid <= group_end
+
+    out = values.astype(np.float64, copy=True)
+    p = np.clip(prev_valid, 0, n - 1)
+    q = np.clip(next_valid, 0, n - 1)
+    both = ~valid & has_prev & has_next
+    weight = (idx[both] - p[both]) / (q[both] - p[both])
+    out[both] = values[p[both]] + (values[q[both]] - values[p[both]]) * weight
+    only_prev = ~valid & has_prev & ~has_next
+    out[only_prev] = values[p[only_prev]]
+    only_next = ~valid & ~has_prev & has_next
+    out[only_next] = values[q[only_next]]
+    return out
 
+# --------------------------
+# Dış bellek (out-of-core) akışı
+# --------------------------
+def vehicle_row_counts(input_file, chunksize):
+    """1. geçiş: yalnızca vehicle_id okunur, araç başına satır sayısı (id sırasına göre)"""
+    counts = None
+    for chunk in iter_output(input_file, chunksize=chunksize, columns=['vehicle_id']):
+        c = chunk['vehicle_id'].astype(str).value_counts()
+        counts = c if counts is None else counts.add(c, fill_value=0)
+    if counts is None:
+        return pd.Series(dtype=np.int64)
+    return counts.astype(np.int64).sort_index()
+
+def assign_buckets(counts, bucket_rows):
+    """Sıralı araç id'lerini ardışık, yaklaşık bucket_rows satırlık gruplara böler"""
+    cumulative = counts.cumsum().to_numpy() - counts.to_numpy()
+    return pd.Series(cumulative // max(bucket_rows, 1), index=counts.index)
+
+def downcast(df):
+    for col in df.columns:
+        kind = df[col].dtype.kind
+        if kind == 'f' and col not in FLOAT64_COLUMNS:
+            df[col] = df[col].astype(np.float32)
+        elif kind in 'iu' and col == 'timestamp':
+            df[col] = df[col].astype(np.int32)
+    return df
+
+def partition_by_vehicle(input_file, tmp_dir, buckets, usecols, chunksize):
+    """2. geçiş: satırları araç gruplarına (bucket) göre geçici parquet parçalarına dağıtır"""
+    for i, chunk in enumerate(iter_output(input_file, chunksize=chunksize, columns=usecols)):
+        chunk['vehicle_id'] = chunk['vehicle_id'].astype(str)
+        chunk = downcast(chunk)
+        bucket_ids = chunk['vehicle_id'].map(buckets).to_numpy()
+        for bucket in np.unique(bucket_ids):
+            part_dir = os.path.join(tmp_dir, f"bucket_{bucket:05d}")
+            os.makedirs(part_dir, exist_ok=True)
+            chunk[bucket_ids == bucket].to_parquet(os.path.join(part_dir, f"part_{i:05d}.parquet"), index=False)
+
+def process_block(df, vtype_frame=None, network=None):
+    """
+    Bir araç grubunun tüm satırlarını işler: vType birleştirme, z interpolasyonu,
+    sütun temizliği, mesafe ve % eğim. Araçların satırları tek, sıralı bloklar halinde işlenir.
+    network (NetworkIndex) verilirse eğim, şerit geometrisinden (lane_id, lane_position) okunur;
+    ağda eğimi olmayan satırlarda GPS noktalarından hesaplanan eğim kullanılır.
+    """
+    if vtype_frame is not None:
+        df = df.merge(vtype_frame, on='vehicle_type', how='left')
+
+    # Araç id'si kategorik; kategoriler sıralı olduğundan kodlar id sırasını korur
+    df['vehicle_id'] = pd.Categorical(df['vehicle_id'], categories=np.sort(df['vehicle_id'].unique()))
+    codes = df['vehicle_id'].cat.codes.to_numpy()
+    order = np.lexsort((df['timestamp'].to_numpy(), codes))
+    df = df.iloc[order].reset_index(drop=True)
+    codes = codes[order]
+
+    is_start = np.empty(len(df), dtype=bool)
+    is_start[:1] = True
+    is_start[1:] = codes[1:] != codes[:-1]
+
+    z = pd.to_numeric(df['z'], errors='coerce').to_numpy(dtype=np.float64, copy=True)
+    z[z == 0] = np.nan
+    z = segment_interpolate(z, is_start)
+    df['z'] = z
+
+    network_slope = None
+    if network is not None:
+        network_slope = network.slope_at(df['lane_id'].astype(str).to_numpy(),
+                                         df['lane_position'].to_numpy(dtype=np.float64))
+
+    df = df.drop(columns=[col for col in COLUMNS_TO_DROP if col in df.columns], errors='ignore')
+
+    lat = df['lat'].to_numpy(dtype=np.float64)
+    lon = df['lon'].to_numpy(dtype=np.float64)
+
+    # Yatay mesafe (m)
+    dist_m = haversine(segment_lag(lat, is_start), segment_lag(lon, is_start), lat, lon)
+
+    # % eğim
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope_pct = (z - segment_lag(z, is_start)) / dist_m * 100
+
+    # Geçersiz verileri temizle
+    slope_pct[dist_m == 0] = np.nan
+    if network_slope is not None:
+        slope_pct = np.where(np.isnan(network_slope), slope_pct, network_slope)
+
+    df['dist_m'] = dist_m
+    df['slope_pct'] = slope_pct
+    return downcast(df)
+
+def frame_schema(df):
+    return [(col, STRING if df[col].dtype.kind in 'OUSc' or str(df[col].dtype) in ('category', 'string', 'str')
+             else str(df[col].dtype)) for col in df.columns]
+
+def frame_columns(df):
+    return {col: df[col].to_numpy(dtype=object) if dtype == STRING else df[col].to_numpy()
+            for col, dtype in frame_schema(df)}
+
+def preprocess(input_file="data/buyukdere_simulation_data_final.csv",
+               output_file="data/final_training_data.csv",
+               vtypes_file="config/vehicles.add.xml",
+               chunksize=500000, bucket_rows=2000000, tmp_dir=None,
+               slope_source="gps", network_path="data/network_index"):
+    """
+    Ham kolektör çıktısını eğitim verisine dönüştürür (sınırlı bellekle)
+
+    1. geçiş araç başına satır sayılarını, 2. geçiş satırları araç gruplarına
+    göre geçici parquet parçalarına dağıtır; ardından her grup tek blok olarak
+    işlenip çıktıya eklenir. Bellek kullanımı yaklaşık bucket_rows satırla sınırlıdır.
+    Çıktı ve girdi biçimi uzantıya göredir (.csv, .parquet, .arrow).
+    slope_source="network": eğim, src/network_index.py ile oluşturulmuş ağ
+    indeksinden (network_path) şerit ve şerit konumuna göre okunur.
+
+    Returns:
+        Çıktıyı yazan sink (satır sayısı, eksik değer ve özet istatistikler)
+    """
+    columns = next(iter_output(input_file, chunksize=1)).columns
+    has_physics = all(col in columns for col in PHYSICS_COLUMNS)
+    drop = set(COLUMNS_TO_DROP) - ({'vehicle_type'} if not has_physics else set())
+    network = None
+    if slope_source == "network":
+        from network_index import NetworkIndex
+        network = NetworkIndex(network_path)
+        drop -= set(NETWORK_COLUMNS)
+    elif slope_source != "gps":
+        raise ValueError(f"Bilinmeyen eğim kaynağı: {slope_source} (gps veya network)")
+    if not has_physics:
+        # Eski CSV'lerde fizik sütunları yok: vType tablosu ile birleştir
+        drop |= set(PHYSICS_COLUMNS)
+    usecols = [col for col in columns if col not in drop]
+    vtype_frame = None if has_physics else VTypeTable.from_xml(vtypes_file).to_frame()
+
+    counts = vehicle_row_counts(input_file, chunksize)
+    buckets = assign_buckets(counts, bucket_rows)
+
+    tmp_dir = tempfile.mkdtemp(prefix="preprocess_", dir=tmp_dir)
+    sink = None
+    try:
+        partition_by_vehicle(input_file, tmp_dir, buckets, usecols, chunksize)
+        for bucket_dir in sorted(os.listdir(tmp_dir)):
+            block = pd.read_parquet(os.path.join(tmp_dir, bucket_dir))
+            df = process_block(block, vtype_frame, network)
+            if sink is None:
+                sink = open_sink(output_file, frame_schema(df), row_group_size=1, distinct_columns=('vehicle_id',))
+            sink.write_columns(frame_columns(df))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if sink is not None:
+            sink.close()
+    return sink
+
+def main():
+    parser = argparse.ArgumentParser(description="Ham simülasyon verisini eğitim verisine dönüştürür")
+    parser.add_argument("--input", default="data/buyukdere_simulation_data_final.csv")
+    parser.add_argument("--output", default="data/final_training_data.csv")
+    parser.add_argument("--slope-source", choices=["gps", "network"], default="gps",
+                        help="network: eğim ağ indeksinden (python src/network_index.py) okunur")
+    parser.add_argument("--network", default="data/network_index")
+    args = parser.parse_args()
+
+    sink = preprocess(args.input, args.output, slope_source=args.slope_source, network_path=args.network)
+    if sink is None:
+        print("Girdi verisi boş!")
+        return
+
+    # --------------------------
+    # Mini veri analizi
+    # --------------------------
+    print(f"\nFinal veri başarıyla kaydedildi: {sink.path}")
+
+    print("\nVeri boyutu (satır, sütun):", (sink.rows_written, len(sink.schema)))
+    print("Araç sayısı:", sink.distinct_count('vehicle_id'))
+
+    print("\nİlk 5 satır:")
+    print(next(iter_output(sink.path, chunksize=5)))
+
+    print("\nSayısal sütunların özet istatistikleri:")
+    stats = pd.DataFrame(sink.numeric_stats, index=['count', 'sum', 'min', 'max']).T
+    stats['mean'] = stats['sum'] / stats['count']
+    print(stats[['count', 'mean', 'min', 'max']])
+
+    print("\nEksik değer sayıları:")
+    print(pd.Series(sink.null_counts))
+
+if __name__ == "__main__":
+    main()
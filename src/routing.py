@@ -0,0 +1,273 @@
+import os
+import json
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import dijkstra, connected_components
+import energy_model
+import features
+
+# Dijkstra needs strictly positive weights; downhill edges with net recuperation get this floor
+MIN_EDGE_WH = 1e-6
+
+class RoadGraph:
+    def __init__(self, network):
+        """
+        Edge graph of a SUMO network as a CSR adjacency matrix
+
+        Nodes are edges of the NetworkIndex, arcs are its connections
+        (edge -> next edge). The weight of an arc is the cost of entering its
+        target edge, so a route costs cost[origin] + sum of its arc weights.
+
+        Args:
+            network (NetworkIndex): Index built with connections (src/network_index.py)
+        """
+        if "conn_from" not in network.arrays:
+            raise ValueError(f"{network.path} has no connections; rebuild it with src/network_index.py")
+        self.network = network
+        self.n_edges = len(network.edge_ids)
+        self.source = np.asarray(network.conn_from, dtype=np.int32)
+        self.target = np.asarray(network.conn_to, dtype=np.int32)
+        order = np.lexsort((self.target, self.source))
+        self.source, self.target = self.source[order], self.target[order]
+        self.indptr = np.zeros(self.n_edges + 1, dtype=np.int32)
+        np.cumsum(np.bincount(self.source, minlength=self.n_edges), out=self.indptr[1:])
+
+    def matrix(self, edge_cost):
+        """CSR matrix whose arc weights are edge_cost of each arc's target edge"""
+        data = np.maximum(np.asarray(edge_cost, dtype=np.float64)[self.target], MIN_EDGE_WH)
+        return sp.csr_matrix((data, self.target, self.indptr), shape=(self.n_edges, self.n_edges))
+
+    def shortest_paths(self, edge_cost, origins, matrix=None):
+        """Single-source trees for each origin: (distances, predecessors) of shape (n_origins, n_edges)"""
+        matrix = self.matrix(edge_cost) if matrix is None else matrix
+        return dijkstra(matrix, directed=True, indices=np.asarray(origins), return_predecessors=True)
+
+    def strong_components(self):
+        """Strongly connected component label of every edge (every edge can reach every other edge of its component)"""
+        _, labels = connected_components(self.matrix(np.ones(self.n_edges)), directed=True, connection="strong")
+        return labels
+
+    @staticmethod
+    def walk(predecessors, rows, starts, ends):
+        """
+        Follow predecessors[rows, node] from starts until ends for many legs at once
+
+        Returns:
+            (nodes, lengths): (n_legs, max_len) visited nodes, starts first, and the
+            number of valid entries per leg; lengths is 0 where a leg breaks off
+        """
+        node = np.asarray(starts).copy()
+        ends = np.asarray(ends)
+        steps = [node]
+        active = node != ends
+        broken = np.zeros(len(node), dtype=bool)
+        while active.any():
+            following = predecessors[rows, node]
+            broken |= active & (following < 0)
+            active &= following >= 0
+            node = np.where(active, following, node)
+            steps.append(node)
+            active &= node != ends
+        nodes = np.stack(steps, axis=1)
+        lengths = np.argmax(nodes == ends[:, None], axis=1) + 1
+        lengths[broken] = 0
+        return nodes, lengths
+
+    @staticmethod
+    def path(predecessors, origin, destination):
+        """Edge index list origin -> destination from one predecessor row (None if unreachable)"""
+        if origin == destination:
+            return [origin]
+        if predecessors[destination] < 0:
+            return None
+        path = [destination]
+        while path[-1] != origin:
+            path.append(predecessors[path[-1]])
+        return path[::-1]
+
+
+class EnergyRouter:
+    def __init__(self, network, vtypes, model_path=None):
+        """
+        Minimum-energy routing per vehicle type
+
+        Every edge gets a per-vType energy cost once: driving its length at
+        min(speed limit, vType maxSpeed) on its mean grade, with SUMO's
+        physical model (src/energy_model.py) or a trained model evaluated on
+        the same constant-speed samples. Costs are cached per vType.
+
+        Args:
+            network (NetworkIndex): Network index with connections
+            vtypes (VTypeTable): Vehicle types (config/vehicles.add.xml)
+            model_path (str): Optional trained model (pickle or compact forest dir)
+        """
+        self.graph = RoadGraph(network)
+        self.network = network
+        self.vtypes = vtypes
+        self.model = None
+        if model_path:
+            from inference_service import load_model
+            self.model, self.version = load_model(model_path)
+        self.grade = network.edge_grade()
+        self.length = np.asarray(network.edge_length, dtype=np.float64)
+        self.speed_limit = np.asarray(network.edge_speed, dtype=np.float64)
+        self._costs = {}
+        self._matrices = {}
+
+    def edge_energy(self, vtype):
+        """Energy (Wh) of driving every edge with vType `vtype`"""
+        cost = self._costs.get(vtype)
+        if cost is not None:
+            return cost
+        n = self.graph.n_edges
+        ids = np.full(n, vtype, dtype=object)
+        params = energy_model.params_from_vtypes(self.vtypes, ids)
+        max_speed = self.vtypes.lookup(ids, "max_speed")
+        speed = np.fmin(self.speed_limit, max_speed)
+        speed = np.where(np.isfinite(speed) & (speed > 0), speed, 13.89)
+        seconds = self.length / speed
+        acceleration = np.zeros(n)
+
+        # Energy per second of travel
+        per_second = energy_model.step_energy_wh(speed, acceleration, self.grade, params)
+        if self.model is not None:
+            columns = {name: self.vtypes.lookup(ids, name) for name in features.input_columns(self.version, False)}
+            columns.update(speed_kmh=speed * 3.6, acceleration=acceleration, slope_pct=self.grade,
+                           mass_kg=params["mass"])
+            X, mask = features.build_features(columns, self.version)
+            if len(X):
+                # Edges the feature filter drops keep the physical estimate
+                per_second[mask] = np.asarray(self.model.predict(features.feature_frame(X, self.version)))
+
+        cost = self._costs[vtype] = per_second * seconds
+        return cost
+
+    def matrix(self, vtype):
+        matrix = self._matrices.get(vtype)
+        if matrix is None:
+            matrix = self._matrices[vtype] = self.graph.matrix(self.edge_energy(vtype))
+        return matrix
+
+    def route_energy(self, edges, vtype):
+        """Energy (Wh) of an edge index list"""
+        return float(self.edge_energy(vtype)[edges].sum())
+
+    def route_batch(self, origins, destinations, vtype, block=256):
+        """
+        Minimum-energy routes for many OD pairs (edge indices)
+
+        One single-source tree per distinct origin, computed `block` origins
+        at a time, serves every destination of that origin.
+
+        Returns:
+            list of (edge index list, Wh) or None for unreachable pairs
+        """
+        origins = np.asarray(origins)
+        destinations = np.asarray(destinations)
+        cost = self.edge_energy(vtype)
+        matrix = self.matrix(vtype)
+        results = [None] * len(origins)
+        unique = np.unique(origins)
+        for start in range(0, len(unique), block):
+            sources = unique[start:start + block]
+            dist, pred = self.graph.shortest_paths(cost, sources, matrix)
+            row_of = {source: i for i, source in enumerate(sources)}
+            for i in np.flatnonzero(np.isin(origins, sources)):
+                row = row_of[origins[i]]
+                if np.isinf(dist[row, destinations[i]]):
+                    continue
+                path = self.graph.path(pred[row], origins[i], destinations[i])
+                results[i] = (path, self.route_energy(path, vtype))
+        return results
+
+    def alternatives(self, origin, destination, vtype, k=3, penalty=1.5, max_tries=None):
+        """
+        Up to k distinct routes ranked by energy (edge penalty method)
+
+        After each search the edges of the found route become `penalty` times
+        more expensive, which pushes the next search onto other roads. Routes
+        are ranked by their unpenalized energy.
+        """
+        cost = self.edge_energy(vtype)
+        penalized = cost.copy()
+        routes = {}
+        for _ in range(max_tries or 2 * k):
+            _, pred = self.graph.shortest_paths(penalized, [origin])
+            path = self.graph.path(pred[0], origin, destination)
+            if path is None:
+                break
+            routes.setdefault(tuple(path), self.route_energy(path, vtype))
+            if len(routes) >= k:
+                break
+            penalized[path] *= penalty
+        return sorted(([list(path), wh] for path, wh in routes.items()), key=lambda route: route[1])
+
+
+class HubTrees:
+    FORWARD = "forward.npy"
+    BACKWARD = "backward.npy"
+    META = "hubs.json"
+    # Reversed graph as CSR arrays, for trees into targets other than the hubs
+    REVERSE = ("reverse_data.npy", "reverse_indices.npy", "reverse_indptr.npy")
+
+    def __init__(self, path):
+        """
+        Shortest-path trees rooted at a fixed set of hub edges, memory-mapped
+
+        forward[i] are the predecessors of the tree from hub i (paths hub -> any
+        edge), backward[i] those of the tree into hub i on the reversed graph
+        (paths any edge -> hub, read front to back). Every route leg that
+        starts or ends at a hub is answered from them without a new search;
+        legs into other edges use trees computed on demand (into()).
+        """
+        self.path = path
+        with open(os.path.join(path, self.META), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.hubs = np.asarray(self.meta["hubs"], dtype=np.int64)
+        self.row_of = {hub: i for i, hub in enumerate(self.meta["hubs"])}
+        self.forward = np.load(os.path.join(path, self.FORWARD), mmap_mode="r")
+        self.backward = np.load(os.path.join(path, self.BACKWARD), mmap_mode="r")
+        data, indices, indptr = (np.load(os.path.join(path, name), mmap_mode="r") for name in self.REVERSE)
+        self.reverse = sp.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, len(indptr) - 1))
+
+    @classmethod
+    def build(cls, graph, edge_cost, hubs, path):
+        """Two Dijkstra runs over all hubs (forward and on the transposed graph)"""
+        os.makedirs(path, exist_ok=True)
+        hubs = np.asarray(hubs, dtype=np.int64)
+        matrix = graph.matrix(edge_cost)
+        # Reversed arc u <- v keeps the cost of entering v, so a reversed path costs the same as the forward one
+        reverse = sp.csr_matrix(sp.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=matrix.shape).T)
+        for name, m in ((cls.FORWARD, matrix), (cls.BACKWARD, reverse)):
+            _, pred = dijkstra(m, directed=True, indices=hubs, return_predecessors=True)
+            np.save(os.path.join(path, name), pred.astype(np.int32))
+            del pred
+        for name, array in zip(cls.REVERSE, (reverse.data, reverse.indices, reverse.indptr)):
+            np.save(os.path.join(path, name), array)
+        with open(os.path.join(path, cls.META), "w", encoding="utf-8") as f:
+            json.dump({"hubs": hubs.tolist()}, f)
+        return cls(path)
+
+    def rows(self, hubs):
+        return np.array([self.row_of[int(hub)] for hub in hubs], dtype=np.int64)
+
+    def from_hub(self, hubs, targets):
+        """Paths hub -> target as (nodes, lengths) with nodes in driving order"""
+        nodes, lengths = RoadGraph.walk(self.forward, self.rows(hubs), targets, hubs)
+        # The forward tree is walked from the target back to the hub: reverse each leg
+        index = lengths[:, None] - 1 - np.arange(nodes.shape[1])
+        return np.take_along_axis(nodes, np.maximum(index, 0), axis=1), lengths
+
+    def to_hub(self, origins, hubs):
+        """Paths origin -> hub as (nodes, lengths) with nodes in driving order"""
+        return RoadGraph.walk(self.backward, self.rows(hubs), origins, hubs)
+
+    def into(self, targets):
+        """
+        Trees into arbitrary target edges (one Dijkstra call on the reversed graph)
+
+        Returns predecessors of shape (len(targets), n_edges); pass them to
+        RoadGraph.walk with rows = positions in targets, like to_hub.
+        """
+        _, pred = dijkstra(self.reverse, directed=True, indices=np.asarray(targets), return_predecessors=True)
+        return pred
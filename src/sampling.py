@@ -0,0 +1,194 @@
+import numpy as np
+
+# Energy accounting shared by all policies
+# ----------------------------------------
+# Every record carries the battery consumption (energy_consumption, Wh) of
+# one simulation step. A policy that drops records adds their energy to the
+# next record it writes for the same vehicle, and sample_steps says how many
+# steps that record covers. Summing energy_consumption per vehicle therefore
+# gives exactly the same total as the full-rate output, and
+# energy_consumption / sample_steps is the mean per-step consumption of the
+# interval. Speed, position, charge level etc. are the values at the written
+# step. When a vehicle leaves, the energy since its last written record is
+# written with its last seen record.
+#
+# Sampled outputs are meant for energy totals and analysis; model training
+# (features.build_dataset) rejects rows with sample_steps != 1.
+
+class SamplingPolicy:
+    name = None
+
+    def __init__(self, record_columns):
+        """
+        Decides which collector records are written to the output
+
+        Args:
+            record_columns (list): Column order of the collector's record tuples
+        """
+        index = {name: i for i, name in enumerate(record_columns)}
+        self.id_index = index["vehicle_id"]
+        self.energy_index = index["energy_consumption"]
+        self.steps_index = index["sample_steps"]
+        self.speed_index = index["speed_ms"]
+        self.acceleration_index = index["acceleration"]
+        self.edge_index = index["edge_id"]
+        self.speed_kmh_index = index["speed_kmh"]
+        # Per vehicle: the interval since its last written record
+        self.pending = {}
+
+    def due(self, step, record, interval):
+        """True if the vehicle's record of this step is written"""
+        raise NotImplementedError
+
+    def on_step(self, step, records):
+        """Feed one step's records; returns the records to write"""
+        out = []
+        for record in records:
+            vehicle_id = record[self.id_index]
+            interval = self.pending.get(vehicle_id)
+            if interval is None:
+                interval = self.pending[vehicle_id] = {"record": None, "energy": 0.0, "steps": 0, "written": None}
+            self.accumulate(interval, record)
+            interval["last_step"] = step
+            if self.due(step, record, interval):
+                out.append(self.emit(interval))
+
+        # Vehicles that were not reported this step have left the simulation
+        gone = [vehicle_id for vehicle_id, interval in self.pending.items() if interval["last_step"] != step]
+        for vehicle_id in gone:
+            interval = self.pending.pop(vehicle_id)
+            if interval["steps"]:
+                out.append(self.emit(interval))
+        return out
+
+    def finish(self):
+        """Records of all vehicles still pending at the end of the run"""
+        out = [self.emit(interval) for interval in self.pending.values() if interval["steps"]]
+        self.pending = {}
+        return out
+
+    def accumulate(self, interval, record):
+        energy = float(record[self.energy_index]) if record[self.energy_index] is not None else np.nan
+        interval["record"] = record
+        interval["energy"] += 0.0 if np.isnan(energy) else energy
+        interval["steps"] += 1
+
+    def emit(self, interval):
+        """The interval's last record carrying the interval's energy; starts a new interval"""
+        record = list(interval["record"])
+        record[self.energy_index] = interval["energy"]
+        record[self.steps_index] = interval["steps"]
+        interval["written"] = interval["record"]
+        interval["energy"] = 0.0
+        interval["steps"] = 0
+        return tuple(record)
+
+    def checkpoint_state(self):
+        """Pending intervals, saved with the collector's checkpoints"""
+        return {"policy": self.name, "pending": self.pending}
+
+    def restore_state(self, state):
+        if state["policy"] != self.name:
+            raise ValueError(f"Checkpoint was collected with sampling '{state['policy']}', not '{self.name}'")
+        self.pending = state["pending"]
+
+
+class EveryStep(SamplingPolicy):
+    """Every record of every step (the full-rate output, sample_steps = 1)"""
+
+    name = "every-step"
+
+    def on_step(self, step, records):
+        return records
+
+    def finish(self):
+        return []
+
+
+class EveryNthStep(SamplingPolicy):
+    """
+    Records of steps divisible by n. Each written record carries the energy
+    of the up to n steps since the vehicle's previous record.
+    """
+
+    name = "nth"
+
+    def __init__(self, record_columns, every=10):
+        super().__init__(record_columns)
+        self.every = max(int(every), 1)
+
+    def due(self, step, record, interval):
+        return step % self.every == 0
+
+
+class Adaptive(SamplingPolicy):
+    """
+    Per-vehicle sampling on change: a record is written when the vehicle
+    enters a new edge, or its speed or acceleration differs from the last
+    written record by at least the threshold, and at the latest after
+    max_interval steps. Cruising vehicles produce few rows, manoeuvres
+    stay at full resolution. Skipped steps' energy goes to the next record.
+    """
+
+    name = "adaptive"
+
+    def __init__(self, record_columns, speed_threshold=0.5, acceleration_threshold=0.3, max_interval=30):
+        super().__init__(record_columns)
+        self.speed_threshold = speed_threshold
+        self.acceleration_threshold = acceleration_threshold
+        self.max_interval = max(int(max_interval), 1)
+
+    def due(self, step, record, interval):
+        written = interval["written"]
+        if written is None or interval["steps"] >= self.max_interval:
+            return True
+        return (record[self.edge_index] != written[self.edge_index]
+                or abs(record[self.speed_index] - written[self.speed_index]) >= self.speed_threshold
+                or abs(record[self.acceleration_index] - written[self.acceleration_index]) >= self.acceleration_threshold)
+
+
+class TripAggregate(SamplingPolicy):
+    """
+    One record per trip, written when the vehicle leaves: the last record
+    of the trip with energy_consumption = total trip energy, sample_steps =
+    trip duration in steps, and speed and acceleration replaced by their
+    trip means. Position, charge level and SoC are the final values.
+    """
+
+    name = "trip"
+
+    def due(self, step, record, interval):
+        return False
+
+    def accumulate(self, interval, record):
+        super().accumulate(interval, record)
+        interval["speed_sum"] = interval.get("speed_sum", 0.0) + record[self.speed_index]
+        interval["acceleration_sum"] = interval.get("acceleration_sum", 0.0) + record[self.acceleration_index]
+
+    def emit(self, interval):
+        steps = interval["steps"]
+        speed = interval["speed_sum"] / steps
+        acceleration = interval["acceleration_sum"] / steps
+        record = list(super().emit(interval))
+        record[self.speed_index] = speed
+        record[self.speed_kmh_index] = speed * 3.6
+        record[self.acceleration_index] = acceleration
+        return tuple(record)
+
+
+POLICIES = {policy.name: policy for policy in (EveryStep, EveryNthStep, Adaptive, TripAggregate)}
+
+def make_policy(name, record_columns, **options):
+    """Create a sampling policy by name ('every-step', 'nth', 'adaptive', 'trip')"""
+    if name not in POLICIES:
+        raise ValueError(f"Unknown sampling policy '{name}', expected one of {sorted(POLICIES)}")
+    return POLICIES[name](record_columns, **options)
+
+def policy_options(name, every=10, speed_threshold=0.5, acceleration_threshold=0.3, max_interval=30):
+    """The options the named policy takes, picked from the command line settings"""
+    if name == "nth":
+        return {"every": every}
+    if name == "adaptive":
+        return {"speed_threshold": speed_threshold, "acceleration_threshold": acceleration_threshold,
+                "max_interval": max_interval}
+    return {}
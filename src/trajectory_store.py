@@ -0,0 +1,196 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from data_sink import iter_output
+from preprocessing import downcast
+
+MANIFEST = "manifest.json"
+OFFSETS = "offsets.npy"
+
+class TrajectoryStore:
+    def __init__(self, path):
+        """
+        Per-vehicle trajectory store: one memory-mapped .npy file per column,
+        rows grouped by vehicle_id and sorted by timestamp inside each vehicle,
+        plus an offset index vehicle_id -> row range.
+
+        String columns are stored as int32 codes; their categories live in the
+        manifest. Every per-vehicle accessor returns views into the mapped files.
+
+        Args:
+            path (str): Store directory created by TrajectoryStore.build
+        """
+        self.path = path
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.vehicle_ids = self.manifest["vehicles"]
+        self.index = {vid: i for i, vid in enumerate(self.vehicle_ids)}
+        self.offsets = np.load(os.path.join(path, OFFSETS))
+        self.categories = self.manifest["categories"]
+        self.columns = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in self.manifest["columns"]
+        }
+
+    @classmethod
+    def build(cls, input_file, path, columns=None, chunksize=500000):
+        """
+        Build a store from a collector or preprocessing output (.csv, .parquet, .arrow)
+
+        Two streaming passes: the first counts rows per vehicle to lay out the
+        offset index, the second scatters every chunk straight into its
+        vehicles' row ranges in the preallocated column files. Rows are then
+        sorted by timestamp inside each vehicle if the input was not.
+        """
+        os.makedirs(path, exist_ok=True)
+
+        # 1. pass: rows per vehicle and column types
+        counts = None
+        first = None
+        for chunk in iter_output(input_file, chunksize=chunksize, columns=columns):
+            if first is None:
+                first = downcast(chunk.head(1).copy())
+            c = chunk["vehicle_id"].astype(str).value_counts()
+            counts = c if counts is None else counts.add(c, fill_value=0)
+        if counts is None:
+            raise ValueError(f"{input_file} contains no rows")
+        counts = counts.astype(np.int64).sort_index()
+        vehicle_ids = counts.index.tolist()
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts.to_numpy(), out=offsets[1:])
+        n_rows = int(offsets[-1])
+
+        names = [name for name in first.columns if name != "vehicle_id"]
+        text = [name for name in names if first[name].dtype.kind not in "biuf"]
+        dtypes = {name: "int32" if name in text else str(first[name].dtype) for name in names}
+        files = {
+            name: np.lib.format.open_memmap(os.path.join(path, f"{name}.npy"), mode="w+",
+                                            dtype=dtypes[name], shape=(n_rows,))
+            for name in names
+        }
+        categories = {name: [] for name in text}
+        category_index = {name: {} for name in text}
+
+        # 2. pass: write every row into its vehicle's next free slot
+        vehicle_index = pd.Index(vehicle_ids)
+        written = np.zeros(len(vehicle_ids), dtype=np.int64)
+        for chunk in iter_output(input_file, chunksize=chunksize, columns=columns):
+            codes = vehicle_index.get_indexer(chunk["vehicle_id"].astype(str))
+            order = np.argsort(codes, kind="stable")
+            sorted_codes = codes[order]
+            # Rank of each row among the chunk's rows of the same vehicle
+            group_first = np.searchsorted(sorted_codes, sorted_codes, side="left")
+            rank = np.arange(len(order)) - group_first
+            dest = np.empty(len(order), dtype=np.int64)
+            dest[order] = offsets[sorted_codes] + written[sorted_codes] + rank
+            written += np.bincount(codes, minlength=len(vehicle_ids))
+
+            for name in names:
+                values = chunk[name]
+                if name in text:
+                    lookup = category_index[name]
+                    for value in pd.unique(values.dropna().astype(str)):
+                        if value not in lookup:
+                            lookup[value] = len(categories[name])
+                            categories[name].append(value)
+                    values = values.map(lookup).fillna(-1).to_numpy()
+                files[name][dest] = np.asarray(values).astype(dtypes[name])
+
+        # Sort by timestamp inside each vehicle (already the case for collector
+        # and preprocessing output, so this is usually skipped)
+        if "timestamp" in files:
+            timestamps = files["timestamp"]
+            segment = np.repeat(np.arange(len(vehicle_ids)), np.diff(offsets))
+            unsorted = (np.diff(timestamps) < 0) & (segment[1:] == segment[:-1])
+            if unsorted.any():
+                order = np.lexsort((np.asarray(timestamps), segment))
+                for column in files.values():
+                    column[:] = column[order]
+
+        for column in files.values():
+            column.flush()
+        del files
+        np.save(os.path.join(path, OFFSETS), offsets)
+        manifest = {
+            "source": os.path.abspath(input_file),
+            "rows": n_rows,
+            "vehicles": vehicle_ids,
+            "columns": dtypes,
+            "categories": categories,
+        }
+        with open(os.path.join(path, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        return cls(path)
+
+    def __len__(self):
+        return len(self.vehicle_ids)
+
+    def __contains__(self, vehicle_id):
+        return vehicle_id in self.index
+
+    @property
+    def n_rows(self):
+        return int(self.offsets[-1])
+
+    def rows(self, vehicle_id):
+        """Row range of a vehicle as a slice"""
+        i = self.index.get(vehicle_id)
+        if i is None:
+            raise KeyError(f"Vehicle '{vehicle_id}' is not in the trajectory store")
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def vehicle(self, vehicle_id, columns=None):
+        """Columns of one vehicle as a dict of zero-copy views (string columns as codes)"""
+        rows = self.rows(vehicle_id)
+        return {name: self.columns[name][rows] for name in (columns or self.columns)}
+
+    def decode(self, name, codes):
+        """Map int32 codes of a string column back to their values"""
+        categories = np.asarray(self.categories[name] + [None], dtype=object)
+        return categories[np.asarray(codes)]
+
+    def frame(self, vehicle_id, columns=None):
+        """One vehicle's trajectory as a DataFrame (same columns as the source file)"""
+        data = self.vehicle(vehicle_id, columns)
+        n = self.rows(vehicle_id).stop - self.rows(vehicle_id).start
+        df = pd.DataFrame({"vehicle_id": np.full(n, vehicle_id, dtype=object)})
+        for name, values in data.items():
+            df[name] = self.decode(name, values) if name in self.categories else values
+        return df
+
+    def matrix(self, vehicle_id, columns, dtype=np.float32):
+        """Numeric columns of one vehicle stacked as an (n_rows, n_columns) array"""
+        rows = self.rows(vehicle_id)
+        out = np.empty((rows.stop - rows.start, len(columns)), dtype=dtype)
+        for j, name in enumerate(columns):
+            out[:, j] = self.columns[name][rows]
+        return out
+
+    def batches(self, max_rows=65536):
+        """
+        Yield (vehicle_ids, rows) for consecutive groups of whole vehicles of
+        about max_rows rows; rows is a slice usable on every column
+        """
+        start = 0
+        while start < len(self.vehicle_ids):
+            limit = self.offsets[start] + max_rows
+            stop = max(int(np.searchsorted(self.offsets, limit, side="right")) - 1, start + 1)
+            stop = min(stop, len(self.vehicle_ids))
+            yield self.vehicle_ids[start:stop], slice(int(self.offsets[start]), int(self.offsets[stop]))
+            start = stop
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a per-vehicle trajectory store")
+    parser.add_argument("--input", default="data/final_training_data.csv")
+    parser.add_argument("--output", default="data/trajectories")
+    parser.add_argument("--chunksize", type=int, default=500000)
+    args = parser.parse_args()
+
+    store = TrajectoryStore.build(args.input, args.output, chunksize=args.chunksize)
+    print(f"Trajectory store written to {args.output}: "
+          f"{store.n_rows} rows, {len(store)} vehicles, {len(store.columns)} columns")
+
+if __name__ == "__main__":
+    main()
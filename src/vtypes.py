@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+import xml.etree.ElementTree as ET
+
+# vType attributes and the column names used for them in the dataset
+VTYPE_ATTRIBUTES = {
+    "maxSpeed": "max_speed",
+    "accel": "accel",
+    "decel": "decel",
+    "length": "length",
+    "sigma": "sigma",
+    "minGap": "min_gap",
+    "mass": "mass",
+}
+TEXT_ATTRIBUTES = {"color": "color"}
+
+# Vehicle physics columns the collector emits next to every sample, in
+# vehicles.add.xml order (accel, decel, then the params). The original
+# preprocessing took the params from a set, so their order varied between runs;
+# models and notebooks select features by name, never by position.
+PHYSICS_COLUMNS = [
+    "accel",
+    "decel",
+    "device.battery.capacity",
+    "maximumPower",
+    "frontSurfaceArea",
+    "airDragCoefficient",
+    "rotatingMass",
+    "radialDragCoefficient",
+    "rollDragCoefficient",
+    "constantPowerIntake",
+    "propulsionEfficiency",
+    "recuperationEfficiency",
+    "device.battery.maximumChargeRate",
+]
+
+DEFAULT_MASS = 1500.0
+
+class VTypeTable:
+    def __init__(self, ids, numeric, text):
+        """
+        Indexed, typed table of vType attributes and <param> entries
+
+        Args:
+            ids (list): vType ids, one per row
+            numeric (dict): column -> float64 array (NaN where missing)
+            text (dict): column -> list of str (None where missing)
+        """
+        self.ids = list(ids)
+        self.index = {type_id: i for i, type_id in enumerate(self.ids)}
+        self.numeric = numeric
+        self.text = text
+        self._row_cache = {}
+
+    @classmethod
+    def from_xml(cls, paths):
+        """Load every vType of one or more additional/route files in a single pass each"""
+        if isinstance(paths, str):
+            paths = [paths]
+
+        rows = []
+        for path in paths:
+            for vtype in ET.parse(path).getroot().iter("vType"):
+                row = {"id": vtype.get("id")}
+                for attr, column in {**VTYPE_ATTRIBUTES, **TEXT_ATTRIBUTES}.items():
+                    row[column] = vtype.get(attr)
+                for param in vtype.findall("param"):
+                    row[param.get("key")] = param.get("value")
+                rows.append(row)
+
+        ids = [row.pop("id") for row in rows]
+        keys = list(dict.fromkeys(key for row in rows for key in row))
+        numeric, text = {}, {}
+        for key in keys:
+            raw = [row.get(key) for row in rows]
+            try:
+                numeric[key] = np.array([np.nan if v is None else float(v) for v in raw], dtype=np.float64)
+            except ValueError:
+                # Non-numeric values (color, has.battery.device=true, ...) stay text
+                text[key] = raw
+        return cls(ids, numeric, text)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, type_id):
+        return type_id in self.index
+
+    def value(self, type_id, column, default=np.nan):
+        i = self.index.get(type_id)
+        if i is None or column not in self.numeric:
+            return default
+        v = self.numeric[column][i]
+        return default if np.isnan(v) else float(v)
+
+    def mass(self, type_id):
+        return self.value(type_id, "mass", DEFAULT_MASS)
+
+    def physics(self, type_id):
+        """Return the PHYSICS_COLUMNS values of a vType as a tuple (cached per type)"""
+        row = self._row_cache.get(type_id)
+        if row is None:
+            row = self._row_cache[type_id] = tuple(self.value(type_id, column) for column in PHYSICS_COLUMNS)
+        return row
+
+    def lookup(self, type_ids, column):
+        """Vectorized lookup of a numeric column for an array of vType ids"""
+        codes = pd.Index(self.ids).get_indexer(pd.Index(type_ids))
+        values = self.numeric[column][codes] if column in self.numeric else np.full(len(codes), np.nan)
+        return np.where(codes >= 0, values, np.nan)
+
+    def to_frame(self):
+        """All attributes and params as a DataFrame keyed by 'vehicle_type'"""
+        df = pd.DataFrame({"vehicle_type": self.ids})
+        for column, values in self.numeric.items():
+            df[column] = values
+        for column, values in self.text.items():
+            df[column] = values
+        return df
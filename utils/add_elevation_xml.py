@@ -1,100 +1,125 @@
-# Streaming olarak XML içindeki shape="..." değerlerine z=0.0 ekleyip
+# Streaming olarak XML içindeki shape="..." değerlerine z (yükseklik) ekleyip
 # yapıyı bozmadan (satır sırasını ve diğer içerikleri koruyarak) yeni dosyaya yazalım.
+#
+# İki geçiş:
+#   1) Tüm shape noktaları toplanır ve tekilleştirilir (kavşak ve kenar
+#      şekilleri aynı noktaları paylaşır).
+#   2) Tekil noktaların yükseklikleri tek seferde (vektörel) bulunur ve dosya
+#      z eklenmiş şekilde yeniden yazılır.
+# Çok büyük ağlarda nokta çözümleme isteğe bağlı olarak paralel parçalara bölünür.
 
 import re
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import get_elevation
 import calculate_lan_lot
 
 input_path = "config/eskisehir.net.xml"
 output_path = "config/eskisehir_last_with_z.net.xml"
+raster_path = "config/output_hh.tif"
 
-# shape="..."
-shape_attr_start = 'shape="'
+# shape="..." (customShape="..." gibi başka attribute'larla karışmasın diye önünde boşluk)
+shape_attr_start = ' shape="'
+token_pattern = re.compile(r"\S+")
 
-def add_z_to_shape_text(shape_text):
-    # shape_text: "x,y x,y x,y"
-    tokens = shape_text.strip().split()
-    out_tokens = []
-    for t in tokens:
-        parts = t.split(",")
-        if len(parts) == 2:
-            x, y = parts
-            lat, lon = calculate_lan_lot.local_to_latlon(float(x), float(y))
-            z = get_elevation.get_elevation(lat, lon)
-            out_tokens.append(f"{x},{y},{z}")
-        elif len(parts) == 3:
-            # Zaten z var -> dokunma
-            out_tokens.append(t)
-        else:
-            # Beklenmeyen durum -> olduğu gibi bırak
-            out_tokens.append(t)
-    return " ".join(out_tokens)
+def iter_shape_segments(fin):
+    """
+    Dosyayı satır satır okuyup (is_shape, text) parçaları üretir.
+    Parçalar art arda yazıldığında dosya aynen geri oluşur; is_shape=True olan
+    parçalar bir shape değerinin içeriğidir (birden fazla satıra yayılabilir).
+    """
+    in_shape = False
+    shape_parts = []
+    for line in fin:
+        pos = 0
+        while True:
+            if in_shape:
+                end = line.find('"', pos)
+                if end == -1:
+                    # Hâlâ kapanmadı -> shape verisine ekle (satır sonları korunur)
+                    shape_parts.append(line[pos:])
+                    break
+                shape_parts.append(line[pos:end])
+                yield True, "".join(shape_parts)
+                shape_parts = []
+                in_shape = False
+                pos = end  # kapanış tırnağı normal metin olarak yazılır
+            else:
+                start = line.find(shape_attr_start, pos)
+                if start == -1:
+                    yield False, line[pos:]
+                    break
+                start += len(shape_attr_start)
+                yield False, line[pos:start]
+                in_shape = True
+                pos = start
+    if in_shape:
+        # Kapanış tırnağı gelmeden dosya bitti: eskisini olduğu gibi yaz
+        yield False, "".join(shape_parts)
 
-with open(input_path, "r", encoding="utf-8") as fin, open(output_path, "w", encoding="utf-8") as fout:
-    buffering_shape = False
-    buffer_before = ""   # shape=" öncesi
-    buffer_shape = ""    # shape içeriği
-    buffer_after = ""    # shape kapanışından sonrası
+def collect_points(path):
+    """1. geçiş: z'si olmayan tüm tekil "x,y" noktaları"""
+    points = {}
+    with open(path, "r", encoding="utf-8") as fin:
+        for is_shape, text in iter_shape_segments(fin):
+            if is_shape:
+                for token in text.split():
+                    if token.count(",") == 1:
+                        points.setdefault(token, None)
+    return list(points)
 
-    while True:
-        line = fin.readline()
-        if not line:
-            # Dosya bitti; eğer hala buffer varsa yaz
-            if buffering_shape:
-                # Kapanış tırnağı gelmeden dosya bitti: güvenli olmak için eskiyi yaz
-                fout.write(buffer_before + shape_attr_start + buffer_shape)
-            break
+def resolve_chunk(tokens, net_file=input_path, raster=raster_path, method="nearest"):
+    """Bir nokta grubu için yükseklikleri vektörel olarak bulur (işçi süreçte de çalışır)"""
+    xy = np.array([token.split(",") for token in tokens], dtype=np.float64).reshape(-1, 2)
+    projection = calculate_lan_lot.NetProjection.from_net(net_file)
+    lat, lon = projection.to_latlon(xy[:, 0], xy[:, 1])
+    z = get_elevation.get_sampler(raster).sample(lat, lon, method=method)
+    # Raster dışı / NoData -> 0.0 (ön işleme z=0'ı eksik kabul edip enterpole eder)
+    return np.where(np.isnan(z), 0.0, z)
 
-        if not buffering_shape:
-            # Bu satırda shape=" var mı?
-            idx = line.find(shape_attr_start)
-            if idx == -1:
-                # Yoksa direkt yaz
-                fout.write(line)
-                continue
+def resolve_elevations(tokens, net_file=input_path, raster=raster_path, method="nearest",
+                       workers=1, chunk_size=500000):
+    """Tekil noktaların yüksekliklerini çözer; workers > 1 ise parçaları paralel işler"""
+    chunks = [tokens[i:i + chunk_size] for i in range(0, len(tokens), chunk_size)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(resolve_chunk, chunks,
+                                    [net_file] * len(chunks), [raster] * len(chunks), [method] * len(chunks)))
+    else:
+        results = [resolve_chunk(chunk, net_file, raster, method) for chunk in chunks]
+    elevations = np.concatenate(results) if results else np.empty(0)
+    return {token: f"{token},{z:.2f}" for token, z in zip(tokens, elevations)}
 
-            # shape=" bulundu -> öncesini yaz, sonrasını işle
-            buffering_shape = True
-            buffer_before = line[:idx]
-            rest = line[idx + len(shape_attr_start):]
+def add_z_to_shape_text(shape_text, lookup):
+    # shape_text: "x,y x,y x,y" (satır sonları ve boşluklar korunur)
+    # Zaten z olan veya beklenmeyen token'lar olduğu gibi bırakılır
+    return token_pattern.sub(lambda m: lookup.get(m.group(0), m.group(0)), shape_text)
 
-            # rest içerisinde kapanış tırnağı var mı?
-            end_idx = rest.find('"')
-            if end_idx != -1:
-                # Aynı satırda bitiyor
-                buffer_shape = rest[:end_idx]
-                buffer_after = rest[end_idx+1:]  # kapanış tırnağından sonrası
+def write_with_z(path_in, path_out, lookup):
+    """2. geçiş: shape değerlerini z eklenmiş halleriyle değiştirerek yazar"""
+    with open(path_in, "r", encoding="utf-8") as fin, open(path_out, "w", encoding="utf-8") as fout:
+        for is_shape, text in iter_shape_segments(fin):
+            fout.write(add_z_to_shape_text(text, lookup) if is_shape else text)
 
-                # Dönüştür
-                new_shape = add_z_to_shape_text(buffer_shape)
-                # Yaz ve state sıfırla
-                fout.write(buffer_before + shape_attr_start + new_shape + '"' + buffer_after)
-                buffering_shape = False
-                buffer_before = buffer_shape = buffer_after = ""
-            else:
-                # Birden fazla satıra yayılmış
-                buffer_shape = rest
-                # Çok satırlı shape değerinde yapı korunacak şekilde buffer'lamaya devam
-        else:
-            # buffering_shape True -> shape içeriği devam ediyor
-            end_idx = line.find('"')
-            if end_idx == -1:
-                # Hâlâ kapanmadı -> shape verisine ekle ve devam et
-                buffer_shape += "\n" + line  # satır sonları korunur
-            else:
-                # Kapanış burada
-                buffer_shape += "\n" + line[:end_idx]
-                buffer_after = line[end_idx+1:]
+def main():
+    parser = argparse.ArgumentParser(description="SUMO ağındaki shape noktalarına yükseklik (z) ekler")
+    parser.add_argument("--input", default=input_path)
+    parser.add_argument("--output", default=output_path)
+    parser.add_argument("--raster", default=raster_path)
+    parser.add_argument("--method", choices=["nearest", "bilinear"], default="nearest")
+    parser.add_argument("--workers", type=int, default=1, help="Paralel nokta çözümleme süreç sayısı")
+    parser.add_argument("--chunk-size", type=int, default=500000, help="Süreç başına nokta sayısı")
+    args = parser.parse_args()
+
+    tokens = collect_points(args.input)
+    print(f"{len(tokens)} tekil nokta bulundu")
 
-                # Dönüştür (çok satırlı shape içlerinde varsa satır sonlarını korumak için
-                # önce satırları bölüp her satırdaki koordinatları dönüştürelim)
-                lines = buffer_shape.splitlines()
-                new_lines = [add_z_to_shape_text(s, "0.0") for s in lines]
-                new_shape = "\n".join(new_lines)
+    lookup = resolve_elevations(tokens, args.input, args.raster, args.method,
+                                workers=args.workers, chunk_size=args.chunk_size)
+    write_with_z(args.input, args.output, lookup)
 
-                # Yaz ve state sıfırla
-                fout.write(buffer_before + shape_attr_start + new_shape + '"' + buffer_after)
-                buffering_shape = False
-                buffer_before = buffer_shape = buffer_after = ""
+    print(f"Z değerleri eklendi: {args.input} -> {args.output}")
 
-print(f"Z değerleri eklendi: {input_path} -> {output_path}")
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,6 @@
+import gzip
+import xml.etree.ElementTree as ET
+import numpy as np
 from pyproj import CRS, Transformer
 
 # CRS tanımları
@@ -20,3 +23,38 @@ def local_to_latlon(x: float, y: float) -> tuple[float, float]:
     lon, lat = transformer.transform(utm_e, utm_n)
 
     return lat, lon
+
+def read_net_location(net_file: str) -> tuple[tuple[float, float], str]:
+    """
+    SUMO ağ dosyasının <location> elemanından (netOffset, projParameter) okur.
+    Eleman dosyanın başında olduğu için dosyanın geri kalanı okunmaz.
+    """
+    opener = gzip.open if net_file.endswith(".gz") else open
+    with opener(net_file, "rb") as f:
+        for _, elem in ET.iterparse(f, events=("start",)):
+            if elem.tag == "location":
+                offset = tuple(float(v) for v in elem.get("netOffset", "0,0").split(","))
+                return (offset[0], offset[1]), elem.get("projParameter", "!")
+    raise ValueError(f"{net_file} içinde <location> elemanı bulunamadı")
+
+class NetProjection:
+    """SUMO ağ koordinatlarını (x, y) tüm sütun üzerinde tek seferde lat/lon'a çevirir."""
+
+    def __init__(self, net_offset=NET_OFFSET, crs=utm36):
+        self.net_offset = net_offset
+        self.transformer = Transformer.from_crs(crs, wgs84, always_xy=True)
+
+    @classmethod
+    def from_net(cls, net_file: str) -> "NetProjection":
+        # Projeksiyon ve ofset ağ dosyasından alınır (sabit NET_OFFSET yerine)
+        net_offset, proj_parameter = read_net_location(net_file)
+        if proj_parameter == "!":
+            raise ValueError(f"{net_file} coğrafi projeksiyon içermiyor (projParameter='!')")
+        return cls(net_offset, CRS.from_proj4(proj_parameter))
+
+    def to_latlon(self, x, y) -> tuple[np.ndarray, np.ndarray]:
+        # SUMO x,y = UTM - netOffset (netOffset negatif saklanır)
+        utm_e = np.asarray(x, dtype=np.float64) - self.net_offset[0]
+        utm_n = np.asarray(y, dtype=np.float64) - self.net_offset[1]
+        lon, lat = self.transformer.transform(utm_e, utm_n)
+        return np.asarray(lat), np.asarray(lon)
@@ -1,28 +1,119 @@
+import os
+from functools import lru_cache
 import rasterio
 from pyproj import Transformer
 import numpy as np
 
 def get_elevation(lat, lon, file_path='config/output_hh.tif'):
-    # GeoTIFF dosyasını aç
-    with rasterio.open(file_path) as dataset:
-        data = dataset.read(1)
-        height, width = data.shape
+    # Tek nokta sorgusu: raster bir kez açılıp önbellekte tutulur
+    elevation_value, outside, nodata = get_sampler(file_path).sample_with_masks(lat, lon)
 
-        # Noktayı raster CRS'ine dönüştür
-        to_raster = Transformer.from_crs("EPSG:4326", dataset.crs, always_xy=True)
-        x, y = to_raster.transform(lon, lat)
+    # Piksel kapsam kontrolü
+    if outside[0]:
+        return 0  # Raster dışında
 
-        # Piksel indeksini bul
-        row, col = dataset.index(x, y)
+    # NoData kontrolü
+    if nodata[0]:
+        return None  # Veri yok
+    return elevation_value[0]
 
-        # Piksel kapsam kontrolü
-        if not (0 <= row < height and 0 <= col < width):
-            return 0  # Raster dışında
+@lru_cache(maxsize=None)
+def get_sampler(file_path='config/output_hh.tif'):
+    return ElevationSampler(file_path)
 
-        elevation_value = data[row, col]
+class ElevationSampler:
+    """
+    GeoTIFF yükseklik bandını bir kez belleğe alır (veya memory-map eder) ve
+    lat/lon dizileri için tek seferde nearest/bilinear yükseklik döndürür.
+    """
 
-        # NoData kontrolü
-        nodata = dataset.nodata
-        if nodata is not None and np.isfinite(nodata) and elevation_value == nodata:
-            return None  # Veri yok
-        return elevation_value
\ No newline at end of file
+    def __init__(self, file_path='config/output_hh.tif', cache_path=None, band=1):
+        """
+        Args:
+            file_path (str): GeoTIFF dosyası
+            cache_path (str): Verilirse bant .npy olarak bir kez kaydedilir ve
+                sonraki açılışlarda memory-map ile okunur
+            band (int): Okunacak bant
+        """
+        with rasterio.open(file_path) as dataset:
+            if cache_path and os.path.exists(cache_path):
+                self.data = np.load(cache_path, mmap_mode='r')
+            else:
+                self.data = dataset.read(band)
+                if cache_path:
+                    np.save(cache_path, self.data)
+                    self.data = np.load(cache_path, mmap_mode='r')
+            self.nodata = dataset.nodata
+            self.crs = dataset.crs
+            # Raster CRS -> (col, row) piksel koordinatı
+            inverse = ~dataset.transform
+            self.inverse = (inverse.a, inverse.b, inverse.c, inverse.d, inverse.e, inverse.f)
+
+        self.height, self.width = self.data.shape
+        # Transformer her sorguda değil bir kez oluşturulur
+        self.to_raster = Transformer.from_crs("EPSG:4326", self.crs, always_xy=True)
+
+    def pixel_coords(self, lat, lon):
+        """lat/lon dizilerini sürekli (row, col) piksel koordinatlarına çevirir"""
+        x, y = self.to_raster.transform(np.asarray(lon, dtype=np.float64),
+                                        np.asarray(lat, dtype=np.float64))
+        a, b, c, d, e, f = self.inverse
+        col = a * x + b * y + c
+        row = d * x + e * y + f
+        return np.atleast_1d(row), np.atleast_1d(col)
+
+    def _is_nodata(self, values):
+        mask = ~np.isfinite(values)
+        if self.nodata is not None and np.isfinite(self.nodata):
+            mask |= values == self.nodata
+        return mask
+
+    def sample_with_masks(self, lat, lon, method='nearest'):
+        """
+        Returns:
+            (elevations, outside, nodata): float64 yükseklikler (geçersizlerde NaN),
+            raster dışı maskesi ve NoData maskesi
+        """
+        row_f, col_f = self.pixel_coords(lat, lon)
+        outside = ~((row_f >= 0) & (row_f < self.height) & (col_f >= 0) & (col_f < self.width))
+        elevations = np.full(row_f.shape, np.nan)
+        nodata = np.zeros(row_f.shape, dtype=bool)
+        inside = ~outside
+        if not inside.any():
+            return elevations, outside, nodata
+
+        if method == 'nearest':
+            # rasterio dataset.index ile aynı: piksel köşesinden floor
+            rows = row_f[inside].astype(np.int64)
+            cols = col_f[inside].astype(np.int64)
+            values = self.data[rows, cols].astype(np.float64)
+            missing = self._is_nodata(values)
+        elif method == 'bilinear':
+            # Piksel merkezleri arasında ağırlıklı ortalama; kenarlarda en yakın merkeze kısıtlanır
+            r = np.clip(row_f[inside] - 0.5, 0, self.height - 1)
+            c = np.clip(col_f[inside] - 0.5, 0, self.width - 1)
+            r0 = np.minimum(r.astype(np.int64), max(self.height - 2, 0))
+            c0 = np.minimum(c.astype(np.int64), max(self.width - 2, 0))
+            r1 = np.minimum(r0 + 1, self.height - 1)
+            c1 = np.minimum(c0 + 1, self.width - 1)
+            wr = r - r0
+            wc = c - c0
+            q00 = self.data[r0, c0].astype(np.float64)
+            q01 = self.data[r0, c1].astype(np.float64)
+            q10 = self.data[r1, c0].astype(np.float64)
+            q11 = self.data[r1, c1].astype(np.float64)
+            missing = (self._is_nodata(q00) | self._is_nodata(q01) |
+                       self._is_nodata(q10) | self._is_nodata(q11))
+            values = ((q00 * (1 - wc) + q01 * wc) * (1 - wr) +
+                      (q10 * (1 - wc) + q11 * wc) * wr)
+        else:
+            raise ValueError(f"Bilinmeyen yöntem '{method}', 'nearest' veya 'bilinear' olmalı")
+
+        values[missing] = np.nan
+        elevations[inside] = values
+        nodata[inside] = missing
+        return elevations, outside, nodata
+
+    def sample(self, lat, lon, method='nearest'):
+        """lat/lon dizileri için yükseklikler; raster dışı ve NoData noktalar NaN"""
+        return self.sample_with_masks(lat, lon, method)[0]
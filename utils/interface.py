@@ -1,81 +1,119 @@
+import os
+import sys
+import threading
 import tkinter as tk
 from tkinter import messagebox
+from concurrent.futures import ThreadPoolExecutor
 import subprocess
+import numpy as np
 import pandas as pd
 import joblib
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from trajectory_store import TrajectoryStore
+import features
+from models.compact_forest import CompactForest
+
+csv_path = "data/final_training_data.csv"
+# src/trajectory_store.py ile oluşturulmuş araç bazlı depo (varsa CSV yerine kullanılır)
+store_path = "data/trajectories"
+rf_path = "data/rf_energy_sumo_ev_model.pkl"
+# python -m models.compact_forest ile dışa aktarılmış hali (varsa pickle yerine memory-map ile açılır)
+compact_path = "data/rf_energy_sumo_ev_model_compact"
+
+# Veri ve model bir kez (arka planda) yüklenir; araç özellikleri araç başına önbelleklenir
+resources = {}
+feature_cache = {}
+resources_lock = threading.Lock()
+
+def load_resources():
+    """Veri kaynağını ve modeli ilk çağrıda yükler, sonraki çağrılarda önbellekten döndürür"""
+    with resources_lock:
+        if not resources:
+            # Önce yerel sözlüğe yüklenir; bir adım hata verirse resources boş kalır ve sonraki çağrı yeniden dener
+            loaded = {}
+            if os.path.isdir(store_path):
+                loaded["store"] = TrajectoryStore(store_path)
+                loaded["vehicles"] = len(loaded["store"])
+            else:
+                df = pd.read_csv(csv_path)
+                loaded["df"] = df
+                # Araç -> satır indeksleri (her sorguda tüm tabloyu taramamak için)
+                loaded["rows"] = df.groupby("vehicle_id", sort=False).indices
+                loaded["vehicles"] = len(loaded["rows"])
+            # Modeli yükle: compact dizin varsa onu, yoksa pickle dosyasını
+            if os.path.isdir(compact_path):
+                model_path = compact_path
+                loaded["model"] = CompactForest.load(compact_path)
+            else:
+                model_path = rf_path
+                loaded["model"] = joblib.load(rf_path)
+            # Modelin eğitildiği özellik şeması (<model>.features.json, yoksa v1)
+            loaded["feature_version"] = features.model_version(model_path)
+            resources.update(loaded)
+        return resources
+
+def load_vehicle_frame(target_vehicle_id):
+    """Tek aracın satırları: depo varsa doğrudan araç aralığı, yoksa yüklenmiş CSV'deki satırları"""
+    res = load_resources()
+    if "store" in res:
+        if target_vehicle_id not in res["store"]:
+            return pd.DataFrame(columns=["vehicle_id"])
+        return res["store"].frame(target_vehicle_id)
+    rows = res["rows"].get(target_vehicle_id)
+    if rows is None:
+        return pd.DataFrame(columns=["vehicle_id"])
+    return res["df"].iloc[rows].reset_index(drop=True)
+
+def vehicle_features(target_vehicle_id):
+    """Aracın özellik matrisi ve gerçek tüketimi (features.build_dataset), araç başına önbelleklenir"""
+    cached = feature_cache.get(target_vehicle_id)
+    if cached is None:
+        df = load_vehicle_frame(target_vehicle_id)
+        if df.empty:
+            raise ValueError(f"{target_vehicle_id} için test setinde uygun satır bulunamadı.")
+        X, y, _ = features.build_dataset(df, load_resources()["feature_version"])
+        cached = feature_cache[target_vehicle_id] = (X, y)
+    return cached
 
 def hesapla_gercek_ve_tahmin(target_vehicle_id):
     """
     target_vehicle_id: 'veh103' gibi bir araç ID'si
-    return_all=False  : (total_true, total_pred) döndürür
-    return_all=True   : (total_true, total_pred, diff, diff_pct) döndürür
-    print_output=True : Sonuçları konsola basar
+    return: (total_true, total_pred)
+    Veri ve model ilk çağrıda yüklenir, aynı aracın özellikleri tekrar hesaplanmaz.
     """
-    csv_path = "data/final_training_data.csv"
-    df = pd.read_csv(csv_path)
-
-    # slope_pct sınırları → ±50% üstü/altı fiziksel olarak anlamlı değil
-    df = df[(df["slope_pct"] < 50) & (df["slope_pct"] > -50)]
-    # 3. Eksik slope_pct → 0 (eğim verisi yoksa "düz" kabul edilir)
-    df["slope_pct"] = df["slope_pct"].fillna(0)
-    # 'dist_m' sütunundaki NaN değerleri 0 ile doldurur
-    df['dist_m'] = df['dist_m'].fillna(0)
-
-    # ivme ayrımı
-    # bu sayede enerji tüketimi (hızlanırken) ve rejeneratif enerji kazanımı (yavaşlarken) ayrı ayrı analiz edilebilir.
-    # verimlilik hesaplarını ve optimizasyonu daha doğru yapmayı sağlar
-    # Pozitif ivme (gaz) tüketimi artırır; negatif ivme (fren/iniş) rejenerasyon sağlayabilir. Tek sütun olsa bu fark kaybolabilirdi
-    df["acc_pos"] = df["acceleration"].clip(lower=0)
-    df["acc_neg"] = (-df["acceleration"]).clip(lower=0)
-
-    # eğim de ivme gibi negatif ve pozitif şeklinde ayrılmalı
-    df["slope_pct_pos"] = df["slope_pct"].clip(lower=0)
-    df["slope_pct_neg"] = (-df["slope_pct"]).clip(lower=0)
-
-    # Hız: m/s ve v^2
-    df["speed_ms"] = df["speed_kmh"] / 3.6
-    df["v2"] = df["speed_ms"] ** 2 # Hızın kareli hali (kinetik enerjiyle ilişkili) modeller için anlamlı yeni bir değişkendir
-
-# Aerodinamik: Cd * A
-    df["CdA"] = df["airDragCoefficient"] * df["frontSurfaceArea"] # bu ikini birleştirip vermek daha mantıklı
-
-    # Sadece bu araca ait satırlar
-    mask = df["vehicle_id"] == target_vehicle_id
-
-    if not mask.any():
-        raise ValueError(f"{target_vehicle_id} için test setinde uygun satır bulunamadı.")
-
-    feature_cols = [
-    "v2",                      # hızın karesi (kinetik enerji ile ilişkili)
-    "acc_pos", "acc_neg",       # hızlanma / frenleme ,  enerji tüketimi & rejenerasyon
-    "slope_pct_pos", "slope_pct_neg",  # eğim pozitif/negatif
-    "mass_kg", "CdA", "rollDragCoefficient",   # araç fiziği
-    "propulsionEfficiency", "recuperationEfficiency",  # # enerji verimliliği
-    "maximumPower"      # motorun max gücü
-    ]
-    # Hedef ve kimlik dışındaki sütunları özellik olarak kullan
-    X_vehicle = df.loc[mask, feature_cols].dropna()
-
-    if X_vehicle.empty:
-        raise ValueError(f"{target_vehicle_id} için özellikler NaN sonrası boş kaldı (eksik veri).")
-
-    y_true_vehicle = df.loc[X_vehicle.index, "energy_consumption"]
+    X_vehicle, y_true_vehicle = vehicle_features(target_vehicle_id)
 
-    # Modeli yükle (pickle dosyası pandas ile de okunabilir)
-    rf_path = "data/rf_energy_sumo_ev_model.pkl"
-    rf_final = joblib.load(rf_path)
+    if len(X_vehicle) == 0:
+        raise ValueError(f"{target_vehicle_id} için özellikler NaN sonrası boş kaldı (eksik veri).")
 
     # Tahmin
-    y_pred_vehicle = rf_final.predict(X_vehicle)
+    res = load_resources()
+    y_pred_vehicle = res["model"].predict(features.feature_frame(X_vehicle, res["feature_version"]))
 
     # Toplamlar
-    total_true = float(y_true_vehicle.sum())
+    total_true = float(y_true_vehicle.sum(dtype=np.float64))
     total_pred = float(y_pred_vehicle.sum())
 
     return total_true, total_pred
 
 
+# Uzun işler (yükleme, tahmin) tek bir arka plan iş parçacığında sırayla çalışır;
+# Tk bileşenlerine yalnızca ana iş parçacığından (root.after) dokunulur
+worker = ThreadPoolExecutor(max_workers=1)
+
+def run_in_background(fn, on_done, *args):
+    future = worker.submit(fn, *args)
+
+    def poll():
+        if not future.done():
+            root.after(50, poll)
+            return
+        on_done(future)
+
+    root.after(50, poll)
+
 def run_sumo():
     try:
         subprocess.Popen(["sumo-gui", "-c", "config/main.sumocfg"])
@@ -85,33 +123,45 @@ def run_sumo():
         messagebox.showerror("Hata", f"SUMO başlatılırken hata oluştu:\n{e}")
 
 def validate_num(proposed: str) -> bool:
-    # Entry içinde sadece 1-300 arası sayıya izin ver
-    if proposed == "":
-        return True
-    if proposed.isdigit():
-        val = int(proposed)
-        return 1 <= val <= 300
-    return False
+    # Entry içinde araç numarası ("123") veya araç ID'si ("veh123") kabul edilir
+    return proposed == "" or not any(ch.isspace() for ch in proposed)
 
 def get_vehicle_id_from_input() -> str:
     text = vehicle_num_var.get().strip()
     if not text:
         raise ValueError("Araç numarası boş olamaz.")
-    if not text.isdigit():
-        raise ValueError("Lütfen sadece sayı girin (1-300).")
-    num = int(text)
-    if not (1 <= num <= 300):
-        raise ValueError("Araç numarası 1 ile 300 arasında olmalı.")
-    return f"veh{num}"
+    if text.isdigit():
+        return f"veh{int(text)}"
+    return text
 
-def run_hesapla():
+def on_loaded(future):
     try:
-        veh_id = get_vehicle_id_from_input()  # "veh123" gibi
-        gercek_toplam, tahmin_toplam = hesapla_gercek_ve_tahmin(veh_id)
+        res = future.result()
+        status_var.set(f"Hazır ({res['vehicles']} araç)")
+    except Exception as e:
+        status_var.set("Yükleme başarısız")
+        messagebox.showerror("Hata", f"Veri/model yüklenemedi:\n{e}")
+
+def on_calculated(future):
+    hesapla_btn.config(state="normal")
+    try:
+        gercek_toplam, tahmin_toplam = future.result()
         real_var.set(f"{gercek_toplam:.2f} Wh")
         pred_var.set(f"{tahmin_toplam:.2f} Wh")
+        status_var.set("Hazır")
+    except Exception as e:
+        status_var.set("Hata")
+        messagebox.showerror("Hata", f"Bir hata oluştu:\n{e}")
+
+def run_hesapla():
+    try:
+        veh_id = get_vehicle_id_from_input()  # "veh123" gibi
     except Exception as e:
         messagebox.showerror("Hata", f"Bir hata oluştu:\n{e}")
+        return
+    hesapla_btn.config(state="disabled")
+    status_var.set(f"{veh_id} hesaplanıyor...")
+    run_in_background(hesapla_gercek_ve_tahmin, on_calculated, veh_id)
 
 # --- TK arayüz ---
 root = tk.Tk()
@@ -121,11 +171,11 @@ root.title("Araç Seçimi, Hesaplama ve SUMO")
 top = tk.Frame(root)
 top.pack(padx=12, pady=12, fill="x")
 
-tk.Label(top, text="Araç No (1-300):").pack(side="left")
+tk.Label(top, text="Araç No / ID:").pack(side="left")
 
 vehicle_num_var = tk.StringVar()
 vcmd = (root.register(validate_num), "%P")
-vehicle_num_entry = tk.Entry(top, textvariable=vehicle_num_var, validate="key", validatecommand=vcmd, width=8)
+vehicle_num_entry = tk.Entry(top, textvariable=vehicle_num_var, validate="key", validatecommand=vcmd, width=12)
 vehicle_num_entry.pack(side="left", padx=8)
 vehicle_num_entry.focus_set()
 
@@ -148,7 +198,15 @@ tk.Entry(row2, textvariable=pred_var, state="readonly", width=30).pack(side="lef
 btns = tk.Frame(root)
 btns.pack(padx=12, pady=10, fill="x")
 
-tk.Button(btns, text="Hesapla", command=run_hesapla).pack(side="left", padx=(0,8))
+hesapla_btn = tk.Button(btns, text="Hesapla", command=run_hesapla)
+hesapla_btn.pack(side="left", padx=(0,8))
 tk.Button(btns, text="SUMO'yu Başlat", command=run_sumo).pack(side="left")
 
+# Durum / yükleme göstergesi
+status_var = tk.StringVar(value="Veri ve model yükleniyor...")
+tk.Label(root, textvariable=status_var, anchor="w").pack(padx=12, pady=(0, 10), fill="x")
+
+run_in_background(load_resources, on_loaded)
+
 root.mainloop()
+worker.shutdown(wait=False)
@@ -1,31 +1,51 @@
+import os
+import sys
+import shutil
+import argparse
+import tempfile
 import xml.etree.ElementTree as ET
-from xml.dom import minidom
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import random
-import sumolib  # Comes with SUMO; if missing: pip install sumolib
+import numpy as np
+from xml_writer import route_writer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
 
 # --- SETTINGS ---
 input_xml = "config/eskisehir_last_with_z.net.xml"   # SUMO network file containing edges
-output_rou = "config/random_routes.rou.xml"                  # output routes file
+output_rou = "config/random_routes.rou.xml"                  # output routes file (.gz -> gzip, SUMO reads it)
 num_vehicles = 300                                  # number of vehicles to generate
 max_attempts_multiplier = 50                          # limit for path search attempts (= num_vehicles * multiplier)
+index_path = "data/network_index"                    # network index for energy routing (src/network_index.py)
+vtypes_file = "config/vehicles.add.xml"              # vehicle types (energy parameters)
+num_vtypes = 20                                      # electric1 .. electric20
+extend_steps = 10                                    # random extensions after the first OD path
+num_hubs = 256                                       # waypoint edges with precomputed search trees (--mode fast)
+destination_searches = 1024                          # first-leg destination searches per run (--mode fast)
+
+def load_network(net_file):
+    """Residential edge IDs from the network XML and the sumolib network for path calculation"""
+    import sumolib  # Comes with SUMO; if missing: pip install sumolib
 
-# 1) Extract residential edge IDs from the network XML
-tree = ET.parse(input_xml)
-root = tree.getroot()
+    # 1) Extract residential edge IDs from the network XML
+    tree = ET.parse(net_file)
+    root = tree.getroot()
 
-residential_ids = [
-    edge.get("id")
-    for edge in root.findall(".//edge")
-    if edge.get("type") == "highway.residential"
-]
+    residential_ids = [
+        edge.get("id")
+        for edge in root.findall(".//edge")
+        if edge.get("type") == "highway.residential"
+    ]
 
-if len(residential_ids) < 2:
-    raise ValueError("Need at least 2 'highway.residential' edges to select random start/end edges.")
+    if len(residential_ids) < 2:
+        raise ValueError("Need at least 2 'highway.residential' edges to select random start/end edges.")
 
-# 1b) Load the network with sumolib for path calculation
-net = sumolib.net.readNet(input_xml)
+    # 1b) Load the network with sumolib for path calculation
+    net = sumolib.net.readNet(net_file)
+    return net, residential_ids
 
-def route_edges_between_and_extend(edge_from_id, edge_to_id, steps=10, attempts_per_step=20):
+def route_edges_between_and_extend(net, edge_from_id, edge_to_id, steps=10, attempts_per_step=20):
     """
     edge_from_id -> edge_to_id için en kısa yolu bulur, ardından e_to'dan başlayıp
     rastgele hedeflere doğru 'steps' kez daha uzatır.
@@ -84,49 +104,336 @@ def route_edges_between_and_extend(edge_from_id, edge_to_id, steps=10, attempts_
 
     return full_ids
 
-# 2) Create the root <routes> element
-routes_root = ET.Element("routes")
-
-# 3) Generate vehicles: pick two residential edges and find the connecting path
-created = 0
-attempts = 0
-max_attempts = num_vehicles * max_attempts_multiplier
-
-while created < num_vehicles and attempts < max_attempts:
-    attempts += 1
-    a, b = random.sample(residential_ids, 2)
-    path_edges = route_edges_between_and_extend(a, b)
-    if not path_edges:
-        continue  # No connection; try another pair
-
-    electric_type = random.randint(1, 20)  # Randomly select an electric vehicle type
-    veh_id = f"veh{created + 1}"
-    vehicle_el = ET.SubElement(
-        routes_root, "vehicle",
-        id=veh_id,
-        depart=str(float(created + 1)),
-        type=f"electric{electric_type}"
-    )
-
-    battery_charge_level_value = electric_type * 4000 + random.randint(10000, 20000)
-    ET.SubElement(
-        vehicle_el, "param",
-        key="device.battery.chargeLevel",
-        value=str(battery_charge_level_value)
-    )
-
-    ET.SubElement(vehicle_el, "route", edges=" ".join(path_edges))
-    created += 1
-
-if created < num_vehicles:
-    print(f"Warning: Only {created} out of {num_vehicles} vehicles could be generated. "
-          f"(attempts: {attempts}/{max_attempts})")
-
-# 4) Pretty-print and save to file
-rough_xml = ET.tostring(routes_root, encoding="utf-8")
-pretty_xml = minidom.parseString(rough_xml).toprettyxml(indent="  ")
-
-with open(output_rou, "w", encoding="utf-8") as f:
-    f.write(pretty_xml)
-
-print(f"{output_rou} created. Vehicles generated: {created} (target: {num_vehicles}, attempts: {attempts})")
+def make_vehicle(index, electric_type, routes):
+    """routes: [(edge ID list, Wh or None), ...], first route is the preferred one"""
+    return {
+        "id": f"veh{index + 1}",
+        "depart": float(index + 1),
+        "type": f"electric{electric_type}",
+        "charge": electric_type * 4000 + random.randint(10000, 20000),
+        "routes": routes,
+    }
+
+def generate_random_vehicles(net, residential_ids, count=num_vehicles):
+    """Vehicles on random residential OD pairs, extended by random shortest-distance segments"""
+    vehicles = []
+    attempts = 0
+    max_attempts = count * max_attempts_multiplier
+
+    while len(vehicles) < count and attempts < max_attempts:
+        attempts += 1
+        a, b = random.sample(residential_ids, 2)
+        path_edges = route_edges_between_and_extend(net, a, b)
+        if not path_edges:
+            continue  # No connection; try another pair
+
+        electric_type = random.randint(1, num_vtypes)  # Randomly select an electric vehicle type
+        vehicles.append(make_vehicle(len(vehicles), electric_type, [(path_edges, None)]))
+    return vehicles, attempts, max_attempts
+
+def generate_energy_vehicles(router, residential_idx, count=num_vehicles, alternatives=1):
+    """
+    Vehicles on random residential OD pairs routed with minimum energy for
+    their vType. OD pairs are routed in batches per vType (one search tree per
+    origin); unreachable pairs are redrawn. With alternatives > 1 every
+    vehicle gets up to that many routes ranked by Wh.
+    """
+    edge_ids = router.network.edge_ids
+    vehicles = []
+    attempts = 0
+    max_attempts = count * max_attempts_multiplier
+
+    while len(vehicles) < count and attempts < max_attempts:
+        n = min(count - len(vehicles), max_attempts - attempts)
+        attempts += n
+        pairs = [random.sample(residential_idx, 2) for _ in range(n)]
+        types = [random.randint(1, num_vtypes) for _ in range(n)]
+
+        found = [None] * n
+        for electric_type in sorted(set(types)):
+            rows = [i for i in range(n) if types[i] == electric_type]
+            results = router.route_batch([pairs[i][0] for i in rows], [pairs[i][1] for i in rows],
+                                         f"electric{electric_type}")
+            for i, result in zip(rows, results):
+                found[i] = result
+
+        for i, result in enumerate(found):
+            if result is None or len(vehicles) >= count:
+                continue  # No connection; try another pair
+            vtype = f"electric{types[i]}"
+            if alternatives > 1:
+                routes = router.alternatives(pairs[i][0], pairs[i][1], vtype, k=alternatives)
+            else:
+                routes = [result]
+            routes = [(edge_ids[path].tolist(), wh) for path, wh in routes]
+            vehicles.append(make_vehicle(len(vehicles), types[i], routes))
+    return vehicles, attempts, max_attempts
+
+def _draw_distinct(rng, pool, other):
+    """Random pool elements, redrawn where they equal `other` (pool has at least 2 elements)"""
+    drawn = rng.choice(pool, len(other))
+    same = drawn == other
+    while same.any():
+        drawn[same] = rng.choice(pool, int(same.sum()))
+        same = drawn == other
+    return drawn
+
+def first_legs(trees, origins, start, rng, reuse=1, block=64):
+    """
+    Paths start -> random residential edge
+
+    With reuse=1 every vehicle gets its own uniformly drawn destination, as
+    in generate_random_vehicles; with reuse=k groups of about k vehicles
+    share one (still uniformly drawn) destination, k times fewer searches.
+    Trees into the destinations are searched `block` at a time.
+
+    Returns:
+        ((nodes, lengths), destinations) with (nodes, lengths) like to_hub
+    """
+    from routing import RoadGraph
+
+    legs, destinations = [], []
+    step = block * max(int(reuse), 1)
+    for begin in range(0, len(start), step):
+        sources = start[begin:begin + step]
+        pool = origins if reuse <= 1 else rng.choice(origins, max(-(-len(sources) // int(reuse)), 2))
+        targets = _draw_distinct(rng, pool, sources)
+        unique = np.unique(targets)
+        legs.append(RoadGraph.walk(trees.into(unique), np.searchsorted(unique, targets), sources, targets))
+        destinations.append(targets)
+    # Blocks have different path widths; pad them (lengths mark the valid part)
+    width = max(nodes.shape[1] for nodes, _ in legs)
+    nodes = np.vstack([np.pad(nodes, ((0, 0), (0, width - nodes.shape[1]))) for nodes, _ in legs])
+    return (nodes, np.concatenate([lengths for _, lengths in legs])), np.concatenate(destinations)
+
+def sample_route_chunk(tree_path, origins, hubs, count, steps, seed, reuse=1):
+    """
+    Routes for one chunk of vehicles (runs in a worker process)
+
+    Like generate_random_vehicles, each vehicle drives from a random
+    residential edge to another random residential edge (first_legs), then
+    the route is extended `steps` times to random hubs, answered from the
+    precomputed hub trees.
+
+    Returns:
+        (types, charges, flat edge indices, offsets) for the vehicles whose
+        legs all exist (all of them inside one strongly connected component)
+    """
+    from routing import HubTrees
+
+    rng = np.random.default_rng(seed)
+    trees = HubTrees(tree_path)
+    types = rng.integers(1, num_vtypes + 1, count)
+    charges = types * 4000 + rng.integers(10000, 20001, count)
+
+    start = rng.choice(origins, count)
+    first, current = first_legs(trees, origins, start, rng, reuse)
+    legs = [first]
+    for step in range(steps):
+        following = _draw_distinct(rng, hubs, current)
+        # The first extension starts off the hubs: use the trees into the hubs
+        legs.append(trees.to_hub(current, following) if step == 0 else trees.from_hub(current, following))
+        current = following
+
+    # Concatenate the legs per vehicle; every leg after the first starts with the previous leg's last edge
+    ok = np.ones(count, dtype=bool)
+    parts, masks = [], []
+    for i, (nodes, lengths) in enumerate(legs):
+        ok &= lengths > 0
+        columns = np.arange(nodes.shape[1])
+        parts.append(nodes)
+        masks.append((columns < lengths[:, None]) & (columns >= (1 if i else 0)))
+    nodes = np.hstack(parts)[ok]
+    mask = np.hstack(masks)[ok]
+    offsets = np.zeros(int(ok.sum()) + 1, dtype=np.int64)
+    np.cumsum(mask.sum(axis=1), out=offsets[1:])
+    return types[ok], charges[ok], nodes[mask].astype(np.int32), offsets
+
+def iter_fast_vehicles(net_file, index, count=num_vehicles, hubs=num_hubs, steps=extend_steps,
+                       workers=1, seed=None, chunk_size=2000, reuse=None):
+    """
+    Random routes like generate_random_vehicles, without blind retries;
+    yields vehicles chunk by chunk so they can be written as they arrive
+
+    The graph is loaded once (network index), only edges of the largest
+    strongly connected component are sampled so every target is reachable.
+    Origins and first-leg destinations are drawn from all its residential
+    edges (see first_legs for `reuse`); the extension waypoints come from `hubs` edges whose
+    shortest-distance trees are computed once and shared with the workers
+    through memory-mapped files. Chunks have fixed sizes and seeds spawned
+    from `seed`, so the output does not depend on the number of workers.
+
+    One destination search costs a full reverse Dijkstra, so by default
+    (reuse=None) `reuse` grows with `count` to keep about
+    `destination_searches` searches per run: up to that many vehicles every
+    vehicle gets its own destination, beyond it groups of about
+    count / destination_searches vehicles share one. Each destination is
+    still a uniform draw over the residential edges (same per-vehicle
+    distribution as generate_random_vehicles), but they are no longer
+    independent: a run has at most about destination_searches distinct
+    destinations. Pass reuse=1 for independent destinations at one search
+    per vehicle.
+    """
+    from network_index import NetworkIndex
+    from routing import RoadGraph, HubTrees
+
+    if not os.path.isdir(index):
+        NetworkIndex.build(net_file, index)
+    network = NetworkIndex(index)
+    graph = RoadGraph(network)
+
+    labels = graph.strong_components()
+    largest = np.bincount(labels).argmax()
+    in_component = labels == largest
+    types = network.meta["edge_types"]
+    residential = network.edge_type == (types.index("highway.residential") if "highway.residential" in types else -1)
+    origins = np.flatnonzero(in_component & residential)
+    if len(origins) < 2:
+        raise ValueError("Need at least 2 connected 'highway.residential' edges to select random start/end edges.")
+
+    if reuse is None:
+        reuse = max(1, -(-count // destination_searches))
+
+    seeds = np.random.SeedSequence(seed)
+    rng = np.random.default_rng(seeds)
+    component = np.flatnonzero(in_component)
+    hub_set = rng.choice(component, min(max(hubs, 2), len(component)), replace=False)
+
+    edge_ids = np.asarray(network.meta["edges"], dtype=object)
+    tree_path = tempfile.mkdtemp(prefix="hub_trees_")
+    try:
+        HubTrees.build(graph, network.edge_length, hub_set, tree_path)
+        sizes = [min(chunk_size, count - start) for start in range(0, count, chunk_size)]
+        chunk_seeds = seeds.spawn(len(sizes))
+        args = [(tree_path, origins, hub_set, size, steps, chunk_seed, reuse)
+                for size, chunk_seed in zip(sizes, chunk_seeds)]
+
+        number = 0
+        for chunk_types, charges, flat, offsets in _chunk_results(args, workers):
+            for i in range(len(chunk_types)):
+                number += 1
+                yield {
+                    "id": f"veh{number}",
+                    "depart": float(number),
+                    "type": f"electric{chunk_types[i]}",
+                    "charge": int(charges[i]),
+                    "routes": [(edge_ids[flat[offsets[i]:offsets[i + 1]]], None)],
+                }
+    finally:
+        shutil.rmtree(tree_path, ignore_errors=True)
+
+def _chunk_results(args, workers):
+    """sample_route_chunk results in chunk order; at most 2 x workers chunks are in flight"""
+    if workers <= 1 or len(args) <= 1:
+        for a in args:
+            yield sample_route_chunk(*a)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for a in args:
+            pending.append(pool.submit(sample_route_chunk, *a))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def load_router(net_file, index, vtypes, model_path=None):
+    """Energy router on the network index (built from net_file on first use)"""
+    from network_index import NetworkIndex
+    from vtypes import VTypeTable
+    from routing import EnergyRouter
+
+    if not os.path.isdir(index):
+        NetworkIndex.build(net_file, index)
+    network = NetworkIndex(index)
+    return EnergyRouter(network, VTypeTable.from_xml(vtypes), model_path)
+
+def vehicle_children(vehicle):
+    """<vehicle> children as (tag, attrs, children) for the XML writer"""
+    children = [("param", {"key": "device.battery.chargeLevel", "value": str(vehicle["charge"])}, ())]
+    routes = vehicle["routes"]
+    if len(routes) == 1:
+        edges, wh = routes[0]
+        children.append(("route", {"edges": " ".join(edges), "cost": None if wh is None else f"{wh:.3f}"}, ()))
+    else:
+        # Alternatives ranked by energy; the cheapest one is the most likely
+        weights = [1.0 / (rank + 1) for rank in range(len(routes))]
+        children.append(("routeDistribution", {}, [
+            ("route", {"edges": " ".join(edges), "cost": f"{wh:.3f}",
+                       "probability": f"{weight / sum(weights):.4f}"}, ())
+            for (edges, wh), weight in zip(routes, weights)
+        ]))
+    return children
+
+def write_routes(vehicles, path):
+    """
+    Streams vehicles (any iterable, sorted by depart) to a route file;
+    every <vehicle> is written as soon as it is generated.
+    Returns the number of vehicles written.
+    """
+    with route_writer(path) as writer:
+        for vehicle in vehicles:
+            writer.write("vehicle", {"id": vehicle["id"], "depart": str(vehicle["depart"]),
+                                     "type": vehicle["type"]}, vehicle_children(vehicle))
+        return writer.count
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate random EV routes for the SUMO network")
+    parser.add_argument("--net", default=input_xml)
+    parser.add_argument("--output", default=output_rou)
+    parser.add_argument("--vehicles", type=int, default=num_vehicles)
+    parser.add_argument("--mode", choices=["fast", "random", "energy"], default="fast",
+                        help="fast: reachability-indexed random routes from precomputed hub trees, "
+                             "random: chained sumolib shortest paths (original generator), "
+                             "energy: minimum-energy routes per vType")
+    parser.add_argument("--index", default=index_path,
+                        help="Network index for --mode fast/energy (built if missing)")
+    parser.add_argument("--hubs", type=int, default=num_hubs, help="Waypoint edges with precomputed trees (fast)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (fast)")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="Vehicles per worker task (fast)")
+    parser.add_argument("--destination-reuse", type=int, default=None,
+                        help="Vehicles sharing one first-leg destination search; default keeps about "
+                             f"{destination_searches} searches per run, 1 gives every vehicle its own "
+                             "destination (fast)")
+    parser.add_argument("--vtypes", default=vtypes_file)
+    parser.add_argument("--model", default=None,
+                        help="Trained model for edge energy costs (default: SUMO's physical model)")
+    parser.add_argument("--alternatives", type=int, default=1,
+                        help="Routes per vehicle ranked by Wh, written as a routeDistribution")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    # 3) Generate vehicles: pick two residential edges and find the connecting path
+    if args.mode == "energy":
+        router = load_router(args.net, args.index, args.vtypes, args.model)
+        types = router.network.meta["edge_types"]
+        residential_code = types.index("highway.residential") if "highway.residential" in types else -1
+        residential_idx = [int(i) for i in (router.network.edge_type == residential_code).nonzero()[0]]
+        if len(residential_idx) < 2:
+            raise ValueError("Need at least 2 'highway.residential' edges to select random start/end edges.")
+        vehicles, attempts, max_attempts = generate_energy_vehicles(router, residential_idx, args.vehicles,
+                                                                    args.alternatives)
+    elif args.mode == "fast":
+        vehicles = iter_fast_vehicles(args.net, args.index, args.vehicles, args.hubs, extend_steps,
+                                      args.workers, args.seed, args.chunk_size, args.destination_reuse)
+        attempts = max_attempts = args.vehicles
+    else:
+        net, residential_ids = load_network(args.net)
+        vehicles, attempts, max_attempts = generate_random_vehicles(net, residential_ids, args.vehicles)
+
+    # 4) Write the route file (vehicles are streamed to disk as they are generated)
+    created = write_routes(vehicles, args.output)
+
+    if created < args.vehicles:
+        print(f"Warning: Only {created} out of {args.vehicles} vehicles could be generated. "
+              f"(attempts: {attempts}/{max_attempts})")
+
+    print(f"{args.output} created. Vehicles generated: {created} "
+          f"(target: {args.vehicles}, attempts: {attempts}/{max_attempts})")
+    if args.mode == "energy" and vehicles:
+        total = sum(vehicle["routes"][0][1] for vehicle in vehicles)
+        print(f"Estimated energy of the preferred routes: {total:.1f} Wh ({total / len(vehicles):.1f} Wh/vehicle)")
+
+if __name__ == "__main__":
+    main()
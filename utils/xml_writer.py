@@ -0,0 +1,82 @@
+# SUMO rota / vType dosyaları için akış (streaming) XML yazıcı
+#
+# ElementTree + minidom ile tüm ağacı bellekte kurup yeniden ayrıştırmak yerine
+# her eleman üretildiği anda diske yazılır; bellek kullanımı eleman sayısından
+# bağımsızdır. Dosya adı .gz ile bitiyorsa gzip olarak yazılır (SUMO doğrudan okur).
+
+import gzip
+from xml.sax.saxutils import quoteattr
+
+def _attributes(attrs):
+    return "".join(f" {key}={quoteattr(str(value))}" for key, value in attrs.items() if value is not None)
+
+class XMLStreamWriter:
+    def __init__(self, path, root, root_attrs=None, indent="  ", order_attr=None, compresslevel=1):
+        """
+        Args:
+            path (str): Çıktı dosyası (.gz uzantısı -> gzip)
+            root (str): Kök eleman adı (ör. "routes", "vTypes")
+            root_attrs (dict): Kök elemanın attribute'ları
+            indent (str): Bir seviyelik girinti
+            order_attr (str): Verilirse (ör. "depart") üst seviye elemanların bu
+                attribute'u azalmayan sırada olmalı; aksi halde ValueError
+            compresslevel (int): gzip seviyesi; rota dosyaları çok tekrarlı olduğundan
+                1, 9'a göre ~5 kat hızlı ve yalnızca ~%7 daha büyük
+        """
+        self.path = path
+        self.root = root
+        self.indent = indent
+        self.order_attr = order_attr
+        self.last_order = float("-inf")
+        self.count = 0
+        if path.endswith(".gz"):
+            self.file = gzip.open(path, "wt", encoding="utf-8", compresslevel=compresslevel)
+        else:
+            self.file = open(path, "w", encoding="utf-8")
+        self.file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        self.file.write(f"<{root}{_attributes(root_attrs or {})}>\n")
+
+    def _element(self, tag, attrs, children, level):
+        pad = self.indent * level
+        if not children:
+            return f"{pad}<{tag}{_attributes(attrs)}/>\n"
+        inner = "".join(self._element(*child, level + 1) for child in children)
+        return f"{pad}<{tag}{_attributes(attrs)}>\n{inner}{pad}</{tag}>\n"
+
+    def write(self, tag, attrs, children=()):
+        """
+        Bir üst seviye elemanı yazar
+
+        children: (tag, attrs, children) üçlülerinin listesi (iç içe olabilir)
+        """
+        if self.order_attr is not None and attrs.get(self.order_attr) is not None:
+            value = float(attrs[self.order_attr])
+            if value < self.last_order:
+                raise ValueError(f"{tag} {attrs.get('id', '')}: {self.order_attr}={value} önceki elemandan "
+                                 f"({self.last_order}) küçük; SUMO elemanların sıralı olmasını bekler")
+            self.last_order = value
+        self.file.write(self._element(tag, attrs, children, 1))
+        self.count += 1
+
+    def close(self):
+        if not self.file.closed:
+            self.file.write(f"</{self.root}>\n")
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and not self.file.closed:
+            # Hata: kapanış etiketi yazılmaz, yarım dosya geçerli XML gibi görünmesin
+            self.file.close()
+            return
+        self.close()
+
+def route_writer(path, indent="  "):
+    """<routes> dosyası; araçların depart değerleri sıralı olmalı"""
+    return XMLStreamWriter(path, "routes", indent=indent, order_attr="depart")
+
+def vtype_writer(path, indent="    "):
+    """<vTypes> dosyası (additional)"""
+    return XMLStreamWriter(path, "vTypes", indent=indent)